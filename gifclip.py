@@ -0,0 +1,263 @@
+"""
+gifclip - headless batch front-end for the GifClip Maker conversion engine.
+
+Converts files/globs with the same settings keys the GUI uses and prints one
+JSON line per task on stdout (log output goes to stderr). Intended for render
+boxes without a display: PyQt6 and cv2 are never imported on this path.
+
+    python gifclip.py clips/*.mp4 --format webp --fps 15 --resize_mode scale_50 -j 8
+"""
+
+import sys
+import os
+import glob
+import json
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import gifclip_engine as engine
+import gifclip_probe as probe
+import gifclip_estimate as estimate
+import gifclip_cache as cache_mod
+import gifclip_queue as queue_mod
+from gifclip_sched import ThreadBudget
+
+# Settings keys accepted on the command line (same keys as MainWindow.video_settings)
+SETTING_TYPES = {
+    "format": str,
+    "fps": int,
+    "quality": int,
+    "resize_mode": str,
+    "width": int,
+    "height": int,
+    "scale": int,
+    "start_time": int,
+    "end_time": int,
+    "crop_enabled": bool,
+    "crop_x": float,
+    "crop_y": float,
+    "crop_w": float,
+    "crop_h": float,
+    "target_size_mb": float,
+    "target_tolerance": float,
+    "gif_encoder": str,
+    "gif_palette": str,
+    "gif_dither": str,
+    "gif_optimize": bool,
+    "dedup_threshold": float,
+    "trim_mode": str,
+    "segments": int,
+}
+
+SETTING_HELP = {
+    "start_time": "start/end in ms",
+    "end_time": "start/end in ms",
+    "target_size_mb": "fit each output under this size; quality/fps/scale become upper limits",
+    "target_tolerance": "accepted undershoot of --target_size_mb (0.1 = within 10%%)",
+    "gif_encoder": "auto (gifski if found, else ffmpeg), gifski, ffmpeg or native (in-process, needs NumPy)",
+    "gif_palette": "ffmpeg/native GIF palette: full, diff (moving parts) or single (per frame)",
+    "gif_dither": "native GIF encoder dithering: ordered, diffusion or none",
+    "gif_optimize": "rewrite GIF frames as changed rectangles and merge identical frames (needs NumPy)",
+    "trim_mode": "auto (keyframe index if ffprobe works), accurate (keyframe seek + exact trim) or fast (-ss/-to)",
+    "segments": "encode one long clip as N parts in parallel and stitch them (0 = Auto, 1 = off)",
+    "dedup_threshold": "drop near-static frames (mean change per 8x8 block, 0-255; 12 ~ mpdecimate default, 0 = off)",
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="gifclip", description="Convert videos to GIF/WebP without the GUI.")
+    parser.add_argument("inputs", nargs="*", help="Input files or glob patterns")
+    parser.add_argument("--settings", help="JSON file (or inline JSON object) with settings keys")
+    parser.add_argument("--outputs", help="JSON file (or inline JSON list) of output specs decoded in one pass, "
+                                          "e.g. '[{\"format\": \"GIF\", \"resize_mode\": \"scale_50\"}, {\"format\": \"WebP\"}]'")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="Parallel jobs (0 = Auto, based on core count)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="CPU threads shared by all running jobs (ffmpeg/encoder threads, 0 = all cores)")
+    parser.add_argument("--background", action="store_true",
+                        help="Run ffmpeg/gifski at low CPU and I/O priority (nice/ionice, below-normal class on Windows)")
+    parser.add_argument("--memory-limit", type=float, default=0,
+                        help="Memory ceiling per job in MB (0 = off); jobs estimated above it follow --memory-policy, "
+                             "jobs going above it are stopped")
+    parser.add_argument("--memory-policy", choices=["auto", "downscale", "chunk", "refuse"], default="auto",
+                        help="Job over --memory-limit: smaller frames, sequential parts, or fail (auto = chunk long GIFs)")
+    parser.add_argument("-o", "--output-dir", help="Output folder (default: next to each source)")
+    parser.add_argument("--estimate", action="store_true", help="Only estimate output sizes (nothing is written)")
+    parser.add_argument("--split-segments", action="store_true",
+                        help="With --estimate: encode the samples of each file as parallel pipelines")
+    parser.add_argument("--sampling", choices=["auto", "fixed", "adaptive"], default="auto",
+                        help="With --estimate: 3 fixed samples, or short probes added until --target-error is met "
+                             "(auto = adaptive for clips of a minute or more)")
+    parser.add_argument("--instant", action="store_true",
+                        help="With --estimate: packet-index model only, no sample encodes (needs ffprobe)")
+    parser.add_argument("--placement", choices=["auto", "complexity", "uniform"], default="auto",
+                        help="With --estimate: place samples by an ffprobe packet-size index (auto = only if already "
+                             "cached, complexity = build it first)")
+    parser.add_argument("--target-error", type=float, default=0.1,
+                        help="With --estimate: relative half-width of the 95%% band adaptive sampling stops at")
+    parser.add_argument("--progress", action="store_true", help="Print per-frame progress records (JSON) to stderr")
+    parser.add_argument("--no-probe-cache", action="store_true", help="Do not read/write the persistent probe cache")
+    parser.add_argument("--no-output-cache", action="store_true",
+                        help="Always encode (do not reuse or store outputs for identical source + settings)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume the last unfinished batch from the job queue (no inputs needed)")
+    parser.add_argument("--retries", type=int, default=1, help="Extra tries per file after a failure (with backoff)")
+    parser.add_argument("--ffmpeg", default=engine.DEFAULT_FFMPEG)
+    parser.add_argument("--gifski", default=engine.DEFAULT_GIFSKI)
+    parser.add_argument("--ffprobe", default=engine.DEFAULT_FFPROBE)
+    for key, typ in SETTING_TYPES.items():
+        if typ is bool:
+            parser.add_argument(f"--{key}", dest=key, action="store_true", default=None, help=SETTING_HELP.get(key))
+        else:
+            parser.add_argument(f"--{key}", dest=key, type=typ, default=None,
+                                help=SETTING_HELP.get(key))
+    return parser
+
+def expand_inputs(patterns):
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for m in matches:
+            if os.path.isfile(m) and m not in files:
+                files.append(m)
+    return files
+
+def load_json_arg(value):
+    # Inline JSON or path to a JSON file
+    if os.path.isfile(value):
+        with open(value, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(value)
+
+def load_overrides(args):
+    overrides = {}
+    if args.settings:
+        overrides.update(load_json_arg(args.settings))
+    for key in SETTING_TYPES:
+        value = getattr(args, key)
+        if value is not None:
+            overrides[key] = value
+    # Crop coordinates imply crop
+    if any(k in overrides for k in ("crop_x", "crop_y", "crop_w", "crop_h")):
+        overrides.setdefault("crop_enabled", True)
+    if "format" in overrides:
+        overrides["format"] = "GIF" if str(overrides["format"]).lower() == "gif" else "WebP"
+    return overrides
+
+def build_task(path, overrides, args, prober):
+    info = prober.probe(path)
+    settings = engine.default_settings(info["width"], info["height"], info["fps"], info["duration"])
+    settings.update(overrides)
+    task = {"path": path, "settings": settings, "format": settings["format"]}
+    if args.outputs:
+        task["outputs"] = load_json_arg(args.outputs)
+    if args.output_dir:
+        task["output_dir"] = args.output_dir
+    return task
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    queue = queue_mod.JobQueue.default()
+    jobs = None
+    if args.resume:
+        batches = queue.unfinished_batches(source="cli")
+        if not batches:
+            print("gifclip: nothing to resume", file=sys.stderr)
+            return 0
+        # Finished outputs that still verify (size + header) are skipped
+        jobs = queue.resume(batches[0]["id"])
+        if not jobs:
+            print("gifclip: last batch already complete", file=sys.stderr)
+            return 0
+        files = [task["path"] for _, task in jobs]
+    else:
+        files = expand_inputs(args.inputs)
+    if not files:
+        print("gifclip: no input files matched", file=sys.stderr)
+        return 2
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    overrides = load_overrides(args)
+    out = sys.stdout
+    out_lock = threading.Lock()
+
+    def emit(res):
+        record = dict(res)
+        outputs = record["output"] if isinstance(record["output"], list) else [record["output"]]
+        sizes = [os.path.getsize(o) for o in outputs if o and os.path.exists(o)]
+        if sizes:
+            record["bytes"] = sizes if isinstance(record["output"], list) else sizes[0]
+        with out_lock:
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+    err = sys.stderr
+
+    def emit_progress(completed, total, message, stats):
+        if not stats: return
+        with out_lock:
+            err.write(json.dumps(dict(stats, type="progress", path=files[stats["index"]])) + "\n")
+            err.flush()
+
+    ThreadBudget.default().set_total(args.threads)
+    conv = engine.ConversionEngine(args.ffmpeg, args.gifski,
+                                   progress_callback=emit_progress if args.progress else None,
+                                   size_model=estimate.SizeModel.default(),
+                                   output_cache=None if args.no_output_cache else cache_mod.OutputCache.default(),
+                                   retries=max(0, args.retries), ffprobe_path=args.ffprobe,
+                                   priority="background" if args.background else "normal",
+                                   memory_limit_mb=args.memory_limit, memory_policy=args.memory_policy)
+    # Engine debug prints must not corrupt the JSON stream
+    with contextlib.redirect_stdout(sys.stderr):
+        # Probe all inputs concurrently (ffprobe is I/O bound); container metadata only, never cv2
+        if jobs is None:
+            cache = None if args.no_probe_cache else probe.ProbeCache.default()
+            prober = probe.ProbePool(cache, prober="ffprobe", ffprobe=args.ffprobe, ffmpeg=args.ffmpeg)
+            with ThreadPoolExecutor(max_workers=min(16, len(files))) as pool:
+                tasks = list(pool.map(lambda p: build_task(p, overrides, args, prober), files))
+            prober.shutdown()
+            if args.estimate:
+                return run_estimate(tasks, args, out, out_lock)
+            # Journal the batch; an interrupted run continues with --resume
+            _, job_ids = queue.add_batch(tasks, source="cli")
+            jobs = list(zip(job_ids, tasks))
+        try:
+            results = queue_mod.run_journaled(conv, queue, jobs, args.jobs, result_callback=emit)
+        except KeyboardInterrupt:
+            conv.stop()
+            return 130
+
+    return 0 if all(r and r["status"] == "done" for r in results) else 1
+
+def run_estimate(tasks, args, out, out_lock):
+    # One JSON line per file as soon as its estimate is done
+    est = estimate.SizeEstimator(args.ffmpeg, args.gifski, args.ffprobe,
+                                 sample_cache=estimate.SampleCache.default(),
+                                 sampling=args.sampling, target_rel_error=args.target_error,
+                                 placement=args.placement)
+
+    def emit(idx, res):
+        with out_lock:
+            out.write(json.dumps(dict(res, index=idx)) + "\n")
+            out.flush()
+
+    if args.instant:
+        model = estimate.SizeModel.default()
+        ok = True
+        for idx, task in enumerate(tasks):
+            index = probe.get_packet_index(task['path'], args.ffprobe)
+            res = model.predict(dict(task['settings'], format=task['format']), index)
+            ok = ok and res is not None
+            emit(idx, dict(res or {}, path=task['path'], error=None if res else "No packet index"))
+        return 0 if ok else 1
+
+    try:
+        results = est.estimate_batch(tasks, args.jobs, result_callback=emit, split_segments=args.split_segments)
+    except KeyboardInterrupt:
+        est.stop()
+        return 130
+    return 0 if all(r and not r["error"] for r in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
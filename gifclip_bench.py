@@ -0,0 +1,238 @@
+"""
+gifclip_bench - micro benchmarks for the GifClip Maker engine.
+
+Prints one JSON line per measurement (stdout), logs go to stderr.
+
+    python gifclip_bench.py encoders clip.mp4 --fps 15 --width 480 --duration 10
+    python gifclip_bench.py seek long.mp4 --starts 60,600,1800 --duration 5
+    python gifclip_bench.py segments clip.mp4 --counts 1,2,4,8 --duration 60
+    python gifclip_bench.py pipe --size 1920x1080 --rate 60 --duration 10 --consumers 2
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+
+import subprocess
+
+import gifclip_engine as engine
+import gifclip_probe as probe
+import gifclip_pipe as pipes
+
+def emit(args, record):
+    args.out.write(json.dumps(record) + "\n")
+    args.out.flush()
+
+def clip_settings(path, args):
+    info = probe.probe_media(path, args.ffprobe, args.ffmpeg)
+    s = engine.default_settings(info["width"], info["height"], info["fps"], info["duration"])
+    s.update({"fps": args.fps, "quality": args.quality})
+    if args.width:
+        s.update({"resize_mode": "custom", "width": args.width,
+                  "height": max(2, round(args.width * s['orig_height'] / s['orig_width'] / 2) * 2)})
+    s["start_time"] = int(args.start * 1000)
+    if args.duration > 0:
+        s["end_time"] = int((args.start + args.duration) * 1000)
+    return s
+
+def bench_encoders(args):
+    # Same clip through every available GIF encoder backend: wall time, size, frames/s
+    conv = engine.ConversionEngine(args.ffmpeg, args.gifski)
+    settings = clip_settings(args.input, args)
+    encoders = args.encoders.split(",") if args.encoders else list(conv.GIF_ENCODERS)
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in encoders:
+            if name == "gifski" and conv.gif_encoder_name({"gif_encoder": "gifski"}) != "gifski":
+                emit(args, {"encoder": name, "error": "gifski not found"})
+                continue
+            for dither in (args.dither.split(",") if name == "native" else [None]):
+                s = dict(settings, gif_encoder=name)
+                if dither: s["gif_dither"] = dither
+                out = os.path.join(tmp, f"{name}_{dither or 'default'}.gif")
+                task = {"path": args.input, "settings": s, "format": "GIF"}
+                t0 = time.perf_counter()
+                try:
+                    conv.encode_single(task, 0, args.input, out, s)
+                    error = None
+                except Exception as e:
+                    error = str(e)
+                    ok = False
+                elapsed = time.perf_counter() - t0
+                frames = engine.trimmed_frame_count(s, s['fps'])
+                emit(args, {
+                    "encoder": name, "dither": dither, "elapsed": round(elapsed, 3),
+                    "bytes": os.path.getsize(out) if os.path.exists(out) else 0,
+                    "frames": frames, "fps": round(frames / elapsed, 1) if elapsed > 0 and frames else 0,
+                    "error": error})
+    return 0 if ok else 1
+
+def bench_segments(args):
+    # Wall time of one conversion split into 1..N parallel parts (encode_segments)
+    conv = engine.ConversionEngine(args.ffmpeg, args.gifski, ffprobe_path=args.ffprobe)
+    settings = clip_settings(args.input, args)
+    fmt = "GIF" if args.format.upper() == "GIF" else "WebP"
+    ok = True
+    base = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [int(x) for x in args.counts.split(",")]:
+            s = dict(settings, segments=n, format=fmt)
+            out = os.path.join(tmp, f"seg{n}.{fmt.lower()}")
+            task = {"path": args.input, "settings": s, "format": fmt}
+            t0 = time.perf_counter()
+            try:
+                conv.encode_single(task, 0, args.input, out, s)
+                error = None
+            except Exception as e:
+                error = str(e)
+                ok = False
+            elapsed = time.perf_counter() - t0
+            if base is None and not error: base = elapsed
+            emit(args, {"segments": n, "elapsed": round(elapsed, 3),
+                        "speedup": round(base / elapsed, 2) if base and elapsed > 0 else None,
+                        "bytes": os.path.getsize(out) if os.path.exists(out) else 0, "error": error})
+    return 0 if ok else 1
+
+def run_decode(cmd):
+    # ffmpeg to the null muxer; (elapsed, frames output)
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, startupinfo=engine.get_startup_info())
+    elapsed = time.perf_counter() - t0
+    frames = 0
+    for line in proc.stderr.decode("utf-8", errors="ignore").splitlines():
+        if line.startswith("frame="):
+            try: frames = int(line[6:].strip())
+            except ValueError: pass
+    return elapsed, frames, proc.returncode
+
+def bench_seek(args):
+    # Cost of reaching a late start time: output-side seek (decode everything before it, exact),
+    # plain input seek (-ss/-to before -i, the "fast" trim_mode) and the keyframe-index strategy
+    # ("accurate": seek to the keyframe, trim in the graph). Same fps filter, null output.
+    t0 = time.perf_counter()
+    index = probe.get_packet_index(args.input, args.ffprobe)
+    emit(args, {"step": "keyframe_index", "elapsed": round(time.perf_counter() - t0, 3),
+                "keyframes": len(index["keyframes"]) if index else 0})
+    base = [args.ffmpeg, "-y", "-v", "error", "-nostats", "-progress", "pipe:2"]
+    tail = ["-an", "-f", "null", "-"]
+    ok = True
+    for start in [float(x) for x in args.starts.split(",")]:
+        end = start + args.duration
+        strategies = {
+            "output_seek": base + ["-i", args.input, "-ss", str(start), "-to", str(end),
+                                   "-vf", f"fps={args.fps}"] + tail,
+            "fast": base + ["-ss", str(start), "-to", str(end), "-i", args.input, "-vf", f"fps={args.fps}"] + tail,
+        }
+        if index:
+            in_args, trim = engine.keyframe_trim(index, start, end)
+            strategies["keyframe"] = base + in_args + ["-i", args.input, "-vf", f"{trim},fps={args.fps}"] + tail
+        for name, cmd in strategies.items():
+            elapsed, frames, rc = run_decode(cmd)
+            ok = ok and rc == 0
+            emit(args, {"start": start, "strategy": name, "elapsed": round(elapsed, 3), "frames": frames,
+                        "expected_frames": int(round(args.duration * args.fps)), "returncode": rc})
+    return 0 if ok else 1
+
+def bench_pipe(args):
+    # Raw yuv4mpeg frames from one ffmpeg to ffmpeg null-muxer consumers: default OS pipe,
+    # enlarged pipe (F_SETPIPE_SZ), and one stream to --consumers readers through PipeTee
+    # (tee/splice in the kernel vs. a Python read/write relay). Wall time and MB/s per mode.
+    w, h = [int(x) for x in args.size.lower().split("x")]
+    if args.input:
+        src = ["-t", str(args.duration), "-i", args.input, "-vf", f"scale={w}:{h},fps={args.rate}"]
+    else:
+        src = ["-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate={args.rate}:duration={args.duration}"]
+    writer = [args.ffmpeg, "-v", "error", "-nostdin"] + src + ["-pix_fmt", "yuv420p", "-f", "yuv4mpegpipe", "-"]
+    reader = [args.ffmpeg, "-v", "error", "-nostdin", "-f", "yuv4mpegpipe", "-i", "-", "-f", "null", "-"]
+    expected = int(args.duration * args.rate) * pipes.y4m_frame_bytes(w, h)
+    si = engine.get_startup_info()
+    ok = True
+
+    def finish(mode, t0, procs, nbytes, pipe_size, consumers=1, tee_mode=None):
+        for p in procs: p.wait()
+        elapsed = time.perf_counter() - t0
+        rcs = [p.returncode for p in procs]
+        emit(args, {"mode": mode, "tee": tee_mode, "consumers": consumers, "pipe_size": pipe_size,
+                    "elapsed": round(elapsed, 3), "bytes": nbytes,
+                    "mbps": round(nbytes / (1024 * 1024) / elapsed, 1) if elapsed > 0 else 0, "returncodes": rcs})
+        return all(rc == 0 for rc in rcs)
+
+    # Direct hand-off: the consumer reads the writer's stdout fd
+    for mode in ("default", "large"):
+        t0 = time.perf_counter()
+        wp = subprocess.Popen(writer, stdout=subprocess.PIPE, startupinfo=si)
+        size = pipes.set_pipe_size(wp.stdout) if mode == "large" else None
+        rp = subprocess.Popen(reader, stdin=wp.stdout, startupinfo=si)
+        wp.stdout.close()
+        ok = finish(mode, t0, [wp, rp], expected, size) and ok
+
+    # Fan-out: one decode, several consumers
+    for tee_mode in ("auto", "relay"):
+        t0 = time.perf_counter()
+        wp = subprocess.Popen(writer, stdout=subprocess.PIPE, startupinfo=si)
+        readers = [subprocess.Popen(reader, stdin=subprocess.PIPE, startupinfo=si) for _ in range(args.consumers)]
+        tee = pipes.PipeTee(wp.stdout.fileno(), [r.stdin.fileno() for r in readers], mode=tee_mode)
+        tee.run()
+        wp.stdout.close()
+        for r in readers: r.stdin.close()
+        ok = finish("tee", t0, [wp] + readers, tee.bytes, tee.chunk, args.consumers, tee.mode) and ok and tee.error is None
+    return 0 if ok else 1
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="gifclip_bench", description="GifClip Maker engine benchmarks")
+    parser.add_argument("--ffmpeg", default=engine.DEFAULT_FFMPEG)
+    parser.add_argument("--gifski", default=engine.DEFAULT_GIFSKI)
+    parser.add_argument("--ffprobe", default=engine.DEFAULT_FFPROBE)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("encoders", help="Compare GIF encoder backends (gifski / ffmpeg / native) on one clip")
+    p.add_argument("input")
+    p.add_argument("--encoders", help="Comma-separated subset, e.g. native,gifski")
+    p.add_argument("--dither", default="ordered,diffusion", help="Native encoder dither modes to run")
+    p.add_argument("--fps", type=int, default=15)
+    p.add_argument("--quality", type=int, default=80)
+    p.add_argument("--width", type=int, default=480, help="Output width (0 = source size)")
+    p.add_argument("--start", type=float, default=0.0, help="Start (s)")
+    p.add_argument("--duration", type=float, default=10.0, help="Length (s, 0 = to the end)")
+    p.set_defaults(func=bench_encoders)
+
+    p = sub.add_parser("segments", help="Wall time of one conversion split into N parallel parts")
+    p.add_argument("input")
+    p.add_argument("--counts", default="1,2,4,8", help="Comma-separated part counts")
+    p.add_argument("--format", default="GIF")
+    p.add_argument("--fps", type=int, default=15)
+    p.add_argument("--quality", type=int, default=80)
+    p.add_argument("--width", type=int, default=0, help="Output width (0 = source size)")
+    p.add_argument("--start", type=float, default=0.0, help="Start (s)")
+    p.add_argument("--duration", type=float, default=60.0, help="Length (s, 0 = to the end)")
+    p.set_defaults(func=bench_segments)
+
+    p = sub.add_parser("pipe", help="Frame pipe throughput: default vs. enlarged pipe, tee/splice vs. Python relay")
+    p.add_argument("--input", help="Source clip (default: ffmpeg testsrc2)")
+    p.add_argument("--size", default="1920x1080")
+    p.add_argument("--rate", type=int, default=60)
+    p.add_argument("--duration", type=float, default=10.0, help="Seconds of frames")
+    p.add_argument("--consumers", type=int, default=2, help="Readers of the same stream in the tee modes")
+    p.set_defaults(func=bench_pipe)
+
+    p = sub.add_parser("seek", help="Compare trim strategies (output seek / fast / keyframe index) at late start times")
+    p.add_argument("input")
+    p.add_argument("--starts", default="10,60,300", help="Comma-separated start times (s)")
+    p.add_argument("--duration", type=float, default=5.0, help="Trimmed length (s)")
+    p.add_argument("--fps", type=int, default=15)
+    p.set_defaults(func=bench_seek)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.out = sys.stdout
+    # Engine debug prints must not corrupt the JSON stream
+    with contextlib.redirect_stdout(sys.stderr):
+        return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
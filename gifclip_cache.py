@@ -0,0 +1,213 @@
+"""
+Output cache for GifClip Maker.
+
+Finished outputs are stored under the user cache folder, addressed by a
+fingerprint of the source (size, mtime and a hash of three 1 MiB blocks) plus
+the normalized settings that shape the output. Converting the same source with
+the same settings again is a hardlink (or copy) instead of an encode. Plain
+Python, no Qt imports.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+from gifclip_engine import build_crop_filter, compute_output_resolution, get_cache_dir, is_valid_output
+
+OUTPUT_CACHE_VERSION = 1
+FINGERPRINT_BLOCK = 1024 * 1024
+
+# -------- Keys --------
+
+_fingerprints = {} # (abspath, size, mtime_ns) -> fingerprint
+_fingerprints_lock = threading.Lock()
+
+def source_fingerprint(path):
+    # size + mtime + hash of the first, middle and last block (full hashes of multi-GB sources
+    # would cost as much as a short encode). None if the file is gone.
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    memo = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _fingerprints_lock:
+        if memo in _fingerprints:
+            return _fingerprints[memo]
+    h = hashlib.sha1(f"{st.st_size}|{st.st_mtime_ns}".encode("utf-8"))
+    try:
+        with open(path, "rb") as f:
+            for offset in (0, max(0, st.st_size // 2 - FINGERPRINT_BLOCK // 2), max(0, st.st_size - FINGERPRINT_BLOCK)):
+                f.seek(offset)
+                h.update(f.read(FINGERPRINT_BLOCK))
+    except OSError:
+        return None
+    fp = h.hexdigest()
+    with _fingerprints_lock:
+        _fingerprints[memo] = fp
+    return fp
+
+def normalized_output(task_format, s):
+    # Only what changes the output bytes, with resolution/crop already resolved
+    # (e.g. scale 50% and a custom size giving the same pixels share one entry)
+    crop_filter, eff_w, eff_h = build_crop_filter(s)
+    w, h = compute_output_resolution(eff_w, eff_h, s['resize_mode'], s['width'], s['height'], s['scale'])
+    return {
+        "format": "GIF" if str(task_format).upper() == "GIF" else "WebP",
+        "w": w, "h": h,
+        "fps": s['fps'],
+        "quality": s['quality'],
+        "start": s['start_time'] if s['start_time'] >= 0 else 0,
+        "end": s['end_time'] if s['end_time'] > 0 else -1,
+        "crop": crop_filter or "",
+        "target_size_mb": s.get('target_size_mb', 0) or 0,
+        "target_tolerance": s.get('target_tolerance', 0.1) if s.get('target_size_mb', 0) else 0,
+        "palette": s.get('gif_palette', "full") if str(task_format).upper() == "GIF" else "",
+        "dither": s.get('gif_dither', "ordered") if str(task_format).upper() == "GIF" else "",
+        "optimize": bool(s.get('gif_optimize')) if str(task_format).upper() == "GIF" else False,
+        "dedup": s.get('dedup_threshold', 0) or 0,
+        "trim": s.get('trim_mode', "auto"),
+        "segments": s.get('segments', 1),
+    }
+
+def task_key(task, encoder):
+    # encoder: identifies the GIF path in use ("gifski" / "ffmpeg"), which changes the bytes
+    fp = source_fingerprint(task['path'])
+    if fp is None:
+        return None
+    settings = task['settings']
+    if task.get('outputs'):
+        outputs = [normalized_output(dict(settings, **spec).get('format', task['format']), dict(settings, **spec))
+                   for spec in task['outputs']]
+    else:
+        outputs = [normalized_output(task['format'], settings)]
+    raw = json.dumps({"v": OUTPUT_CACHE_VERSION, "src": fp, "encoder": encoder, "outputs": outputs}, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+# -------- Cache --------
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Other volume, FAT/network share, ...
+        shutil.copy2(src, dst)
+
+class OutputCache:
+    # Entries are <key>.<n>.<ext> files (n = output number of the task) plus a JSON index with
+    # their sizes. A hit is verified (size and GIF/WebP header) before it is used, since a
+    # hardlinked output edited in place would also change the cached file.
+    # max_bytes: evict least recently used entries above this size (0 = no limit).
+    def __init__(self, folder, max_bytes=4 * 1024**3):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(folder, "index.json")
+        self.entries = {} # key -> {"files": [name, ...], "sizes": [...], "used": counter}
+        self._clock = 0
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self.load()
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls(os.path.join(get_cache_dir(), "outputs"))
+        return cls._default
+
+    def load(self):
+        if not os.path.exists(self.index_path): return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == OUTPUT_CACHE_VERSION:
+                self.entries = data.get("entries", {})
+                self._clock = max([e.get("used", 0) for e in self.entries.values()] + [0])
+        except Exception as e:
+            print(f"Output cache index unreadable, starting empty: {e}")
+
+    def save(self):
+        with self._lock:
+            data = {"version": OUTPUT_CACHE_VERSION, "entries": dict(self.entries)}
+        tmp = f"{self.index_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.index_path)
+        except Exception as e:
+            print(f"Could not save output cache index: {e}")
+
+    def fetch(self, key, outs):
+        # Materializes a cached entry at the output paths `outs`; False on miss or stale entry
+        if key is None: return False
+        with self._lock:
+            entry = self.entries.get(key)
+        if not entry or len(entry["files"]) != len(outs):
+            return False
+        files = [os.path.join(self.folder, name) for name in entry["files"]]
+        for f, size in zip(files, entry["sizes"]):
+            if not is_valid_output(f, size):
+                self.drop(key)
+                return False
+        # Every output is staged under a temp name first and only renamed into place once all of
+        # them are there, so a failed link/copy leaves no partial set of outputs behind
+        tmps = [out + ".cache.tmp" for out in outs]
+        try:
+            for f, tmp in zip(files, tmps):
+                if os.path.exists(tmp): os.remove(tmp) # Left over by a crash; os.link will not overwrite
+                _link_or_copy(f, tmp)
+            for tmp, out in zip(tmps, outs):
+                os.replace(tmp, out)
+        except OSError as e:
+            print(f"Output cache hit unusable: {e}")
+            return False
+        finally:
+            for tmp in tmps:
+                if os.path.exists(tmp): os.remove(tmp)
+        with self._lock:
+            self._clock += 1
+            entry["used"] = self._clock
+        self.save()
+        return True
+
+    def store(self, key, outs):
+        if key is None: return
+        names, sizes = [], []
+        try:
+            for n, out in enumerate(outs):
+                if not is_valid_output(out):
+                    return # Failed/partial output: never cache it
+                name = f"{key}.{n}{os.path.splitext(out)[1]}"
+                dst = os.path.join(self.folder, name)
+                if os.path.exists(dst): os.remove(dst)
+                _link_or_copy(out, dst)
+                names.append(name)
+                sizes.append(os.path.getsize(dst))
+        except OSError as e:
+            print(f"Could not store output in cache: {e}")
+            return
+        with self._lock:
+            self._clock += 1
+            self.entries[key] = {"files": names, "sizes": sizes, "used": self._clock}
+        self.evict()
+        self.save()
+
+    def drop(self, key):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+        for name in (entry or {}).get("files", []):
+            try: os.remove(os.path.join(self.folder, name))
+            except OSError: pass
+
+    def evict(self):
+        if not self.max_bytes: return
+        with self._lock:
+            order = sorted(self.entries, key=lambda k: self.entries[k].get("used", 0))
+            total = sum(sum(e["sizes"]) for e in self.entries.values())
+        for key in order[:-1]: # Keep at least the newest entry
+            if total <= self.max_bytes: break
+            with self._lock:
+                total -= sum(self.entries.get(key, {}).get("sizes", []))
+            self.drop(key)
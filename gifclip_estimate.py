@@ -0,0 +1,978 @@
+"""
+Output size estimation for GifClip Maker.
+
+SizeEstimator encodes short samples of the trimmed range (3-point sampling)
+and extrapolates the full output size; many files are estimated in a worker
+pool. The decoded sample frames are kept in an on-disk LRU (SampleCache) so
+re-estimates only re-run the encoder. TargetSizeSearch uses it to find
+quality / fps / scale settings that fit a size limit before the single full
+encode. SizeModel gives an instant (no encode) figure from the packet index,
+calibrated on finished conversions. Plain Python, no Qt imports.
+"""
+
+import os
+import json
+import math
+import time
+import bisect
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from gifclip_engine import (
+    build_crop_filter, compute_output_resolution, default_worker_count, get_cache_dir, get_startup_info,
+    webp_codec_args, gif_encoder_for, palette_filter, dedup_filter
+)
+from gifclip_sched import ThreadBudget, split_threads, ffmpeg_thread_args, encoder_env
+from gifclip_pipe import PipeTee, set_pipe_size
+
+# -------- Sample Cache --------
+
+class SampleCache:
+    # Size-bounded LRU of decoded + filtered sample frames (yuv4mpeg files on disk).
+    # Keyed by source (path, size, mtime) and everything that shapes the frames:
+    # trim, sample length, crop, output size and fps. Quality/format are not part of
+    # the key, so re-estimating after a quality change only re-runs the encoder.
+    # Recency is the file mtime (touched on hit), so the LRU order survives restarts.
+    def __init__(self, folder, max_bytes=2 * 1024**3):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self.evict() # Also drops leftovers of interrupted decodes
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        # One instance per process (GUI estimate runs, target-size searches)
+        if cls._default is None:
+            cls._default = cls(os.path.join(get_cache_dir(), "samples"))
+        return cls._default
+
+    def accepts(self, expected_bytes):
+        # A single stream may use at most half of the budget
+        return expected_bytes <= self.max_bytes / 2
+
+    def key(self, path, starts, seg_dur, crop, w, h, fps):
+        # starts + seg_dur pin down the trim and the sample placement
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        points = ",".join(f"{t:.3f}" for t in starts)
+        raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{points}|{seg_dur:.3f}|{crop}|{w}x{h}|{fps}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.folder, key + ".y4m")
+
+    def get(self, key):
+        if key is None: return None
+        f = self._file(key)
+        try:
+            os.utime(f) # Mark as recently used
+        except OSError:
+            return None
+        return f
+
+    def temp_path(self, key):
+        # Written by the decoder, then moved in by put() (concurrent decodes never see partial files)
+        return os.path.join(self.folder, f"{key}.{threading.get_ident()}.tmp")
+
+    def put(self, key, tmp):
+        f = self._file(key)
+        try:
+            os.replace(tmp, f)
+        except OSError as e:
+            print(f"Could not store sample stream: {e}")
+            return None
+        self.evict(keep=f)
+        return f
+
+    def evict(self, keep=None):
+        # Drop least recently used streams until the folder fits max_bytes
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.folder):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(".tmp") and keep is None:
+                    # Only at startup: a .tmp is an interrupted decode from an earlier run
+                    try: os.remove(entry.path)
+                    except OSError: pass
+                    continue
+                entries.append((st.st_mtime, entry.path, st.st_size))
+                total += st.st_size
+            entries.sort()
+            for _, path, size in entries:
+                if total <= self.max_bytes: break
+                if path == keep or path.endswith(".tmp"): continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass # Still open by a running encode (Windows)
+
+# -------- Size Estimation --------
+
+def effective_range(s, total_duration):
+    # Trimmed (start_sec, duration) of a task, in seconds
+    start_ms = s.get('start_time', -1)
+    end_ms = s.get('end_time', -1)
+
+    # Defaults
+    start_sec = 0.0
+    end_sec = total_duration
+
+    if start_ms >= 0:
+        start_sec = start_ms / 1000.0
+
+    if end_ms > 0:
+        # If end_time is valid and less than total, use it
+        # (Also guard against end < start)
+        e_sec = end_ms / 1000.0
+        if e_sec > start_sec:
+            end_sec = min(total_duration, e_sec)
+
+    effective_duration = max(0, end_sec - start_sec)
+
+    if effective_duration <= 0:
+        # Fallback just in case
+        effective_duration = total_duration
+        start_sec = 0
+    return start_sec, effective_duration
+
+# Ranges at least this long (seconds) use adaptive sampling in "auto" mode
+ADAPTIVE_MIN_DURATION = 60
+
+# Two-sided 95% Student t quantiles by degrees of freedom (few samples -> wide band)
+T95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+       10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 30: 2.042}
+
+def t95(df):
+    if df <= 0: return float("inf")
+    for d in sorted(T95, reverse=True):
+        if df >= d:
+            return T95[d] if df <= 30 else 1.96
+    return T95[1]
+
+def extrapolate(rates, duration, exact=False, weights=None):
+    # Per-sample bytes/sec -> estimate with a 95% confidence band for `duration` seconds.
+    # weights: share of the range each sample stands for (stratified placement), default equal
+    n = len(rates)
+    if not weights:
+        weights = [1.0 / n] * n
+    total_w = sum(weights)
+    weights = [wt / total_w for wt in weights]
+    mean = sum(wt * r for wt, r in zip(weights, rates))
+    var = sum(wt * (r - mean) ** 2 for wt, r in zip(weights, rates)) * n / (n - 1) if n > 1 else 0.0
+    if exact:
+        half = 0.0
+    elif n > 1:
+        half = t95(n - 1) * math.sqrt(var * sum(wt * wt for wt in weights))
+    else:
+        half = mean # One sample: no spread information, report a wide band
+    return {
+        "bytes": int(mean * duration),
+        "bytes_low": int(max(0.0, mean - half) * duration),
+        "bytes_high": int((mean + half) * duration),
+        "bps_variance": var,
+        "rel_error": half / mean if mean > 0 else 0.0, # Half-width of the band relative to the estimate
+        "confidence": 0.95,
+    }
+
+class ComplexityMap:
+    # Maps u in [0, 1] onto the trimmed range so that equal steps of u cover equal shares of
+    # "complexity": half plain time, half video packet bytes (see gifclip_probe.probe_packets).
+    # Samples at evenly spread u land more densely in high-motion parts, while the time mix
+    # keeps static parts (title cards, credits) covered. Without an index it is the identity.
+    def __init__(self, start, duration, index=None, mix=0.5):
+        self.start = start
+        self.duration = duration
+        self.index = index
+        n = 1
+        density = [1.0]
+        if index and index.get("bytes"):
+            b = index["bin"]
+            buckets = index["bytes"]
+            n = max(1, int(math.ceil(duration / b)))
+            c = [buckets[min(len(buckets) - 1, int((start + (i + 0.5) * duration / n) / b))] for i in range(n)]
+            total = float(sum(c))
+            density = [(1.0 - mix) / n + (mix * ci / total if total > 0 else mix / n) for ci in c]
+        # Cumulative share at each of the n+1 equally spaced time points
+        self.cum = [0.0]
+        for d in density:
+            self.cum.append(self.cum[-1] + d)
+        self.cum = [x / self.cum[-1] for x in self.cum]
+
+    def time_at(self, u):
+        n = len(self.cum) - 1
+        i = max(0, min(n - 1, bisect.bisect_right(self.cum, u) - 1))
+        seg = self.cum[i + 1] - self.cum[i]
+        f = (u - self.cum[i]) / seg if seg > 0 else 0.0
+        return self.start + (i + max(0.0, min(1.0, f))) * self.duration / n
+
+    def sample_start(self, u, seg_dur):
+        # Start of a seg_dur sample centred on u, kept inside the range
+        t = self.time_at(u) - seg_dur / 2
+        return max(self.start, min(self.start + self.duration - seg_dur, t))
+
+    def packet_rate(self, t0, t1):
+        # Mean packet bytes/sec of the index over [t0, t1] (None without an index)
+        if not self.index: return None
+        b = self.index["bin"]
+        buckets = self.index["bytes"]
+        i0 = max(0, int(t0 / b))
+        i1 = max(i0 + 1, min(len(buckets), int(math.ceil(t1 / b))))
+        part = buckets[i0:i1]
+        return sum(part) / (len(part) * b) if part else None
+
+    def weights(self, us):
+        # Share of the range each sample at u stands for: its cell between midpoints, in time
+        order = sorted(range(len(us)), key=lambda i: us[i])
+        su = [us[i] for i in order]
+        bounds = [0.0] + [(a + b) / 2 for a, b in zip(su, su[1:])] + [1.0]
+        w = [0.0] * len(us)
+        for k, i in enumerate(order):
+            w[i] = (self.time_at(bounds[k + 1]) - self.time_at(bounds[k])) / self.duration
+        return w
+
+def extrapolate_ratio(rates, packet_rates, range_packet_rate, duration, weights=None):
+    # Ratio estimator: output bytes follow source packet bytes, so estimate output/packet
+    # bytes on the samples and scale the packet bytes of the whole range. Usually much tighter
+    # than extrapolate() because the index already "knows" where the heavy parts are.
+    n = len(rates)
+    weights = weights or [1.0 / n] * n
+    total_w = sum(weights)
+    weights = [wt / total_w for wt in weights]
+    x_mean = sum(wt * x for wt, x in zip(weights, packet_rates))
+    if n < 2 or x_mean <= 0 or range_packet_rate <= 0:
+        return extrapolate(rates, duration, weights=weights)
+    ratio = sum(wt * y for wt, y in zip(weights, rates)) / x_mean
+    mean = ratio * range_packet_rate
+    resid = [y - ratio * x for y, x in zip(rates, packet_rates)]
+    var = sum(wt * e * e for wt, e in zip(weights, resid)) * n / (n - 1)
+    half = t95(n - 1) * math.sqrt(var * sum(wt * wt for wt in weights)) * range_packet_rate / x_mean
+    return {
+        "bytes": int(mean * duration),
+        "bytes_low": int(max(0.0, mean - half) * duration),
+        "bytes_high": int((mean + half) * duration),
+        "bps_variance": sum(wt * (y - mean) ** 2 for wt, y in zip(weights, rates)) * n / (n - 1),
+        "rel_error": half / mean if mean > 0 else 0.0,
+        "confidence": 0.95,
+    }
+
+def format_estimate(res):
+    # One-line text for a result of SizeEstimator.estimate, e.g. "clip.mp4: ~3.2 MB (Expected, 2.9-3.5 MB)"
+    if res.get("error"):
+        return f"{res['filename']}: Error ({res['error']})"
+    mb = res["bytes"] / (1024 * 1024)
+    if res.get("bytes_high", res["bytes"]) > res.get("bytes_low", res["bytes"]):
+        lo, hi = res["bytes_low"] / (1024 * 1024), res["bytes_high"] / (1024 * 1024)
+        return f"{res['filename']}: ~{mb:.1f} MB (Expected, {lo:.1f}-{hi:.1f} MB)"
+    return f"{res['filename']}: ~{mb:.1f} MB (Expected)"
+
+class SizeEstimator:
+    # sampling: "fixed" (3 points, seg_ratio of the range each), "adaptive" (short probes added
+    # until the band is within target_rel_error, see _sample_adaptive) or "auto" (adaptive for
+    # ranges of ADAPTIVE_MIN_DURATION or more)
+    # placement: "complexity" (samples follow the packet-size index, see ComplexityMap; built with
+    # ffprobe if not cached yet) or "uniform" (fixed percentages); "auto" = complexity when the
+    # index is already cached (ProbePool(packets=True) builds it in the background), else uniform
+    # thread_budget: gifclip_sched.ThreadBudget (None = the default one, shared with conversions);
+    # lease: thread share to use outside estimate_batch (e.g. the conversion job of a target-size search)
+    def __init__(self, ffmpeg_path, gifski_path, ffprobe_path=None, sample_cache=None, sampling="auto",
+                 target_rel_error=0.1, probe_seconds=1.5, max_probes=27, placement="auto",
+                 thread_budget=None, lease=None):
+        self.ffmpeg = ffmpeg_path
+        self.gifski = gifski_path
+        self.ffprobe = ffprobe_path
+        self.sample_cache = sample_cache # SampleCache or None (always decode)
+        self.sampling = sampling
+        self.target_rel_error = target_rel_error
+        self.probe_seconds = probe_seconds
+        self.max_probes = max_probes
+        self.placement = placement
+        self.thread_budget = thread_budget or ThreadBudget.default()
+        self.lease = lease
+        self._job = threading.local() # lease / parts of the estimate on the current thread
+        self.is_running = True
+        self.processes = []
+        self._lock = threading.Lock()
+
+    def stop(self):
+        # Stop any running estimation
+        self.is_running = False
+        with self._lock:
+            procs = list(self.processes)
+            self.processes.clear()
+        for p in procs:
+            try:
+                if p.poll() is None:
+                    p.terminate()
+                    p.kill()
+            except Exception as e:
+                print(f"Error killing estimate process: {e}")
+
+    def _popen(self, cmd, owned, **kwargs):
+        p = subprocess.Popen(cmd, startupinfo=get_startup_info(), **kwargs)
+        owned.append(p)
+        with self._lock:
+            self.processes.append(p)
+            cancelled = not self.is_running
+        if cancelled: p.kill()
+        return p
+
+    def job_threads(self):
+        # Same as ConversionEngine.job_threads: the estimate's current share, split between parallel samples
+        lease = getattr(self._job, "lease", None) or self.lease
+        n = lease.threads if lease else self.thread_budget.total
+        return max(1, n // getattr(self._job, "parts", 1))
+
+    def _decode_args(self, path, starts, seg_dur, vf, threads=1):
+        # ffmpeg inputs + filters for the sample frames (output options are added by the caller)
+        # -threads is per input (one decoder per sample), -filter_threads covers the whole graph
+        args = ["-filter_threads", str(threads)]
+        for t in starts:
+            args.extend(["-threads", str(threads), "-ss", str(t), "-t", str(seg_dur), "-i", path])
+        if len(starts) == 1:
+            # Single chunk
+            return args + (["-vf", vf] if vf else [])
+        # Complex Filter: Concat -> PostProcess
+        # [0:v][1:v][2:v]concat=n=3:v=1:a=0[vcat];[vcat]filters...[out]
+        ins = "".join(f"[{i}:v]" for i in range(len(starts)))
+        fc = f"{ins}concat=n={len(starts)}:v=1:a=0[vcat];[vcat]{vf}[out]"
+        return args + ["-filter_complex", fc, "-map", "[out]"]
+
+    def _decode_tee(self, decode_args, consumer, cache, key, owned):
+        # Decodes the samples once into the encoder's stdin (`consumer`, left open for the caller)
+        # and the sample cache at the same time: gifclip_pipe.PipeTee copies the stream in the
+        # kernel on Linux. Returns the cached file, or None if the decode or the copy failed.
+        tmp = cache.temp_path(key)
+        cmd = [self.ffmpeg, "-y"] + decode_args + ["-pix_fmt", "yuv420p", "-f", "yuv4mpegpipe", "-"]
+        p = self._popen(cmd, owned, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        with open(tmp, "wb") as f:
+            tee = PipeTee(p.stdout.fileno(), [consumer.fileno(), f.fileno()])
+            tee.run()
+        p.stdout.close() # An encoder that quit early: ffmpeg gets EPIPE instead of blocking
+        p.wait()
+        if p.returncode != 0 or tee.error or not self.is_running:
+            try: os.remove(tmp)
+            except OSError: pass
+            return None
+        return cache.put(key, tmp)
+
+    def estimate_task(self, task, idx=0):
+        # Returns a one-line result for the task, e.g. "clip.mp4: ~3.2 MB (Expected)"
+        return format_estimate(self.estimate(task, idx))
+
+    def estimate(self, task, idx=0, seg_ratio=0.11, split_segments=False):
+        # Returns a record (error None on success):
+        #   filename, path, width, height   resolved output size
+        #   bytes, bytes_low, bytes_high    estimate and its 95% confidence band
+        #   segments                        [{"start", "duration", "bytes", "bytes_per_sec"}] per sample
+        #   bps_variance, rel_error         spread between samples, band half-width / estimate
+        #   sample_seconds                  wall time spent encoding samples
+        # seg_ratio: share of the trimmed range encoded at each of the 3 sample points.
+        # split_segments: encode the 3 samples at the same time (3 pipelines) instead of one by one
+        path = task.get("path", "Unknown")
+        res = {"filename": os.path.basename(path), "path": path, "bytes": 0, "bytes_low": 0, "bytes_high": 0,
+               "width": 0, "height": 0, "segments": [], "bps_variance": 0.0, "rel_error": 0.0,
+               "confidence": 0.95, "sample_seconds": 0.0, "placement": "uniform", "error": None}
+        owned = [] # Processes of this call only (several estimates may run at once)
+        try:
+            s = task["settings"]
+
+            # Duration needed (This is the trimmed duration in seconds)
+            total_duration = s.get("duration", 0)
+            if total_duration <= 0:
+                from gifclip_probe import probe_media
+                total_duration = probe_media(path, self.ffprobe, self.ffmpeg)["duration"]
+
+            if total_duration <= 0:
+                res["error"] = "Unknown Duration"
+                return res
+
+            # --- Effective Duration (Trim Support) ---
+            start_sec, effective_duration = effective_range(s, total_duration)
+
+            # Prepare Crop Logic ONCE
+            crop_filter_str, eff_orig_w, eff_orig_h = build_crop_filter(s)
+
+            w, h = compute_output_resolution(eff_orig_w, eff_orig_h, s['resize_mode'],
+                                           s['width'], s['height'], s['scale'])
+            res["width"], res["height"] = w, h
+
+            # Each sample is encoded on its own so the spread between them is known
+            t0 = time.monotonic()
+            encode = lambda t, d: self._encode_sample(path, s, w, h, [t], d, crop_filter_str, owned, idx)
+
+            cmap = self._complexity_map(path, start_sec, effective_duration)
+            res["placement"] = "complexity" if cmap.index else "uniform"
+            weights = None
+
+            if self._use_adaptive(effective_duration):
+                seg_dur = self.probe_seconds
+                starts, sizes, weights = self._sample_adaptive(encode, cmap, split_segments)
+            else:
+                # --- 3-Point Distributed Sampling Strategy (User Request) ---
+                # Sample 11% from Start, Middle, and End (Total 33%)
+                # This provides a statistically superior VBR estimate compared to a single chunk.
+
+                seg_dur = effective_duration * seg_ratio
+
+                # Safety for very short clips
+                if seg_dur < 0.5: seg_dur = 0.5 # Minimum 0.5s per chunk
+                if seg_dur * 3 > effective_duration:
+                    # If total samples exceed duration (very short video), fall back to Single Full Chunk
+                    seg_dur = effective_duration
+                    starts = [start_sec]
+                elif cmap.index:
+                    # Same 3 samples, placed by content complexity instead of fixed percentages
+                    us = [1 / 6, 1 / 2, 5 / 6]
+                    starts = [cmap.sample_start(u, seg_dur) for u in us]
+                    weights = cmap.weights(us)
+                else:
+                    t1 = start_sec
+                    t2 = start_sec + (effective_duration * 0.445) # Center-ish
+                    t3 = start_sec + (effective_duration - seg_dur) # End
+                    # Clamp t3
+                    if t3 < t1: t3 = t1
+                    starts = [t1, t2, t3]
+                sizes = self._encode_all(encode, starts, seg_dur, split_segments)
+            res["sample_seconds"] = round(time.monotonic() - t0, 3)
+
+            # Check size
+            if sum(sizes) > 0 and all(sizes):
+                weights = weights or [1.0 / len(starts)] * len(starts)
+                res["segments"] = [{"start": round(t, 3), "duration": round(seg_dur, 3), "bytes": b,
+                                    "bytes_per_sec": b / seg_dur, "weight": round(wt, 4)}
+                                   for t, b, wt in zip(starts, sizes, weights)]
+                # One sample spanning the whole range (short clip): the estimate is exact. Several
+                # samples can add up to more than the range (overlapping adaptive probes on a short
+                # clip) without covering all of it.
+                exact = len(starts) == 1 and seg_dur >= effective_duration
+                res.update(self._extrapolate(cmap, starts, sizes, seg_dur, weights, exact))
+            else:
+                res["error"] = "0 bytes"
+
+        except Exception as e:
+            res["error"] = str(e)
+        finally:
+            # Cleanup processes just in case
+            for p in owned:
+                if p.poll() is None:
+                    p.terminate()
+                    try: p.wait(timeout=0.5)
+                    except subprocess.TimeoutExpired: p.kill()
+            with self._lock:
+                for p in owned:
+                    if p in self.processes: self.processes.remove(p)
+        return res
+
+    def _encode_all(self, encode, starts, seg_dur, parallel):
+        if parallel and len(starts) > 1:
+            lease = getattr(self._job, "lease", None)
+            workers = min(3, len(starts))
+
+            def run(t):
+                # Parallel samples split the estimate's thread share
+                self._job.lease, self._job.parts = lease, workers
+                try:
+                    return encode(t, seg_dur)
+                finally:
+                    self._job.lease, self._job.parts = None, 1
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="estimate-seg") as pool:
+                return list(pool.map(run, starts))
+        return [encode(t, seg_dur) for t in starts]
+
+    def _use_adaptive(self, duration):
+        if self.sampling == "adaptive":
+            return duration >= self.probe_seconds * 6 # Too short to stratify: fixed 3-point is cheaper
+        return self.sampling == "auto" and duration >= ADAPTIVE_MIN_DURATION
+
+    def _complexity_map(self, path, start, duration):
+        # "auto" never scans here: a full-file ffprobe pass could take longer than the samples
+        index = None
+        if self.placement != "uniform":
+            from gifclip_probe import get_packet_index
+            index = get_packet_index(path, self.ffprobe, cached_only=self.placement == "auto")
+        return ComplexityMap(start, duration, index)
+
+    def _extrapolate(self, cmap, starts, sizes, seg_dur, weights, exact=False):
+        rates = [b / seg_dur for b in sizes]
+        if cmap.index and not exact:
+            packet_rates = [cmap.packet_rate(t, t + seg_dur) for t in starts]
+            if all(packet_rates):
+                return extrapolate_ratio(rates, packet_rates, cmap.packet_rate(cmap.start, cmap.start + cmap.duration),
+                                         cmap.duration, weights)
+        return extrapolate(rates, cmap.duration, exact, weights)
+
+    def _sample_adaptive(self, encode, cmap, parallel):
+        # Short probes at stratified positions (strata in ComplexityMap space); each round
+        # splits every stratum in three, so the previous probes stay at the centres and only the
+        # new ones are encoded (3, 9, 27, ... probes in total) until the confidence band is within
+        # target_rel_error or max_probes is reached.
+        # Probe size is fixed, so the cost depends on how uniform the clip is, not on its length.
+        probe = self.probe_seconds
+        us, starts, sizes = [], [], []
+        n = 3
+        while self.is_running:
+            new = [(2 * i + 1) / (2 * n) for i in range(n)]
+            new = [u for u in new if all(abs(u - v) > 1e-9 for v in us)][:self.max_probes - len(us)]
+            if not new: break
+            us.extend(new)
+            new_starts = [cmap.sample_start(u, probe) for u in new]
+            starts.extend(new_starts)
+            sizes.extend(self._encode_all(encode, new_starts, probe, parallel))
+            if not all(sizes): break # Failed probe, reported by the caller
+            est = self._extrapolate(cmap, starts, sizes, probe, cmap.weights(us))
+            if est["rel_error"] <= self.target_rel_error or len(us) >= self.max_probes:
+                break
+            n *= 3
+        weights = cmap.weights(us)
+        order = sorted(range(len(starts)), key=lambda i: starts[i])
+        return [starts[i] for i in order], [sizes[i] for i in order], [weights[i] for i in order]
+
+    def _encode_sample(self, path, s, w, h, starts, seg_dur, crop_filter_str, owned, idx=0):
+        # Encodes the samples at `starts` (seg_dur each, concatenated) and returns the output size in bytes
+        fmt = s["format"].lower()
+        ext = "gif" if "gif" in fmt else "webp"
+        # Unique temp file (estimates can run concurrently)
+        fd, temp_file = tempfile.mkstemp(prefix=f"temp_estimate_{idx}_", suffix=f".{ext}")
+        os.close(fd)
+        try:
+            # Build Common Filters (Crop -> Scale -> FPS)
+            filters = []
+            if crop_filter_str: filters.append(crop_filter_str)
+            if w > 0 and h > 0:
+                filters.append(f"scale={w}:{h}:flags=lanczos")
+            # FPS is usually handled by -r or filter. Let's use filter for complex chain safety.
+            filters.append(f"fps={s['fps']}")
+
+            post_process_filter = ",".join(filters)
+
+            # Decode side (seeks -> concat -> crop/scale/fps) is the same for GIF and WebP
+            # and does not depend on quality: keep its yuv4mpeg output in the sample cache.
+            y4m = None
+            fill_key = None # Cache miss: the decode fills the cache while the encoder reads it
+            cache = self.sample_cache
+            if cache is not None and w > 0 and h > 0 and cache.accepts(w * h * 1.5 * seg_dur * len(starts) * s['fps']):
+                key = cache.key(path, starts, seg_dur, crop_filter_str, w, h, s['fps'])
+                y4m = cache.get(key)
+                if y4m is None: fill_key = key
+            # GIF samples use the backend the conversion will use (ConversionEngine.gif_encoder_name)
+            encoder = gif_encoder_for(s, self.gifski) if "gif" in fmt else ""
+            # Separate decoder and encoder processes split the thread share
+            dec_threads, enc_threads = split_threads(self.job_threads(), encoder in ("gifski", "native") or bool(fill_key))
+            decode_args = self._decode_args(path, starts, seg_dur, post_process_filter, dec_threads)
+
+            if encoder == "gifski":
+                 # GIFSKI Pipeline
+                 cmd_gifski = [self.gifski, "-o", temp_file]
+                 cmd_gifski.extend(["--fps", str(s['fps']), "--quality", str(s['quality'])])
+                 if w > 0 and h > 0:
+                     cmd_gifski.extend(["--width", str(w), "--height", str(h)])
+                 cmd_gifski.append("-")
+
+                 if y4m:
+                     # Cached frames: only the encoder runs
+                     with open(y4m, "rb") as f:
+                         gif_proc = self._popen(cmd_gifski, owned, stdin=f, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                                env=encoder_env(self.job_threads()))
+                         gif_proc.wait()
+                 else:
+                     gif_proc = self._popen(cmd_gifski, owned, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                            env=encoder_env(enc_threads))
+                     set_pipe_size(gif_proc.stdin) # Whole frames per wakeup instead of 64 KB slices
+
+                     if fill_key:
+                         self._decode_tee(decode_args, gif_proc.stdin, cache, fill_key, owned)
+                     else:
+                         cmd_ffmpeg = [self.ffmpeg, "-y"] + decode_args
+                         cmd_ffmpeg.extend(["-pix_fmt", "yuv420p", "-f", "yuv4mpegpipe", "-"])
+
+                         ff_proc = self._popen(cmd_ffmpeg, owned, stdout=gif_proc.stdin, stderr=subprocess.DEVNULL)
+                         ff_proc.wait()
+                     gif_proc.communicate()
+
+            elif encoder == "native":
+                # In-process encoder on raw RGB frames, as ConversionEngine.gif_native
+                self._encode_native(s, w, h, y4m, fill_key, decode_args, enc_threads, temp_file, owned)
+
+            else:
+                # WebP Pipeline Match (Strategy v16: Standard Q75 + NoDenoise)
+                # "Ezgif Style" -> Sharp, Higher Rate, User Control FPS.
+                # fps is already applied by post_process_filter.
+                # The ffmpeg GIF encoder (palettegen/paletteuse) runs the same way, as gif_ffmpeg.
+                gif_filter = None
+                if encoder == "ffmpeg":
+                    decimate = dedup_filter(s.get('dedup_threshold', 0))
+                    gif_filter = ",".join(f for f in (decimate, palette_filter(s.get('gif_palette', "full"))) if f)
+                    output_args = ["-loop", "0"] + (["-vsync", "vfr"] if decimate else [])
+                else:
+                    output_args = webp_codec_args(s['quality'])
+                cmd_ffmpeg = [self.ffmpeg, "-y"]
+                if y4m or fill_key:
+                    # Cached frames, or the decode being cached right now (over stdin)
+                    cmd_ffmpeg.extend(ffmpeg_thread_args(enc_threads if fill_key else self.job_threads()) +
+                                      ["-f", "yuv4mpegpipe", "-i", y4m or "-"])
+                    if gif_filter: cmd_ffmpeg.extend(["-lavfi", gif_filter])
+                elif gif_filter:
+                    cmd_ffmpeg.extend(self._decode_args(path, starts, seg_dur, f"{post_process_filter},{gif_filter}",
+                                                        dec_threads))
+                else:
+                    cmd_ffmpeg.extend(decode_args)
+                cmd_ffmpeg.extend(output_args)
+                cmd_ffmpeg.append(temp_file)
+
+                if fill_key:
+                    p = self._popen(cmd_ffmpeg, owned, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    set_pipe_size(p.stdin)
+                    self._decode_tee(decode_args, p.stdin, cache, fill_key, owned)
+                    p.communicate()
+                else:
+                    p = self._popen(cmd_ffmpeg, owned, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    p.wait()
+
+            return os.path.getsize(temp_file) if os.path.exists(temp_file) else 0
+        finally:
+            # Cleanup temp immediate
+            if os.path.exists(temp_file):
+                try: os.remove(temp_file)
+                except: pass
+
+    def _encode_native(self, s, w, h, y4m, fill_key, decode_args, enc_threads, temp_file, owned):
+        # gifclip_gifenc.GifEncoder fed by ffmpeg (rgb24): from the cached frames, from the decode
+        # that fills the cache (converted on the way), or straight from the source
+        from gifclip_gifenc import GifEncoder
+        cmd_ffmpeg = [self.ffmpeg, "-y"]
+        if y4m or fill_key:
+            cmd_ffmpeg.extend(ffmpeg_thread_args(enc_threads if fill_key else self.job_threads()) +
+                              ["-f", "yuv4mpegpipe", "-i", y4m or "-"])
+        else:
+            cmd_ffmpeg.extend(decode_args)
+        cmd_ffmpeg.extend(["-pix_fmt", "rgb24", "-f", "rawvideo", "-"])
+        p = self._popen(cmd_ffmpeg, owned, stdin=subprocess.PIPE if fill_key else None, stdout=subprocess.PIPE,
+                        stderr=subprocess.DEVNULL)
+        gif = GifEncoder(temp_file, w, h, s['fps'], s['quality'],
+                         palette="local" if s.get('gif_palette') == "single" else "global",
+                         dither=s.get('gif_dither', "ordered"), dedup=s.get('dedup_threshold', 0))
+
+        def encode():
+            # Own thread: with fill_key this one is busy feeding the decode into ffmpeg
+            frame_size = w * h * 3
+            try:
+                while True:
+                    frame = p.stdout.read(frame_size)
+                    if len(frame) < frame_size: break
+                    gif.add(frame)
+                gif.close()
+            except Exception as e:
+                print(f"Native GIF sample failed: {e}")
+                gif.abort()
+
+        worker = threading.Thread(target=encode, name="estimate-native", daemon=True)
+        worker.start()
+        if fill_key:
+            self._decode_tee(decode_args, p.stdin, self.sample_cache, fill_key, owned)
+            p.stdin.close()
+        worker.join()
+        p.stdout.close()
+        p.wait()
+
+    def estimate_batch(self, tasks, max_workers=None, result_callback=None, split_segments=False):
+        # Estimates several files at once (bounded pool, like ConversionEngine.run_batch).
+        # result_callback(idx, result) fires as each file finishes; returns results in task order.
+        total = len(tasks)
+        results = [None] * total
+        if total == 0:
+            return results
+        workers = max_workers if max_workers and max_workers > 0 else default_worker_count(total)
+        if split_segments:
+            workers = max(1, workers // 3) # Each estimate runs 3 pipelines
+        workers = max(1, min(workers, total))
+
+        def run(idx):
+            if not self.is_running:
+                return None
+            # Shares the CPU with running conversions (gifclip_sched)
+            self._job.lease = self.thread_budget.acquire(f"estimate {idx+1}")
+            try:
+                return self.estimate(tasks[idx], idx, split_segments=split_segments)
+            finally:
+                self._job.lease.release()
+                self._job.lease = None
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="estimate") as pool:
+            futures = {pool.submit(run, idx): idx for idx in range(total)}
+            for future in as_completed(futures):
+                idx = futures[future]
+                res = future.result()
+                if res is None: continue # Stopped before it started
+                results[idx] = res
+                if result_callback: result_callback(idx, res)
+        return results
+
+# -------- Target Size Search --------
+
+class TargetSizeSearch:
+    # Finds settings whose estimated output fits target_bytes, lowering (in this order)
+    # quality -> fps -> scale, never above the user's own settings. Each knob is searched by
+    # model-guided bisection: the next probe is interpolated in log(size) between the
+    # bracketing samples, every other step falls back to the midpoint. Sample encodes are
+    # cached per parameter set, so revisiting a point is free.
+    def __init__(self, estimator, target_bytes, tolerance=0.1, min_quality=40, min_fps=8, min_scale=20,
+                 seg_ratio=0.05, max_samples=16, status_callback=None):
+        self.estimator = estimator
+        self.target = target_bytes
+        self.tolerance = tolerance
+        self.min_quality = min_quality
+        self.min_fps = min_fps
+        self.min_scale = min_scale
+        self.seg_ratio = seg_ratio # Shorter samples while exploring
+        self.max_samples = max_samples
+        self.status_callback = status_callback or (lambda msg: None)
+        self.samples = {} # (quality, fps, resize_mode, scale, width, height) -> estimated bytes
+
+    def _key(self, s):
+        return (s['quality'], s['fps'], s['resize_mode'], s['scale'], s['width'], s['height'])
+
+    def measure(self, task, s):
+        key = self._key(s)
+        if key not in self.samples:
+            if len(self.samples) >= self.max_samples:
+                return None
+            res = self.estimator.estimate(dict(task, settings=s), seg_ratio=self.seg_ratio)
+            if res["error"]:
+                raise RuntimeError(f"Size estimate failed: {res['error']}")
+            self.samples[key] = res["bytes"]
+            self.status_callback(f"q={s['quality']} fps={s['fps']} {res['width']}x{res['height']}: "
+                                 f"~{res['bytes'] / (1024 * 1024):.2f} MB")
+        return self.samples[key]
+
+    def fits(self, size):
+        return size is not None and size <= self.target
+
+    def in_band(self, size):
+        return self.fits(size) and size >= self.target * (1.0 - self.tolerance)
+
+    def search(self, task):
+        # Returns (settings, estimated_bytes); settings is a tuned copy of task['settings']
+        s = dict(task['settings'])
+        size = self.measure(task, s)
+        if self.fits(size):
+            return s, size
+
+        # Scale knob works in percent of the (cropped) source, starting from the current output size
+        _, eff_w, _ = build_crop_filter(s)
+        w, _ = compute_output_resolution(eff_w, 1, s['resize_mode'], s['width'], s['height'], s['scale'])
+        cur_scale = max(self.min_scale, min(100, int(round(100.0 * w / eff_w)))) if eff_w > 0 else 100
+
+        knobs = [
+            ("quality", self.min_quality, s['quality'], {}),
+            ("fps", self.min_fps, s['fps'], {}),
+            ("scale", self.min_scale, cur_scale, {"resize_mode": "scale"}),
+        ]
+        for key, lo, hi, extra in knobs:
+            if lo >= hi:
+                continue
+            s, size = self._bisect(task, s, key, lo, hi, size, extra)
+            if self.fits(size):
+                return s, size
+        return s, size # Best effort: every knob at its floor
+
+    def _bisect(self, task, s, key, lo, hi, size_hi, extra):
+        def at(v):
+            c = dict(s, **extra)
+            c[key] = int(v)
+            return c
+
+        size_lo = self.measure(task, at(lo))
+        if size_lo is None or not self.fits(size_lo):
+            return at(lo), size_lo # Even the floor is too big: move on to the next knob
+
+        # Invariant: lo fits, hi does not
+        step = 0
+        while hi - lo > 1:
+            if step > 0 and self.in_band(size_lo):
+                break # Close enough (the floor alone never counts: prefer the highest setting that fits)
+            if step % 2 == 0 and size_hi and size_lo > 0 and size_hi > size_lo:
+                # Model-guided: interpolate the target in log(size)
+                f = (math.log(self.target) - math.log(size_lo)) / (math.log(size_hi) - math.log(size_lo))
+                mid = int(round(lo + f * (hi - lo)))
+            else:
+                mid = (lo + hi) // 2
+            mid = max(lo + 1, min(hi - 1, mid))
+            size_mid = self.measure(task, at(mid))
+            if size_mid is None:
+                break # Sample budget exhausted
+            if self.fits(size_mid):
+                lo, size_lo = mid, size_mid
+            else:
+                hi, size_hi = mid, size_mid
+            step += 1
+        return at(lo), size_lo
+
+def correct_settings_for_size(s, actual_bytes, target_bytes, tolerance=0.1):
+    # After a full encode overshot the target: shrink the output area by the observed ratio
+    # (size is roughly proportional to pixel count), aiming at the middle of the tolerance band.
+    ratio = target_bytes * (1.0 - tolerance / 2) / max(1, actual_bytes)
+    _, eff_w, _ = build_crop_filter(s)
+    w, _ = compute_output_resolution(eff_w, 1, s['resize_mode'], s['width'], s['height'], s['scale'])
+    cur_scale = 100.0 * w / eff_w if eff_w > 0 else 100.0
+    c = dict(s)
+    c["resize_mode"] = "scale"
+    c["scale"] = max(1, int(cur_scale * math.sqrt(ratio)))
+    return c
+
+# -------- Instant Estimate --------
+
+# Prior for the size model (per format): log(out bytes/sec) =
+#   c0 + c1 * log(output pixels/sec) + c2 * log(source packet bytes per pixel) + c3 * quality/100
+# Rough values so the first estimate is in the right range; fitted results replace them.
+SIZE_MODEL_PRIOR = {
+    "GIF": [-3.2, 1.0, 0.5, 1.5],
+    "WebP": [-1.8, 0.8, 0.6, 2.5],
+}
+SIZE_MODEL_VERSION = 1
+
+def _solve(a, b):
+    # Small dense linear system (Gaussian elimination with partial pivoting)
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for c in range(n):
+        p = max(range(c, n), key=lambda r: abs(m[r][c]))
+        m[c], m[p] = m[p], m[c]
+        if abs(m[c][c]) < 1e-12:
+            return None
+        for r in range(c + 1, n):
+            f = m[r][c] / m[c][c]
+            for k in range(c, n + 1):
+                m[r][k] -= f * m[c][k]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (m[r][n] - sum(m[r][k] * x[k] for k in range(r + 1, n))) / m[r][r]
+    return x
+
+class SizeModel:
+    # Near-instant size estimate from the cached packet index (no encoding), calibrated on the
+    # real sizes of finished conversions (ConversionEngine.record_result). Coefficients are a
+    # ridge fit pulled towards SIZE_MODEL_PRIOR, so a handful of results already helps without
+    # letting one odd clip take over. Persisted as JSON next to the other caches.
+    def __init__(self, path=None, max_records=500, ridge=2.0):
+        self.path = path
+        self.max_records = max_records
+        self.ridge = ridge
+        self.records = {"GIF": [], "WebP": []} # [features..., log bytes/sec]
+        self.coef = {fmt: list(c) for fmt, c in SIZE_MODEL_PRIOR.items()}
+        self.sigma = {"GIF": 0.6, "WebP": 0.6} # Residual std in log space (prior: about x1.8)
+        self._lock = threading.Lock()
+        self.load()
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls(os.path.join(get_cache_dir(), "size_model.json"))
+        return cls._default
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == SIZE_MODEL_VERSION:
+                for fmt in self.records:
+                    self.records[fmt] = data.get("records", {}).get(fmt, [])
+                    self.fit(fmt)
+        except Exception as e:
+            print(f"Size model unreadable, using defaults: {e}")
+
+    def save(self):
+        if not self.path: return
+        with self._lock:
+            data = {"version": SIZE_MODEL_VERSION, "records": {k: list(v) for k, v in self.records.items()}}
+        tmp = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"Could not save size model: {e}")
+
+    @staticmethod
+    def features(s, index):
+        # Returns (format, [1, x1, x2, x3], trimmed duration) or None if the index cannot tell
+        if not index: return None
+        duration = s.get("duration", 0)
+        if duration <= 0: return None
+        start, eff = effective_range(s, duration)
+        crop, eff_w, eff_h = build_crop_filter(s)
+        w, h = compute_output_resolution(eff_w, eff_h, s['resize_mode'], s['width'], s['height'], s['scale'])
+        src_pixels = s['orig_width'] * s['orig_height']
+        packet_rate = ComplexityMap(start, eff, index).packet_rate(start, start + eff)
+        if not packet_rate or w <= 0 or h <= 0 or src_pixels <= 0: return None
+        # Crop keeps (about) its share of the source bits
+        share = (eff_w * eff_h) / src_pixels
+        fmt = "GIF" if "gif" in s["format"].lower() else "WebP"
+        x = [1.0, math.log(w * h * s['fps']), math.log(packet_rate * share / (eff_w * eff_h)), s['quality'] / 100.0]
+        return fmt, x, eff
+
+    def predict(self, s, index):
+        # Returns {"bytes", "bytes_low", "bytes_high", "rel_error", "confidence", "samples"} or None
+        f = self.features(s, index)
+        if f is None: return None
+        fmt, x, eff = f
+        with self._lock:
+            coef = self.coef[fmt]
+            sigma = self.sigma[fmt]
+            n = len(self.records[fmt])
+        rate = math.exp(sum(c * v for c, v in zip(coef, x)))
+        spread = math.exp(1.96 * sigma)
+        return {"bytes": int(rate * eff), "bytes_low": int(rate * eff / spread), "bytes_high": int(rate * eff * spread),
+                "rel_error": spread - 1.0, "confidence": 0.95, "samples": n}
+
+    def record(self, s, index, out_bytes):
+        # Adds one finished conversion and refits that format
+        f = self.features(s, index)
+        if f is None or out_bytes <= 0: return
+        fmt, x, eff = f
+        with self._lock:
+            recs = self.records[fmt]
+            recs.append(x[1:] + [math.log(out_bytes / eff)])
+            del recs[:-self.max_records]
+        self.fit(fmt)
+        self.save()
+
+    def fit(self, fmt):
+        with self._lock:
+            recs = list(self.records[fmt])
+        prior = SIZE_MODEL_PRIOR[fmt]
+        k = len(prior)
+        # Ridge towards the prior: (X'X + lI) b = X'y + l * prior
+        a = [[self.ridge if i == j else 0.0 for j in range(k)] for i in range(k)]
+        b = [self.ridge * p for p in prior]
+        for r in recs:
+            x = [1.0] + r[:-1]
+            y = r[-1]
+            for i in range(k):
+                b[i] += x[i] * y
+                for j in range(k):
+                    a[i][j] += x[i] * x[j]
+        coef = _solve(a, b) or list(prior)
+        # Residual spread, shrunk towards the prior spread while there are few results
+        sse = sum((r[-1] - sum(c * v for c, v in zip(coef, [1.0] + r[:-1]))) ** 2 for r in recs)
+        n = len(recs)
+        sigma = math.sqrt((sse + 0.36 * 3) / (n + 3))
+        with self._lock:
+            self.coef[fmt] = coef
+            self.sigma[fmt] = sigma
@@ -0,0 +1,552 @@
+"""
+Native GIF encoder for GifClip Maker.
+
+An in-process alternative to gifski: RGB frames (e.g. ffmpeg rawvideo, rgb24)
+are quantized with NumPy (median cut + k-means refinement), dithered (ordered
+or row-parallel error diffusion), diffed against the previous frame (only the
+changed bounding box is written, unchanged pixels inside it become
+transparent) and LZW-compressed. Frames are written as they arrive, so memory
+stays bounded on long clips. optimize_gif applies the same frame differencing
+to finished GIFs from gifski or ffmpeg. Needs NumPy; no Qt imports.
+"""
+
+import os
+import struct
+
+import numpy as np
+
+DITHER_MODES = ("ordered", "diffusion", "none")
+PALETTE_SAMPLE = 65536 # Pixels used to build a palette
+GLOBAL_SAMPLE_FRAMES = 8 # Frames buffered to build the global palette
+KMEANS_ITERATIONS = 3
+
+# -------- LZW --------
+
+def lzw_encode(data, min_code_size):
+    # GIF flavour of LZW (variable code size up to 12 bits, clear code when the table is full).
+    # data: bytes of palette indices, all < 2 ** min_code_size.
+    clear = 1 << min_code_size
+    eoi = clear + 1
+    out = bytearray()
+    buf = clear # Clear code first
+    nbits = min_code_size + 1
+    code_size = min_code_size + 1
+    next_code = eoi + 1
+    table = {}
+    it = iter(data)
+    prefix = next(it, None)
+    if prefix is None:
+        buf |= eoi << nbits
+        nbits += code_size
+        while nbits > 0:
+            out.append(buf & 0xFF)
+            buf >>= 8
+            nbits -= 8
+        return bytes(out)
+    for k in it:
+        key = (prefix << 8) | k
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        buf |= prefix << nbits
+        nbits += code_size
+        while nbits >= 8:
+            out.append(buf & 0xFF)
+            buf >>= 8
+            nbits -= 8
+        if next_code < 4096:
+            table[key] = next_code
+            next_code += 1
+            if next_code - 1 == (1 << code_size) and code_size < 12:
+                code_size += 1
+        else:
+            # Table full: start over
+            buf |= clear << nbits
+            nbits += code_size
+            table.clear()
+            code_size = min_code_size + 1
+            next_code = eoi + 1
+        prefix = k
+    for code in (prefix, eoi):
+        buf |= code << nbits
+        nbits += code_size
+        if code == prefix and next_code < 4096:
+            # The decoder adds one more entry after reading the last code
+            next_code += 1
+            if next_code - 1 == (1 << code_size) and code_size < 12:
+                code_size += 1
+    while nbits > 0:
+        out.append(buf & 0xFF)
+        buf >>= 8
+        nbits -= 8
+    return bytes(out)
+
+def sub_blocks(data):
+    # GIF data sub-blocks (<= 255 bytes each) plus the block terminator
+    parts = [bytes([len(data[i:i + 255])]) + data[i:i + 255] for i in range(0, len(data), 255)]
+    return b"".join(parts) + b"\x00"
+
+# -------- Palette --------
+
+def median_cut(pixels, colors):
+    # pixels: (N, 3) uint8. Splits the box with the largest (range * count) at its median.
+    def score(box):
+        return int(np.ptp(box, axis=0).max()) * len(box) if len(box) > 1 else -1
+
+    boxes = [pixels]
+    scores = [score(pixels)]
+    while len(boxes) < colors:
+        i = int(np.argmax(scores))
+        if scores[i] <= 0: break
+        box = boxes.pop(i)
+        scores.pop(i)
+        channel = int(np.argmax(np.ptp(box, axis=0)))
+        order = np.argsort(box[:, channel], kind="stable")
+        mid = len(box) // 2
+        for half in (box[order[:mid]], box[order[mid:]]):
+            boxes.append(half)
+            scores.append(score(half))
+    return np.array([b.mean(axis=0) for b in boxes], dtype=np.float32)
+
+def nearest(points, palette, chunk=16384):
+    # Index of the closest palette entry for every point (squared RGB distance)
+    points = points.astype(np.float32)
+    pal_sq = (palette ** 2).sum(axis=1)
+    out = np.empty(len(points), dtype=np.int32)
+    for i in range(0, len(points), chunk):
+        p = points[i:i + chunk]
+        d = pal_sq[None, :] - 2.0 * p @ palette.T
+        out[i:i + chunk] = np.argmin(d, axis=1)
+    return out
+
+def build_palette(pixels, colors, iterations=KMEANS_ITERATIONS):
+    # Median cut, then a few k-means (Lloyd) steps on the same sample
+    pixels = pixels.reshape(-1, 3)
+    if len(pixels) > PALETTE_SAMPLE:
+        pixels = pixels[np.random.default_rng(0).choice(len(pixels), PALETTE_SAMPLE, replace=False)]
+    palette = median_cut(pixels, colors)
+    samples = pixels.astype(np.float32)
+    for _ in range(iterations):
+        idx = nearest(samples, palette)
+        counts = np.bincount(idx, minlength=len(palette)).astype(np.float32)
+        for c in range(3):
+            sums = np.bincount(idx, weights=samples[:, c], minlength=len(palette))
+            used = counts > 0
+            palette[used, c] = sums[used] / counts[used]
+    return np.clip(np.rint(palette), 0, 255).astype(np.uint8)
+
+def palette_lut(palette):
+    # 32x32x32 (5 bits per channel) lookup table: quantized color -> palette index
+    grid = (np.arange(32, dtype=np.float32) * 8 + 4)
+    r, g, b = np.meshgrid(grid, grid, grid, indexing="ij")
+    cells = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+    return nearest(cells, palette.astype(np.float32)).astype(np.uint8)
+
+def lut_lookup(lut, rgb):
+    # rgb: (..., 3) values 0..255 (any numeric dtype)
+    q = np.clip(rgb, 0, 255).astype(np.int32) >> 3
+    return lut[(q[..., 0] << 10) | (q[..., 1] << 5) | q[..., 2]]
+
+# -------- Dithering --------
+
+BAYER_8 = np.array([
+    [0, 32, 8, 40, 2, 34, 10, 42],
+    [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44, 4, 36, 14, 46, 6, 38],
+    [60, 28, 52, 20, 62, 30, 54, 22],
+    [3, 35, 11, 43, 1, 33, 9, 41],
+    [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47, 7, 39, 13, 45, 5, 37],
+    [63, 31, 55, 23, 61, 29, 53, 21]], dtype=np.float32) / 64.0 - 0.5
+
+def quantize(rgb, palette, lut, dither="ordered", strength=1.0):
+    # (H, W, 3) uint8 -> (H, W) palette indices
+    if dither == "ordered":
+        h, w = rgb.shape[:2]
+        spread = 24.0 * strength
+        tile = np.tile(BAYER_8, (h // 8 + 1, w // 8 + 1))[:h, :w] * spread
+        return lut_lookup(lut, rgb.astype(np.float32) + tile[..., None])
+    if dither == "diffusion":
+        # Row-parallel error diffusion: each row is quantized in one vectorized step and its
+        # error is spread over the row below (1/4, 1/2, 1/4). No left-to-right dependency, so
+        # it stays NumPy-speed; close to Floyd-Steinberg on photographic content.
+        pal = palette.astype(np.float32)
+        out = np.empty(rgb.shape[:2], dtype=np.uint8)
+        err = np.zeros(rgb.shape[1:], dtype=np.float32)
+        for y in range(rgb.shape[0]):
+            row = rgb[y].astype(np.float32) + err
+            idx = lut_lookup(lut, row)
+            out[y] = idx
+            e = (np.clip(row, 0, 255) - pal[idx]) * (0.8 * strength)
+            err = 0.5 * e
+            err[1:] += 0.25 * e[:-1]
+            err[:-1] += 0.25 * e[1:]
+        return out
+    return lut_lookup(lut, rgb)
+
+# -------- Frame dedup --------
+
+def near_duplicate(a, b, threshold):
+    # mpdecimate's rule on luma: no 8x8 block changes more than `threshold` per pixel on average,
+    # and at most a third of the blocks change more than 5/12 of it. a, b: (H, W, 3+) uint8.
+    if not threshold or a.shape != b.shape: return False
+    h, w = (a.shape[0] // 8) * 8, (a.shape[1] // 8) * 8
+    if h == 0 or w == 0: return False
+    weights = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    diff = np.abs(a[:h, :w, :3].astype(np.float32) @ weights - b[:h, :w, :3].astype(np.float32) @ weights)
+    blocks = diff.reshape(h // 8, 8, w // 8, 8).mean(axis=(1, 3))
+    return blocks.max() <= threshold and (blocks > threshold * 5 / 12).mean() <= 0.33
+
+# -------- Writer --------
+
+def palette_colors(quality):
+    # Palette entries for a quality (one of 256 slots is kept for transparency)
+    quality = max(1, min(100, int(quality)))
+    return 255 if quality >= 50 else max(16, int(255 * quality / 50))
+
+def table_bits(n):
+    # Color table size exponent: 2 ** bits >= n (at least 2 entries)
+    bits = 1
+    while (1 << bits) < n: bits += 1
+    return bits
+
+def color_table(palette, bits):
+    table = np.zeros((1 << bits, 3), dtype=np.uint8)
+    table[:len(palette)] = palette
+    return table.tobytes()
+
+class GifEncoder:
+    # Streaming animated GIF writer: add(frame) per (H, W, 3) uint8 RGB frame, then close().
+    # quality 1-100 (like gifski): below 100, pixels that moved less than a small tolerance are
+    # kept from the previous frame (lossy inter-frame), and below 50 the palette shrinks.
+    # palette: "global" (one palette from the first frames) or "local" (one per frame)
+    # dither: "ordered", "diffusion" or "none"
+    # dedup: near-duplicate threshold (see near_duplicate, 0 = off); such frames extend the previous delay
+    # shared_palette: fixed global palette (e.g. one for all parts of a segmented encode)
+    def __init__(self, path, width, height, fps, quality=80, palette="global", dither="ordered", loop=0, dedup=0,
+                 shared_palette=None):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.palette_mode = palette if palette in ("global", "local") else "global"
+        self.dither = dither if dither in DITHER_MODES else "ordered"
+        self.loop = loop
+        self.dedup = dedup
+        quality = max(1, min(100, int(quality)))
+        self.colors = palette_colors(quality)
+        self.tolerance = int((100 - quality) * 0.4)
+        self.strength = 0.6 + 0.4 * quality / 100.0
+
+        self.frames = 0 # Frames received
+        self._encoded = 0
+        self.written = 0 # Frames written (identical frames are merged)
+        self.bytes_written = 0
+        self._f = open(path, "wb")
+        self._buffer = [] # Frames waiting for the global palette
+        self._palette = None
+        self._lut = None
+        self._shown = None # RGB of the displayed canvas
+        self._kept = None # Last source frame that was not dropped as a near-duplicate
+        self._pending = None # Last frame, written once its delay is final
+        self._header_done = False
+        if shared_palette is not None:
+            self.palette_mode = "global"
+            self._palette = np.asarray(shared_palette, dtype=np.uint8)[:255]
+            self._lut = palette_lut(self._palette)
+            self._write_header(self._palette)
+
+    def add(self, frame):
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            frame = np.frombuffer(frame, dtype=np.uint8).reshape(self.height, self.width, 3)
+        self.frames += 1
+        if self.palette_mode == "global" and self._palette is None:
+            self._buffer.append(frame)
+            if len(self._buffer) >= GLOBAL_SAMPLE_FRAMES:
+                self._flush_buffer()
+            return
+        self._encode(frame)
+
+    def close(self):
+        if self._f is None: return
+        try:
+            if self._buffer:
+                self._flush_buffer()
+            if not self._header_done:
+                self._write_header(None)
+            self._write_pending()
+            self._write(b"\x3B")
+        finally:
+            self._f.close()
+            self._f = None
+
+    def abort(self):
+        # Cancelled/failed encode: the partial file is removed (its header would pass as a valid GIF)
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        try:
+            if os.path.exists(self.path): os.remove(self.path)
+        except OSError:
+            pass
+
+    def _flush_buffer(self):
+        sample = np.concatenate([f.reshape(-1, 3) for f in self._buffer])
+        self._palette = build_palette(sample, self.colors)
+        self._lut = palette_lut(self._palette)
+        self._write_header(self._palette)
+        frames, self._buffer = self._buffer, []
+        for f in frames:
+            self._encode(f)
+
+    def _delay(self, n):
+        # Centiseconds for frame n, rounded on the absolute timeline so the rounding error never accumulates
+        return round((n + 1) * 100.0 / self.fps) - round(n * 100.0 / self.fps)
+
+    def _encode(self, frame):
+        delay = self._delay(self._encoded)
+        self._encoded += 1
+        if self.dedup and self._kept is not None and near_duplicate(frame, self._kept, self.dedup):
+            self._pending["delay"] += delay
+            return
+        self._kept = frame
+        if self.palette_mode == "local":
+            palette = build_palette(frame, self.colors)
+            lut = palette_lut(palette)
+            if not self._header_done:
+                self._write_header(None)
+        else:
+            palette, lut = self._palette, self._lut
+        idx = quantize(frame, palette, lut, self.dither, self.strength)
+        rgb = palette[idx]
+
+        if self._shown is None:
+            self._shown = rgb
+            self._queue(idx, palette, 0, 0, self.width, self.height, None, delay)
+            return
+
+        diff = np.abs(rgb.astype(np.int16) - self._shown.astype(np.int16)).max(axis=2)
+        changed = diff > self.tolerance
+        rows = np.flatnonzero(changed.any(axis=1))
+        if len(rows) == 0:
+            # Nothing visible changed: the previous frame simply stays longer
+            self._pending["delay"] += delay
+            return
+        cols = np.flatnonzero(changed.any(axis=0))
+        y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        crop = changed[y0:y1, x0:x1]
+        sub = idx[y0:y1, x0:x1].copy()
+        transparent = len(palette)
+        sub[~crop] = transparent
+        self._shown[y0:y1, x0:x1][crop] = rgb[y0:y1, x0:x1][crop]
+        self._queue(sub, palette, x0, y0, x1 - x0, y1 - y0, transparent, delay)
+
+    def _queue(self, idx, palette, x, y, w, h, transparent, delay):
+        self._write_pending()
+        self._pending = {"idx": idx, "palette": palette, "x": int(x), "y": int(y), "w": int(w), "h": int(h),
+                         "transparent": transparent, "delay": delay}
+
+    def _write_header(self, palette):
+        bits = table_bits(len(palette) + 1) if palette is not None else 1
+        flags = (0x80 | (7 << 4) | (bits - 1)) if palette is not None else 0x70
+        data = b"GIF89a" + struct.pack("<HHBBB", self.width, self.height, flags, 0, 0)
+        if palette is not None:
+            data += color_table(palette, bits)
+        # NETSCAPE2.0 loop extension (0 = forever)
+        data += b"\x21\xFF\x0BNETSCAPE2.0\x03\x01" + struct.pack("<H", self.loop) + b"\x00"
+        self._write(data)
+        self._header_done = True
+
+    def _write_pending(self):
+        p = self._pending
+        if p is None: return
+        self._pending = None
+        has_t = p["transparent"] is not None
+        # Graphics control: disposal 1 (keep), delay, transparent index
+        gce = b"\x21\xF9\x04" + bytes([(1 << 2) | (1 if has_t else 0)]) + struct.pack("<H", min(65535, p["delay"])) \
+              + bytes([p["transparent"] if has_t else 0]) + b"\x00"
+        local = self.palette_mode == "local"
+        bits = table_bits(len(p["palette"]) + 1)
+        flags = (0x80 | (bits - 1)) if local else 0
+        desc = b"\x2C" + struct.pack("<HHHHB", p["x"], p["y"], p["w"], p["h"], flags)
+        if local:
+            desc += color_table(p["palette"], bits)
+        min_code = max(2, bits)
+        data = lzw_encode(np.ascontiguousarray(p["idx"], dtype=np.uint8).tobytes(), min_code)
+        self._write(gce + desc + bytes([min_code]) + sub_blocks(data))
+        self.written += 1
+
+    def _write(self, data):
+        self._f.write(data)
+        self.bytes_written += len(data)
+
+# -------- Optimizer --------
+
+def lzw_decode(data, min_code_size, count):
+    # Inverse of lzw_encode; returns exactly `count` indices (short data is padded with 0)
+    clear = 1 << min_code_size
+    eoi = clear + 1
+    base = [bytes([i]) for i in range(clear)] + [b"", b""]
+    table = list(base)
+    code_size = min_code_size + 1
+    out = bytearray()
+    prev = None
+    buf = nbits = 0
+    for byte in data:
+        buf |= byte << nbits
+        nbits += 8
+        while nbits >= code_size:
+            code = buf & ((1 << code_size) - 1)
+            buf >>= code_size
+            nbits -= code_size
+            if code == clear:
+                table = list(base)
+                code_size = min_code_size + 1
+                prev = None
+                continue
+            if code == eoi:
+                return bytes(out[:count]).ljust(count, b"\x00")
+            if prev is None:
+                entry = table[code] if code < len(table) else b"\x00"
+            elif code < len(table):
+                entry = table[code]
+                if len(table) < 4096: table.append(prev + entry[:1])
+            else:
+                entry = prev + prev[:1]
+                if len(table) < 4096: table.append(entry)
+            if len(table) == (1 << code_size) and code_size < 12:
+                code_size += 1
+            out += entry
+            prev = entry
+    return bytes(out[:count]).ljust(count, b"\x00")
+
+def read_sub_blocks(f, raw=False):
+    # Data of a sub-block chain; raw=True keeps the block structure (length bytes and terminator)
+    chunks = []
+    while True:
+        n = f.read(1)
+        if not n or n[0] == 0: break
+        chunks.append(n + f.read(n[0]) if raw else f.read(n[0]))
+    return b"".join(chunks) + (b"\x00" if raw else b"")
+
+def deinterlace(idx):
+    h = idx.shape[0]
+    rows = np.concatenate([np.arange(0, h, 8), np.arange(4, h, 8), np.arange(2, h, 4), np.arange(1, h, 2)])
+    out = np.empty_like(idx)
+    out[rows] = idx
+    return out
+
+def optimize_gif(src, dst, dedup=0):
+    # Streaming rewrite of an animated GIF: frames that only change part of the picture are cropped
+    # to the changed rectangle (unchanged pixels inside it become transparent), and frames that
+    # change nothing are dropped with their delay added to the previous frame. Memory: one RGBA
+    # canvas plus one frame. Frames whose disposal restores background/previous are copied as they are.
+    # dedup > 0 also drops near-duplicate frames (see near_duplicate). Returns (frames_in, frames_out).
+    with open(src, "rb") as f, open(dst, "wb") as out:
+        head = f.read(13)
+        if head[:6] not in (b"GIF87a", b"GIF89a"):
+            raise ValueError("not a GIF file")
+        width, height, flags = struct.unpack("<HHB", head[6:11])
+        gct = f.read(3 * (2 << (flags & 7))) if flags & 0x80 else b""
+        global_pal = np.frombuffer(gct, dtype=np.uint8).reshape(-1, 3) if gct else np.zeros((256, 3), np.uint8)
+        out.write(b"GIF89a" + head[6:] + gct)
+
+        canvas = np.zeros((height, width, 4), dtype=np.uint8) # RGBA, alpha 0 = background
+        state = {"pending": None, "in": 0, "out": 0}
+        gce = None
+        prev_disposal, prev_rect, saved = 1, None, None
+
+        def flush():
+            p = state["pending"]
+            if p is None: return
+            state["pending"] = None
+            t = p["t"]
+            out.write(b"\x21\xF9\x04" + bytes([(p["disposal"] << 2) | (1 if t is not None else 0)])
+                      + struct.pack("<H", min(65535, p["delay"])) + bytes([t or 0]) + b"\x00")
+            out.write(b"\x2C" + struct.pack("<HHHHB", p["x"], p["y"], p["w"], p["h"], p["flags"]) + p["lct"])
+            out.write(bytes([p["min_code"]]) + sub_blocks(p["data"]))
+            state["out"] += 1
+
+        while True:
+            b = f.read(1)
+            if not b or b == b"\x3B": break
+            if b == b"\x21":
+                label = f.read(1)[0]
+                body = read_sub_blocks(f, raw=True)
+                if label == 0xF9 and len(body) >= 5:
+                    packed = body[1]
+                    gce = {"disposal": (packed >> 2) & 7, "delay": struct.unpack("<H", body[2:4])[0],
+                           "t": body[4] if packed & 1 else None}
+                else:
+                    # Comments / application blocks keep their place in the stream
+                    flush()
+                    out.write(b"\x21" + bytes([label]) + body)
+                continue
+            if b != b"\x2C":
+                break # Unknown block: the rest is not readable
+
+            x, y, w, h, fl = struct.unpack("<HHHHB", f.read(9))
+            lct = f.read(3 * (2 << (fl & 7))) if fl & 0x80 else b""
+            pal = np.frombuffer(lct, dtype=np.uint8).reshape(-1, 3) if lct else global_pal
+            min_code = f.read(1)[0]
+            data = read_sub_blocks(f)
+            g = gce or {"disposal": 0, "delay": 0, "t": None}
+            gce = None
+            disposal, delay, t = g["disposal"], g["delay"], g["t"]
+            state["in"] += 1
+
+            idx = np.frombuffer(lzw_decode(data, min_code, w * h), dtype=np.uint8).reshape(h, w)
+            if fl & 0x40: idx = deinterlace(idx)
+
+            # Previous frame's disposal, then draw this frame on the canvas
+            if prev_rect is not None:
+                if prev_disposal == 2:
+                    canvas[prev_rect] = 0
+                elif prev_disposal == 3 and saved is not None:
+                    canvas[prev_rect] = saved
+            cw, ch = max(0, min(w, width - x)), max(0, min(h, height - y))
+            rect = (slice(y, y + ch), slice(x, x + cw))
+            region = canvas[rect]
+            before = region.copy()
+            saved = before if disposal == 3 else None
+            vis = idx[:ch, :cw]
+            opaque = vis != t if t is not None else np.ones(vis.shape, dtype=bool)
+            rgba = np.concatenate([pal[np.minimum(vis, len(pal) - 1)], np.full(vis.shape + (1,), 255, np.uint8)], axis=2)
+            region[opaque] = rgba[opaque]
+
+            rewritable = (state["pending"] is not None and disposal in (0, 1) and prev_disposal in (0, 1)
+                          and cw == w and ch == h)
+            prev_disposal, prev_rect = disposal, rect
+            if rewritable:
+                changed = (region != before).any(axis=2)
+                rows = np.flatnonzero(changed.any(axis=1))
+                if len(rows) == 0 or (dedup and near_duplicate(region, before, dedup)):
+                    # Not shown: the canvas stays what the previous frame left
+                    region[...] = before
+                    state["pending"]["delay"] += delay
+                    continue
+                cols = np.flatnonzero(changed.any(axis=0))
+                y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+                sub = vis[y0:y1, x0:x1].copy()
+                keep = changed[y0:y1, x0:x1]
+                tsel = t
+                if tsel is None:
+                    # Any index the changed pixels do not use can mark "unchanged"
+                    used = np.bincount(sub[keep], minlength=256)[:min(len(pal), 1 << min_code)]
+                    free = np.flatnonzero(used == 0)
+                    tsel = int(free[0]) if len(free) else None
+                if tsel is not None:
+                    sub[~keep] = tsel
+                flush()
+                state["pending"] = {"x": x + int(x0), "y": y + int(y0), "w": int(x1 - x0), "h": int(y1 - y0),
+                                    "flags": fl & ~0x40, "lct": lct, "min_code": min_code, "t": tsel,
+                                    "disposal": 1, "delay": delay,
+                                    "data": lzw_encode(np.ascontiguousarray(sub).tobytes(), min_code)}
+            else:
+                flush()
+                state["pending"] = {"x": x, "y": y, "w": w, "h": h, "flags": fl, "lct": lct, "min_code": min_code,
+                                    "t": t, "disposal": disposal, "delay": delay, "data": data}
+        flush()
+        out.write(b"\x3B")
+    return state["in"], state["out"]
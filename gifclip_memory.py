@@ -0,0 +1,169 @@
+"""
+Memory accounting for GifClip Maker jobs.
+
+gifski keeps every frame of a clip until it writes the GIF, and ffmpeg's
+palettegen/paletteuse graph buffers the whole clip as well, so the memory a
+job needs grows with resolution x frame count. job_memory() estimates it before
+a job starts (the engine downscales, chunks or refuses a job above its
+ceiling), and MemoryMonitor samples the resident memory of the running
+children: per-job totals are checked against the ceiling and the peak RSS of
+every child is reported. Plain Python, no Qt imports.
+"""
+
+import os
+import sys
+import time
+import threading
+
+MEMORY_POLICIES = ("auto", "downscale", "chunk", "refuse")
+MEMORY_FILL = 0.8 # Plan jobs to this fraction of the ceiling: job_memory is an estimate (container
+                  # frame counts, encoder overhead beyond the frame buffers), and parts are rounded to the frame grid
+STREAMING_FRAMES = 16 # Frames in flight in a pipeline that does not buffer the clip
+
+def job_memory(fmt, encoder, palette, w, h, frames):
+    # Estimated peak bytes of one output: raw yuv420p frames (w x h x 1.5) held by gifski,
+    # RGBA frames held between ffmpeg's palettegen and paletteuse (except one palette per
+    # frame), else a few frames in flight (WebP, the native encoder)
+    frame = w * h * 1.5
+    if fmt == "GIF" and encoder == "gifski":
+        return int(frame * frames)
+    if fmt == "GIF" and encoder == "ffmpeg" and palette != "single":
+        return int(w * h * 4 * frames)
+    return int(frame * STREAMING_FRAMES)
+
+def format_bytes(n):
+    return f"{n / 1024**3:.1f} GB" if n >= 1024**3 else f"{n / 1024**2:.0f} MB"
+
+# -------- Process memory --------
+
+def _linux_rss(pid):
+    # (current, peak) resident bytes from /proc; None once the process is gone
+    rss = hwm = None
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    hwm = int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        return None
+    if rss is None: return None # Zombie: already exited
+    return rss, hwm or rss
+
+def _windows_rss(pid):
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(0x1000 | 0x0010, False, pid) # QUERY_LIMITED_INFORMATION | VM_READ
+    if not handle: return None
+    try:
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if not kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize, counters.PeakWorkingSetSize
+    finally:
+        kernel32.CloseHandle(handle)
+
+def _psutil_rss(pid):
+    try:
+        import psutil
+        rss = psutil.Process(pid).memory_info().rss
+        return rss, rss
+    except Exception:
+        return None
+
+def process_rss(pid):
+    # (current, peak) resident bytes of a running process, None if unknown. Linux reads /proc,
+    # Windows the working set; elsewhere psutil if installed (peak = highest sample).
+    try:
+        if sys.platform.startswith("linux"):
+            return _linux_rss(pid)
+        if os.name == 'nt':
+            return _windows_rss(pid)
+    except Exception:
+        return None
+    return _psutil_rss(pid)
+
+class MemoryMonitor:
+    # Samples the watched children every `interval` seconds on one background thread (started
+    # with the first watch, ends when nothing is watched). job: any key grouping the children of
+    # one job (the engine uses its thread lease). limit: bytes per job, 0 = report only;
+    # on_exceed(job, rss, procs) is called once per job when its children together go above it.
+    def __init__(self, limit=0, on_exceed=None, interval=0.5):
+        self.limit = limit
+        self.on_exceed = on_exceed
+        self.interval = interval
+        self._watched = {} # proc -> {"job", "name", "rss", "peak"}
+        self._peaks = {} # job -> [{"name", "pid", "peak_rss"}] of finished children
+        self._exceeded = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, proc, job=None, name=None):
+        with self._lock:
+            self._watched[proc] = {"job": job, "name": name or str(proc.pid), "peak": 0, "rss": 0}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="memory", daemon=True)
+                self._thread.start()
+
+    def unwatch(self, proc):
+        # Last sample (a process that already exited keeps the previous one); the child's peak
+        # is kept under its job until pop_job
+        self._sample([proc])
+        with self._lock:
+            info = self._watched.pop(proc, None)
+            if info is None or info["job"] is None: return
+            self._peaks.setdefault(info["job"], []).append(
+                {"name": info["name"], "pid": proc.pid, "peak_rss": info["peak"]})
+
+    def pop_job(self, job):
+        # Peak RSS of every child the job ran; forgets the job
+        with self._lock:
+            return self._peaks.pop(job, [])
+
+    def _sample(self, procs):
+        for p in procs:
+            usage = process_rss(p.pid) if p.poll() is None else None
+            if usage is None: continue
+            with self._lock:
+                info = self._watched.get(p)
+                if info:
+                    info["rss"] = usage[0]
+                    info["peak"] = max(info["peak"], usage[1])
+
+    def _run(self):
+        while True:
+            with self._lock:
+                procs = list(self._watched)
+                if not procs:
+                    self._thread = None # The next watch() starts a new one
+                    return
+            self._sample(procs)
+            if self.limit:
+                self._check()
+            time.sleep(self.interval)
+
+    def _check(self):
+        totals = {}
+        with self._lock:
+            for p, info in self._watched.items():
+                totals.setdefault(info["job"], [0, []])
+                totals[info["job"]][0] += info["rss"]
+                totals[info["job"]][1].append(p)
+            self._exceeded &= set(totals) # Reported once per run of the job's children
+            over = [(job, rss, procs) for job, (rss, procs) in totals.items()
+                    if rss > self.limit and job not in self._exceeded]
+            self._exceeded.update(job for job, _, _ in over)
+        for job, rss, procs in over:
+            print(f"Memory limit exceeded: {format_bytes(rss)} > {format_bytes(self.limit)}")
+            if self.on_exceed: self.on_exceed(job, rss, procs)
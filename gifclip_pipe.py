@@ -0,0 +1,151 @@
+"""
+Frame pipes for GifClip Maker.
+
+Raw frames travel between ffmpeg and the encoders through OS pipes. The
+default Linux pipe holds 64 KB, a sliver of one 1080p frame, so writer and
+reader wake each other up many times per frame; set_pipe_size() raises the
+capacity (F_SETPIPE_SZ, up to /proc/sys/fs/pipe-max-size). PipeTee copies one
+stream to several consumers (pipes, or a file last) with tee(2)/splice(2),
+so the frames never pass through Python; elsewhere it falls back to a
+read/write relay. Plain Python, no Qt imports.
+"""
+
+import os
+import sys
+import time
+
+PIPE_SIZE = 1024 * 1024 # Wanted capacity (the unprivileged maximum on most Linux systems)
+F_SETPIPE_SZ = 1031
+F_GETPIPE_SZ = 1032
+
+def pipe_max_size():
+    try:
+        with open("/proc/sys/fs/pipe-max-size", "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return PIPE_SIZE
+
+def set_pipe_size(fd, size=PIPE_SIZE):
+    # Capacity of the pipe behind fd (either end), returns the size in effect or None
+    # where it cannot be changed (not Linux, not a pipe)
+    if not sys.platform.startswith("linux"): return None
+    try:
+        import fcntl
+        fd = fd if isinstance(fd, int) else fd.fileno()
+        cur = fcntl.fcntl(fd, getattr(fcntl, "F_GETPIPE_SZ", F_GETPIPE_SZ))
+        if cur >= size: return cur
+        return fcntl.fcntl(fd, getattr(fcntl, "F_SETPIPE_SZ", F_SETPIPE_SZ), min(size, pipe_max_size()))
+    except (OSError, ValueError, ImportError):
+        return None
+
+def make_pipe(size=PIPE_SIZE):
+    # os.pipe() with the larger capacity
+    r, w = os.pipe()
+    set_pipe_size(w, size)
+    return r, w
+
+def y4m_frame_bytes(w, h):
+    # yuv420p frame in a yuv4mpeg stream ("FRAME\n" + planes)
+    return w * h * 3 // 2 + 6
+
+def _libc_tee():
+    # tee(2) has no os-module wrapper; None where it is unavailable
+    if not sys.platform.startswith("linux") or not hasattr(os, "splice"): return None
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        tee = libc.tee
+        tee.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_size_t, ctypes.c_uint]
+        tee.restype = ctypes.c_ssize_t
+    except (OSError, AttributeError):
+        return None
+
+    def call(src, dst, n):
+        while True:
+            k = tee(src, dst, n, 0)
+            if k >= 0: return k
+            err = ctypes.get_errno()
+            if err != 4: raise OSError(err, os.strerror(err)) # EINTR: retry
+    return call
+
+class PipeTee:
+    # Copies everything read from the pipe fd `src` to every fd in `outs`, in order, until EOF.
+    # Linux: tee(2) duplicates the data into the first consumer without consuming it, then
+    # splice(2) moves the same bytes on (into the last consumer, or a spare pipe feeding the
+    # next stage), so the bytes stay in the kernel; all but the last output must be pipes.
+    # Elsewhere (or mode="relay"): read/write in PIPE_SIZE chunks. The caller owns and closes
+    # the fds. Counters: bytes, elapsed, mbps.
+    def __init__(self, src, outs, mode="auto"):
+        self.src = src
+        self.outs = list(outs)
+        self._tee = _libc_tee() if mode != "relay" else None
+        self.mode = "splice" if self._tee else "relay"
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.error = None
+        self.chunk = set_pipe_size(src) or PIPE_SIZE
+        self._spares = []
+        if self.mode == "splice":
+            for _ in range(len(self.outs) - 2):
+                r, w = os.pipe()
+                set_pipe_size(w, self.chunk) # Must take a full chunk of the source without blocking
+                self._spares.append((r, w))
+            for fd in self.outs[:-1]:
+                set_pipe_size(fd)
+
+    @property
+    def mbps(self):
+        return self.bytes / (1024 * 1024) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def run(self):
+        # Blocks until EOF on src (or a consumer closing its end); returns bytes copied
+        t0 = time.monotonic()
+        try:
+            while True:
+                k = self._splice_step() if self.mode == "splice" else self._relay_step()
+                if k == 0: break
+                self.bytes += k
+        except OSError as e:
+            self.error = e # e.g. EPIPE: a consumer exited
+        finally:
+            self.elapsed = time.monotonic() - t0
+            for r, w in self._spares:
+                os.close(r)
+                os.close(w)
+            self._spares = []
+        return self.bytes
+
+    def _relay_step(self):
+        data = os.read(self.src, self.chunk)
+        for fd in self.outs:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        return len(data)
+
+    def _splice_step(self):
+        if len(self.outs) == 1:
+            return os.splice(self.src, self.outs[0], self.chunk)
+        k = self._tee(self.src, self.outs[0], self.chunk)
+        if k: self._forward(self.src, k, 1)
+        return k
+
+    def _forward(self, src, n, level):
+        # Moves exactly n bytes of src (already tee'd to outs[level - 1]) on to outs[level:]
+        if level == len(self.outs) - 1:
+            self._splice_all(src, self.outs[level], n)
+            return
+        spare_r, spare_w = self._spares[level - 1]
+        self._splice_all(src, spare_w, n)
+        while n:
+            k = self._tee(spare_r, self.outs[level], n)
+            if k == 0: raise OSError("tee: unexpected end of data")
+            self._forward(spare_r, k, level + 1)
+            n -= k
+
+    @staticmethod
+    def _splice_all(src, dst, n):
+        while n:
+            k = os.splice(src, dst, n)
+            if k == 0: raise OSError("splice: unexpected end of data")
+            n -= k
@@ -0,0 +1,382 @@
+"""
+Media probing for GifClip Maker.
+
+Reads width/height/fps/duration of source files, either from container
+metadata (ffprobe, or the ffmpeg banner when only ffmpeg is bundled) or by
+opening a decoder with cv2. Results are kept in a persistent cache keyed by
+(path, size, mtime), and ProbePool runs probes in the background so the GUI
+never blocks on slow (network) files. probe_packets builds a per-second
+packet-size index (content complexity) used to place estimate samples;
+probe_keyframe finds a single seek point without reading the whole file.
+No Qt imports here.
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gifclip_engine import DEFAULT_FFMPEG, DEFAULT_FFPROBE, get_cache_dir, get_startup_info
+
+PROBE_CACHE_VERSION = 1
+
+# -------- Probers --------
+
+def empty_info():
+    return {"width": 0, "height": 0, "fps": 0.0, "duration": 0.0, "frames": 0}
+
+def probe_media(path, ffprobe=None, ffmpeg=None):
+    # ffprobe prober: container metadata without opening a decoder
+    # Returns {"width", "height", "fps", "duration", "frames"} (0 = unknown)
+    info = empty_info()
+    ffprobe = ffprobe or DEFAULT_FFPROBE
+    if ffprobe and (os.path.exists(ffprobe) or shutil.which(ffprobe)):
+        cmd = [ffprobe, "-v", "error", "-select_streams", "v:0",
+               "-show_entries", "stream=width,height,avg_frame_rate,r_frame_rate,nb_frames,duration:format=duration",
+               "-of", "json", path]
+        try:
+            out = subprocess.run(cmd, capture_output=True, timeout=30, startupinfo=get_startup_info()).stdout
+            data = json.loads(out.decode('utf-8', errors='ignore') or "{}")
+            streams = data.get("streams") or [{}]
+            st = streams[0]
+            info["width"] = int(st.get("width") or 0)
+            info["height"] = int(st.get("height") or 0)
+            info["fps"] = _parse_rate(st.get("avg_frame_rate")) or _parse_rate(st.get("r_frame_rate"))
+            info["duration"] = float(st.get("duration") or data.get("format", {}).get("duration") or 0)
+            info["frames"] = int(st.get("nb_frames") or 0)
+        except Exception as e:
+            print(f"ffprobe failed for {path}: {e}")
+
+    if info["width"] <= 0 or info["duration"] <= 0:
+        # Bundled builds ship ffmpeg only: parse the "ffmpeg -i" banner instead
+        _probe_with_ffmpeg_banner(path, ffmpeg or DEFAULT_FFMPEG, info)
+
+    if info["frames"] <= 0 and info["fps"] > 0:
+        info["frames"] = int(info["duration"] * info["fps"])
+    return info
+
+def _parse_rate(rate):
+    try:
+        num, _, den = str(rate).partition("/")
+        num = float(num)
+        den = float(den) if den else 1.0
+        return num / den if den > 0 else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def _probe_with_ffmpeg_banner(path, ffmpeg, info):
+    try:
+        err = subprocess.run([ffmpeg, "-hide_banner", "-i", path], capture_output=True, timeout=30,
+                             startupinfo=get_startup_info()).stderr.decode('utf-8', errors='ignore')
+    except Exception as e:
+        print(f"ffmpeg probe failed for {path}: {e}")
+        return
+    m = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", err)
+    if m and info["duration"] <= 0:
+        info["duration"] = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+    m = re.search(r"Stream #.*?Video:.*?(\d{2,5})x(\d{2,5})", err)
+    if m and info["width"] <= 0:
+        info["width"], info["height"] = int(m.group(1)), int(m.group(2))
+    m = re.search(r"([\d.]+) (?:fps|tbr)", err)
+    if m and info["fps"] <= 0:
+        info["fps"] = float(m.group(1))
+
+def probe_media_cv2(path):
+    # Decoder-based prober (slower, opens the stream); cv2 is imported on first use only
+    info = empty_info()
+    try:
+        import cv2
+        cap = cv2.VideoCapture(path)
+        if cap.isOpened():
+            info["fps"] = cap.get(cv2.CAP_PROP_FPS)
+            info["width"] = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            info["height"] = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            info["frames"] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            info["duration"] = info["frames"] / info["fps"] if info["fps"] > 0 else 0
+            cap.release()
+    except Exception as e:
+        print(f"Error probing video {path}: {e}")
+    return info
+
+PROBERS = ("auto", "ffprobe", "cv2")
+
+def probe_file(path, prober="auto", ffprobe=None, ffmpeg=None):
+    # "auto": container metadata first, decoder only if that told us nothing
+    if prober == "cv2":
+        info = probe_media_cv2(path)
+    else:
+        info = probe_media(path, ffprobe, ffmpeg)
+        if prober == "auto" and info["width"] <= 0:
+            info = probe_media_cv2(path)
+    info["prober"] = prober
+    return info
+
+# -------- Cache --------
+
+def file_key(path):
+    # (path, size, mtime) -> cache key; None if the file is gone
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+
+class ProbeCache:
+    # Persistent JSON cache of probe results. Thread-safe; a changed file (size/mtime) is a miss.
+    def __init__(self, path=None, max_entries=20000):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = {}
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def default(cls):
+        return cls(os.path.join(get_cache_dir(), "probe_cache.json"))
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == PROBE_CACHE_VERSION:
+                self.entries = data.get("entries", {})
+        except Exception as e:
+            print(f"Probe cache unreadable, starting empty: {e}")
+
+    def save(self):
+        if not self.path: return
+        with self._lock:
+            if not self._dirty: return
+            data = {"version": PROBE_CACHE_VERSION, "entries": dict(self.entries)}
+            self._dirty = 0
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"Could not save probe cache: {e}")
+
+    def get(self, path):
+        key = file_key(path)
+        if key is None: return None
+        with self._lock:
+            info = self.entries.get(key)
+        return dict(info) if info else None
+
+    def put(self, path, info):
+        key = file_key(path)
+        if key is None or info.get("width", 0) <= 0: return # Never cache failed probes
+        with self._lock:
+            self.entries.pop(key, None)
+            self.entries[key] = dict(info)
+            # Drop oldest entries (dicts keep insertion order)
+            while len(self.entries) > self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+            self._dirty += 1
+            flush = self._dirty >= 50
+        if flush: self.save()
+
+# -------- Packet Index --------
+
+PACKET_BIN = 1.0 # Seconds per bucket
+PACKET_RETRY = 24 * 3600 # A failed/timed-out scan of an unchanged file is not retried before this (seconds)
+
+def _ffprobe(ffprobe):
+    ffprobe = ffprobe or DEFAULT_FFPROBE
+    return ffprobe if ffprobe and (os.path.exists(ffprobe) or shutil.which(ffprobe)) else None
+
+def probe_packets(path, ffprobe=None, timeout=60):
+    # Video packet sizes summed per PACKET_BIN seconds, plus keyframe times. ffprobe only reads
+    # the container (no decoding), but it reads all of it: I/O bound, slow on long or network files.
+    # Encoded packet size follows motion and detail, which is what makes GIF/WebP output big.
+    # Returns {"bin", "bytes": [per bucket], "keyframes": [sec], "start": first timestamp} or None
+    ffprobe = _ffprobe(ffprobe)
+    if not ffprobe:
+        return None
+    cmd = [ffprobe, "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "packet=pts_time,dts_time,size,flags", "-of", "compact=p=0", path]
+    try:
+        out = subprocess.run(cmd, capture_output=True, timeout=timeout, startupinfo=get_startup_info()).stdout
+    except Exception as e:
+        print(f"Packet index failed for {path}: {e}")
+        return None
+    buckets = []
+    keyframes = []
+    start = None
+    for line in out.decode('utf-8', errors='ignore').splitlines():
+        fields = dict(kv.split("=", 1) for kv in line.split("|") if "=" in kv)
+        try:
+            t = float(fields.get("pts_time") if fields.get("pts_time", "N/A") != "N/A" else fields.get("dts_time"))
+            size = int(fields.get("size", 0))
+        except (TypeError, ValueError):
+            continue
+        if t < 0: continue
+        start = t if start is None else min(start, t)
+        i = int(t / PACKET_BIN)
+        if i >= len(buckets):
+            buckets.extend([0] * (i + 1 - len(buckets)))
+        buckets[i] += size
+        if "K" in fields.get("flags", ""):
+            keyframes.append(round(t, 3))
+    if not buckets:
+        return None
+    return {"bin": PACKET_BIN, "bytes": buckets, "keyframes": sorted(keyframes), "start": start or 0.0}
+
+def probe_keyframe(path, t, ffprobe=None, timeout=10):
+    # Keyframe at or before t (seconds from the start of the file) from one seek: ffprobe seeks the
+    # way the demuxer does (backwards, onto a keyframe) and reads a single packet. The target is
+    # used as an absolute timestamp, so with a non-zero start time the keyframe found can be a GOP
+    # early, never late. Returns {"keyframes": [sec], "start"} (usable by keyframe_trim) or None.
+    ffprobe = _ffprobe(ffprobe)
+    if not ffprobe or t <= 0:
+        return None
+    cmd = [ffprobe, "-v", "error", "-select_streams", "v:0", "-read_intervals", f"{t:.3f}%+#1",
+           "-show_entries", "packet=pts_time,dts_time,flags:format=start_time", "-of", "json", path]
+    try:
+        out = subprocess.run(cmd, capture_output=True, timeout=timeout, startupinfo=get_startup_info()).stdout
+        data = json.loads(out.decode('utf-8', errors='ignore') or "{}")
+        packet = (data.get("packets") or [{}])[0]
+        kf = float(packet.get("pts_time") if packet.get("pts_time", "N/A") != "N/A" else packet.get("dts_time"))
+        start = float(data.get("format", {}).get("start_time") or 0)
+    except Exception as e:
+        print(f"Keyframe lookup failed for {path}: {e}")
+        return None
+    if "K" not in packet.get("flags", "") or kf - start > t + 1e-3:
+        return None # Demuxer did not land on a keyframe before t (inexact seek)
+    return {"keyframes": [round(kf, 3)], "start": start}
+
+class PacketIndexCache:
+    # One JSON file per source under the cache folder (indexes of long files are large)
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    @classmethod
+    def default(cls):
+        return cls(os.path.join(get_cache_dir(), "packets"))
+
+    def _file(self, path):
+        key = file_key(path)
+        if key is None: return None
+        return os.path.join(self.folder, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, path):
+        f = self._file(path)
+        if not f or not os.path.exists(f): return None
+        try:
+            with open(f, "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except Exception:
+            return None
+
+    def put(self, path, index):
+        f = self._file(path)
+        if not f or not index: return
+        tmp = f"{f}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fp:
+                json.dump(index, fp)
+            os.replace(tmp, f)
+        except Exception as e:
+            print(f"Could not save packet index: {e}")
+
+def get_packet_index(path, ffprobe=None, cache=None, cached_only=False):
+    # Cached probe_packets; cache=None uses the default per-user cache. Failed scans are cached
+    # too (for PACKET_RETRY), so a source that times out is not read again by every caller.
+    # cached_only: never scan, None unless the index is already cached.
+    cache = cache or PacketIndexCache.default()
+    index = cache.get(path)
+    if index is not None and "failed" in index:
+        if cached_only or time.time() - index["failed"] < PACKET_RETRY:
+            return None
+        index = None
+    if index is None and not cached_only and _ffprobe(ffprobe):
+        index = probe_packets(path, ffprobe)
+        cache.put(path, index or {"failed": time.time()})
+    return index
+
+# -------- Pool --------
+
+class ProbePool:
+    # Background probing: submit(path, callback) returns at once, callback(path, info) runs
+    # on a pool thread (or immediately on a cache hit). probe(path) is the blocking variant.
+    # packets: after the metadata of a submitted file is known, also build its packet index in
+    # the background (one file at a time), so estimates and trims find it cached later.
+    def __init__(self, cache=None, prober="auto", max_workers=4, ffprobe=None, ffmpeg=None, packets=False):
+        self.cache = cache
+        self.prober = prober
+        self.ffprobe = ffprobe or DEFAULT_FFPROBE
+        self.ffmpeg = ffmpeg or DEFAULT_FFMPEG
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe")
+        self._packet_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="packets") if packets else None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def probe(self, path):
+        if self.cache:
+            info = self.cache.get(path)
+            if info: return info
+        info = probe_file(path, self.prober, self.ffprobe, self.ffmpeg)
+        if self.cache: self.cache.put(path, info)
+        return info
+
+    def submit(self, path, callback):
+        if self.cache:
+            info = self.cache.get(path)
+            if info:
+                callback(path, info)
+                self.prefetch_packets(path)
+                return None
+        with self._lock:
+            future = self._pending.get(path)
+            if future is None:
+                future = self._pool.submit(self.probe, path)
+                self._pending[path] = future
+        future.add_done_callback(lambda f: self._done(path, f, callback))
+        return future
+
+    def _done(self, path, future, callback):
+        with self._lock:
+            self._pending.pop(path, None)
+        try:
+            info = future.result()
+        except Exception as e:
+            print(f"Error probing video {path}: {e}")
+            info = empty_info()
+        callback(path, info)
+        if info["width"] > 0:
+            self.prefetch_packets(path)
+
+    def prefetch_packets(self, path):
+        # Queued behind the metadata probes; a no-op without packets=True
+        if self._packet_pool is None: return
+        def run():
+            try:
+                get_packet_index(path, self.ffprobe)
+            except Exception as e:
+                print(f"Packet index failed for {path}: {e}")
+        self._packet_pool.submit(run)
+
+    def submit_packets(self, path, callback):
+        # Background packet index (get_packet_index); callback(path, index or None) on a pool thread
+        def run():
+            try:
+                index = get_packet_index(path, self.ffprobe)
+            except Exception as e:
+                print(f"Packet index failed for {path}: {e}")
+                index = None
+            callback(path, index)
+        return self._pool.submit(run)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._packet_pool: self._packet_pool.shutdown(wait=False, cancel_futures=True)
+        if self.cache: self.cache.save()
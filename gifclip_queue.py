@@ -0,0 +1,188 @@
+"""
+Persistent batch job queue for GifClip Maker.
+
+Every batch is journaled to a small SQLite database in the user cache folder
+with one row per task (pending / running / done / failed). After a crash or a
+cancel the unfinished part of a batch can be resumed; finished outputs are
+verified (size + GIF/WebP header) before they are skipped. Plain Python, no
+Qt imports.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from gifclip_engine import get_cache_dir, is_valid_output
+
+STATES = ("pending", "running", "done", "failed")
+KEEP_BATCHES = 50 # Older finished batches are pruned; unfinished ones too, per source
+UNFINISHED_MAX_AGE = 30 * 86400 # Unfinished batches older than this (seconds) are pruned
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    task TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    outputs TEXT,
+    sizes TEXT,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id, state);
+"""
+
+class JobQueue:
+    # Thread-safe (one connection, guarded by a lock; updates are tiny).
+    # source: who created a batch ("gui", "cli"), so each front-end resumes its own batches.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.db.row_factory = sqlite3.Row
+        with self._lock, self.db:
+            self.db.executescript(SCHEMA)
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls(os.path.join(get_cache_dir(), "jobs.sqlite"))
+        return cls._default
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def add_batch(self, tasks, source="gui"):
+        # Returns (batch_id, [job_id per task])
+        now = time.time()
+        with self._lock, self.db:
+            batch_id = self.db.execute("INSERT INTO batches (source, created) VALUES (?, ?)", (source, now)).lastrowid
+            job_ids = [self.db.execute(
+                "INSERT INTO jobs (batch_id, idx, path, task, updated) VALUES (?, ?, ?, ?, ?)",
+                (batch_id, i, t['path'], json.dumps(t), now)).lastrowid for i, t in enumerate(tasks)]
+        self.prune()
+        return batch_id, job_ids
+
+    def unfinished_batches(self, source=None):
+        # [{"id", "created", "total", "remaining"}] newest first; a batch counts while any job is not done
+        sql = ("SELECT b.id, b.created, COUNT(j.id) AS total, SUM(j.state != 'done') AS remaining "
+               "FROM batches b JOIN jobs j ON j.batch_id = b.id "
+               + ("WHERE b.source = ? " if source else "") +
+               "GROUP BY b.id HAVING remaining > 0 ORDER BY b.id DESC")
+        with self._lock:
+            rows = self.db.execute(sql, (source,) if source else ()).fetchall()
+        return [dict(r) for r in rows]
+
+    def jobs(self, batch_id):
+        with self._lock:
+            rows = self.db.execute("SELECT * FROM jobs WHERE batch_id = ? ORDER BY idx", (batch_id,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def resume(self, batch_id, retry_failed=True):
+        # Jobs of the batch still to run: [(job_id, task)]. Jobs left "running" by a crash go
+        # back to pending; "done" jobs whose outputs are gone or damaged are redone.
+        todo = []
+        for job in self.jobs(batch_id):
+            state = job["state"]
+            if state == "done" and self._outputs_ok(job):
+                continue
+            if state == "failed" and not retry_failed:
+                continue
+            self._set(job["id"], state="pending")
+            todo.append((job["id"], json.loads(job["task"])))
+        return todo
+
+    def discard(self, batch_id):
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM jobs WHERE batch_id = ?", (batch_id,))
+            self.db.execute("DELETE FROM batches WHERE id = ?", (batch_id,))
+
+    def mark_running(self, job_id):
+        with self._lock, self.db:
+            self.db.execute("UPDATE jobs SET state = 'running', attempts = attempts + 1, updated = ? "
+                            "WHERE id = ? AND state != 'running'", (time.time(), job_id))
+
+    def mark_result(self, job_id, res):
+        # res: ConversionEngine result dict. A cancelled job stays pending (resumable).
+        if res.get("attempts", 1) > 1:
+            # In-run retries (ConversionEngine.retries) count as attempts too
+            with self._lock, self.db:
+                self.db.execute("UPDATE jobs SET attempts = attempts + ? WHERE id = ?", (res["attempts"] - 1, job_id))
+        if res["status"] == "done":
+            outs = res["output"] if isinstance(res["output"], list) else [res["output"]]
+            sizes = [os.path.getsize(o) if os.path.exists(o) else -1 for o in outs]
+            self._set(job_id, state="done", outputs=json.dumps(outs), sizes=json.dumps(sizes), error=None)
+        elif res["status"] == "failed":
+            self._set(job_id, state="failed", error=res.get("error"))
+        else:
+            self._set(job_id, state="pending")
+
+    def prune(self):
+        # Drop old batches that have nothing left to resume, and unfinished batches nobody
+        # resumed (failed/cancelled jobs, CLI runs): beyond KEEP_BATCHES per source or too old
+        with self._lock, self.db:
+            old = [r[0] for r in self.db.execute(
+                "SELECT b.id FROM batches b WHERE NOT EXISTS "
+                "(SELECT 1 FROM jobs j WHERE j.batch_id = b.id AND j.state != 'done') "
+                "ORDER BY b.id DESC LIMIT -1 OFFSET ?", (KEEP_BATCHES,)).fetchall()]
+            kept = {}
+            for batch_id, source, created in self.db.execute(
+                    "SELECT b.id, b.source, b.created FROM batches b WHERE EXISTS "
+                    "(SELECT 1 FROM jobs j WHERE j.batch_id = b.id AND j.state != 'done') "
+                    "ORDER BY b.id DESC").fetchall():
+                kept[source] = kept.get(source, 0) + 1
+                if kept[source] > KEEP_BATCHES or time.time() - (created or 0) > UNFINISHED_MAX_AGE:
+                    old.append(batch_id)
+            for batch_id in old:
+                self.db.execute("DELETE FROM jobs WHERE batch_id = ?", (batch_id,))
+                self.db.execute("DELETE FROM batches WHERE id = ?", (batch_id,))
+
+    def _set(self, job_id, **fields):
+        fields["updated"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock, self.db:
+            self.db.execute(f"UPDATE jobs SET {cols} WHERE id = ?", tuple(fields.values()) + (job_id,))
+
+    @staticmethod
+    def _outputs_ok(job):
+        try:
+            outs = json.loads(job["outputs"] or "[]")
+            sizes = json.loads(job["sizes"] or "[]")
+        except ValueError:
+            return False
+        return bool(outs) and len(outs) == len(sizes) and all(is_valid_output(o, s) for o, s in zip(outs, sizes))
+
+def run_journaled(engine, queue, jobs, max_workers=None, result_callback=None):
+    # engine.run_batch over [(job_id, task)] with every state change written to the queue.
+    # Chains engine.task_callback; result_callback(res) is called after the job is recorded.
+    job_ids = [job_id for job_id, _ in jobs]
+    tasks = [task for _, task in jobs]
+    task_callback = engine.task_callback
+
+    def on_task(idx, state, message):
+        if state == "running" and 0 <= idx < len(job_ids):
+            queue.mark_running(job_ids[idx])
+        task_callback(idx, state, message)
+
+    def on_result(res):
+        queue.mark_result(job_ids[res["index"]], res)
+        if result_callback: result_callback(res)
+
+    engine.task_callback = on_task
+    try:
+        return engine.run_batch(tasks, max_workers, result_callback=on_result)
+    finally:
+        engine.task_callback = task_callback
@@ -0,0 +1,254 @@
+"""
+CPU scheduling of child processes for GifClip Maker.
+
+Thread budget: every running job (conversion, size estimate) holds a lease on
+one shared pool of threads. Shares are recomputed whenever a job starts or
+finishes, and each child process takes its job's current share when it is
+launched (ffmpeg -threads/-filter_threads, the GIF encoder's thread count), so
+concurrent jobs and the preview player do not oversubscribe the CPU.
+
+Background mode: children run at a lower CPU and I/O priority, and are
+duty-cycled while the user is working in the UI (ProcessThrottle). Plain
+Python, no Qt imports.
+"""
+
+import os
+import sys
+import time
+import signal
+import platform
+import threading
+
+class Lease:
+    # One job's part of a ThreadBudget; threads changes whenever the budget rebalances
+    def __init__(self, budget, name, weight=1):
+        self.budget = budget
+        self.name = name
+        self.weight = weight
+        self.threads = 1
+
+    @property
+    def share(self):
+        # Fraction of the budget held right now (0..1)
+        return min(1.0, self.threads / self.budget.total)
+
+    def release(self):
+        self.budget.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class ThreadBudget:
+    # total: threads split between the leases (0 / None = all cores). Shares follow the lease
+    # weights (largest remainder, at least one thread each: with more jobs than threads every
+    # job runs single-threaded). listener(snapshot) is called after every rebalance.
+    def __init__(self, total=None, listener=None):
+        self.total = max(1, total or os.cpu_count() or 1)
+        self.listener = listener
+        self.leases = []
+        self._lock = threading.Lock()
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        # Shared by every engine/estimator of the process, so conversions and estimates split one budget
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = max(1, total or os.cpu_count() or 1)
+            self._rebalance()
+        self._notify()
+
+    def acquire(self, name, weight=1):
+        lease = Lease(self, name, weight)
+        with self._lock:
+            self.leases.append(lease)
+            self._rebalance()
+        self._notify()
+        return lease
+
+    def release(self, lease):
+        with self._lock:
+            if lease not in self.leases: return
+            self.leases.remove(lease)
+            self._rebalance()
+        self._notify()
+
+    def _rebalance(self):
+        if not self.leases: return
+        weights = sum(l.weight for l in self.leases)
+        exact = [self.total * l.weight / weights for l in self.leases]
+        threads = [int(x) for x in exact]
+        spare = self.total - sum(threads)
+        for i in sorted(range(len(exact)), key=lambda i: threads[i] - exact[i])[:max(0, spare)]:
+            threads[i] += 1
+        for lease, n in zip(self.leases, threads):
+            lease.threads = max(1, n)
+
+    def snapshot(self):
+        # [{"name", "threads", "share"}] of the running jobs
+        with self._lock:
+            return [{"name": l.name, "threads": l.threads, "share": round(min(1.0, l.threads / self.total), 3)}
+                    for l in self.leases]
+
+    def _notify(self):
+        # Shares also reach the progress records (TaskProgress threads/cpu_share), so only the listener hears this
+        if self.listener: self.listener(self.snapshot())
+
+def split_threads(threads, encoder=True):
+    # (decoder, encoder) threads of one ffmpeg | encoder pipeline. The encoder (gifski,
+    # the native encoder) is the heavier half; without one ffmpeg gets everything.
+    if not encoder:
+        return max(1, threads), 0
+    dec = max(1, threads // 3)
+    return dec, max(1, threads - dec)
+
+def ffmpeg_thread_args(threads):
+    # Before -i: -threads sets the decoder's threads, -filter_threads the filter graph's
+    # (scale, palettegen, ...). The libwebp/GIF encoders run inside the same process.
+    n = str(max(1, threads))
+    return ["-threads", n, "-filter_threads", n]
+
+def encoder_env(threads):
+    # gifski has no thread option; its quantizer (libimagequant) runs on rayon,
+    # which sizes its pool from RAYON_NUM_THREADS
+    return dict(os.environ, RAYON_NUM_THREADS=str(max(1, threads)))
+
+# -------- Process priority --------
+
+PRIORITY_MODES = ("normal", "background")
+BACKGROUND_NICE = 10
+
+# ioprio_set syscall numbers (no wrapper in libc / the os module)
+_IOPRIO_SET = {"x86_64": 251, "amd64": 251, "i386": 289, "i686": 289, "aarch64": 30, "arm64": 30,
+               "armv7l": 314, "ppc64le": 273}
+IOPRIO_CLASS_BE = 2
+IOPRIO_WHO_PROCESS = 1
+
+def _ioprio_set(tid, ioclass, level):
+    nr = _IOPRIO_SET.get(platform.machine().lower())
+    if nr is None: return False
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.syscall(nr, IOPRIO_WHO_PROCESS, tid, (ioclass << 13) | level) == 0
+    except (OSError, AttributeError):
+        return False
+
+def _threads(pid):
+    # Linux: nice and I/O priority are per thread, so every thread of the child is changed
+    # (threads started later inherit them from the main thread)
+    try:
+        return [int(t) for t in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        return [pid]
+
+def _win_call(pid, access, func):
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(access, False, pid)
+    if not handle: return False
+    try:
+        return bool(func(handle))
+    finally:
+        kernel32.CloseHandle(handle)
+
+def lower_priority(proc):
+    # Background mode for one child (subprocess.Popen), best effort:
+    # Linux nice 10 + lowest best-effort I/O priority (ionice -c2 -n7; the idle class could
+    # starve the job on a busy disk), other POSIX nice 10, Windows BELOW_NORMAL_PRIORITY_CLASS.
+    try:
+        if os.name == 'nt':
+            import ctypes
+            # PROCESS_SET_INFORMATION, BELOW_NORMAL_PRIORITY_CLASS
+            return _win_call(proc.pid, 0x0200, lambda h: ctypes.windll.kernel32.SetPriorityClass(h, 0x4000))
+        for tid in _threads(proc.pid) if sys.platform.startswith("linux") else [proc.pid]:
+            try:
+                if os.getpriority(os.PRIO_PROCESS, tid) < BACKGROUND_NICE:
+                    os.setpriority(os.PRIO_PROCESS, tid, BACKGROUND_NICE)
+            except OSError:
+                pass # Thread already gone
+            if sys.platform.startswith("linux"):
+                _ioprio_set(tid, IOPRIO_CLASS_BE, 7)
+        return True
+    except Exception as e:
+        print(f"Could not lower priority of process {proc.pid}: {e}")
+        return False
+
+def lower_thread_priority():
+    # Background mode for in-process work on the calling thread (the native GIF encoder).
+    # Linux only: there nice is per thread; elsewhere it would slow the whole app (UI included).
+    if not sys.platform.startswith("linux"): return False
+    try:
+        tid = threading.get_native_id()
+        if os.getpriority(os.PRIO_PROCESS, tid) < BACKGROUND_NICE:
+            os.setpriority(os.PRIO_PROCESS, tid, BACKGROUND_NICE)
+        return True
+    except OSError:
+        return False
+
+def suspend_process(proc, pause=True):
+    # SIGSTOP/SIGCONT; Windows NtSuspendProcess/NtResumeProcess. False if the process is gone.
+    if proc.poll() is not None: return False
+    try:
+        if os.name == 'nt':
+            import ctypes
+            ntdll = ctypes.windll.ntdll
+            func = ntdll.NtSuspendProcess if pause else ntdll.NtResumeProcess
+            return _win_call(proc.pid, 0x0800, lambda h: func(h) == 0) # PROCESS_SUSPEND_RESUME
+        proc.send_signal(signal.SIGSTOP if pause else signal.SIGCONT)
+        return True
+    except (OSError, AttributeError):
+        return False
+
+class ProcessThrottle:
+    # Duty-cycles child processes while the UI is in use. poke() on every user interaction;
+    # until `hold` seconds after the last one, the processes run `duty` of every `period`
+    # and are suspended the rest, then run freely again. Nice values cannot be raised back
+    # without privileges, so suspending is the way to yield the CPU for a moment.
+    # processes: callable returning the current [subprocess.Popen].
+    def __init__(self, processes, duty=0.25, period=0.2, hold=1.0):
+        self.processes = processes
+        self.duty = duty
+        self.period = period
+        self.hold = hold
+        self._last = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def poke(self):
+        self._last = time.monotonic()
+        with self._lock:
+            if self._closed.is_set() or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name="throttle", daemon=True)
+            self._thread.start()
+
+    @property
+    def active(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        while not self._closed.is_set() and time.monotonic() - self._last < self.hold:
+            paused = [p for p in self.processes() if suspend_process(p, True)]
+            try:
+                self._closed.wait(self.period * (1 - self.duty))
+            finally:
+                for p in paused:
+                    suspend_process(p, False)
+            self._closed.wait(self.period * self.duty)
+
+    def close(self):
+        # Stops throttling; every suspended process is resumed before the thread ends
+        self._closed.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=2)
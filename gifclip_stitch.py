@@ -0,0 +1,128 @@
+"""
+Stitching of animated GIF/WebP parts for GifClip Maker.
+
+Segment-parallel encoding (ConversionEngine.encode_segments) writes one part
+per time range; the parts are joined here without re-encoding. Blocks are
+copied as they are read, so memory stays small. Plain Python, no Qt or NumPy.
+"""
+
+import os
+import struct
+
+# -------- GIF --------
+
+def _gif_sub_blocks(f):
+    # Raw sub-block chain including length bytes and terminator
+    chunks = []
+    while True:
+        n = f.read(1)
+        if not n:
+            raise ValueError("truncated GIF")
+        chunks.append(n)
+        if n[0] == 0: break
+        chunks.append(f.read(n[0]))
+    return b"".join(chunks)
+
+def stitch_gif(parts, out):
+    # Header, screen descriptor, loop extension and global palette come from the first part.
+    # Frames of a later part whose global palette differs get it as their local palette, so
+    # every part keeps its colors; parts that share the palette keep using the global table.
+    # Delays and disposal are copied unchanged. Returns the number of frames written.
+    frames = 0
+    with open(out, "wb") as o:
+        base_gct = None
+        for n, part in enumerate(parts):
+            with open(part, "rb") as f:
+                head = f.read(13)
+                if head[:6] not in (b"GIF87a", b"GIF89a"):
+                    raise ValueError(f"not a GIF file: {part}")
+                flags = head[10]
+                gct_bits = (flags & 7) + 1
+                gct = f.read(3 * (1 << gct_bits)) if flags & 0x80 else b""
+                if n == 0:
+                    o.write(b"GIF89a" + head[6:] + gct)
+                    base_gct = gct
+                while True:
+                    b = f.read(1)
+                    if not b or b == b"\x3B": break
+                    if b == b"\x21":
+                        label = f.read(1)
+                        body = _gif_sub_blocks(f)
+                        # Application blocks (NETSCAPE loop) only once, from the first part
+                        if label == b"\xFF" and n > 0: continue
+                        o.write(b + label + body)
+                    elif b == b"\x2C":
+                        desc = bytearray(f.read(9))
+                        fl = desc[8]
+                        lct = f.read(3 * (2 << (fl & 7))) if fl & 0x80 else b""
+                        if not lct and gct != base_gct:
+                            if not gct:
+                                raise ValueError(f"frame without palette: {part}")
+                            desc[8] = (fl & 0x40) | 0x80 | (gct_bits - 1)
+                            lct = gct
+                        o.write(b + bytes(desc) + lct + f.read(1) + _gif_sub_blocks(f))
+                        frames += 1
+                    else:
+                        raise ValueError(f"unexpected GIF block {b!r} in {part}")
+        o.write(b"\x3B")
+    return frames
+
+# -------- WebP --------
+
+def _riff_chunks(f):
+    # (fourcc, payload) for every chunk of a RIFF/WEBP file
+    head = f.read(12)
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WEBP":
+        raise ValueError("not a WebP file")
+    while True:
+        hdr = f.read(8)
+        if len(hdr) < 8: break
+        fourcc, size = hdr[:4], struct.unpack("<I", hdr[4:])[0]
+        payload = f.read(size + (size & 1))[:size]
+        yield fourcc, payload
+
+def _riff_chunk(fourcc, payload):
+    return fourcc + struct.pack("<I", len(payload)) + payload + (b"\x00" if len(payload) & 1 else b"")
+
+def stitch_webp(parts, out):
+    # Animated WebP: VP8X/ANIM (canvas, loop, background) from the first part, then the ANMF
+    # frames of all parts in order; VP8X feature flags are merged (e.g. alpha in a later part).
+    # Parts must be animated (VP8X + ANMF). Returns the number of frames written.
+    frames = 0
+    flags = 0
+    vp8x_at = None
+    with open(out, "wb") as o:
+        o.write(b"RIFF\x00\x00\x00\x00WEBP")
+        for n, part in enumerate(parts):
+            seen_anmf = False
+            with open(part, "rb") as f:
+                for fourcc, payload in _riff_chunks(f):
+                    if fourcc == b"VP8X":
+                        flags |= payload[0]
+                        if n == 0:
+                            vp8x_at = o.tell()
+                            o.write(_riff_chunk(fourcc, payload))
+                    elif fourcc == b"ANMF":
+                        o.write(_riff_chunk(fourcc, payload))
+                        seen_anmf = True
+                        frames += 1
+                    elif n == 0 and fourcc in (b"ANIM", b"ICCP"):
+                        o.write(_riff_chunk(fourcc, payload))
+                    elif fourcc in (b"VP8 ", b"VP8L", b"ALPH"):
+                        raise ValueError(f"not an animated WebP: {part}")
+            if not seen_anmf:
+                raise ValueError(f"no frames in {part}")
+        if vp8x_at is None:
+            raise ValueError("first part has no VP8X header")
+        end = o.tell()
+        o.seek(4)
+        o.write(struct.pack("<I", end - 8))
+        o.seek(vp8x_at + 8)
+        o.write(bytes([flags]))
+    return frames
+
+def stitch(parts, out):
+    # By output extension
+    if os.path.splitext(out)[1].lower() == ".webp":
+        return stitch_webp(parts, out)
+    return stitch_gif(parts, out)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # Every test gets its own per-user cache folder (probe/packet caches, job queue, outputs)
+    root = tmp_path / "cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(root))
+    monkeypatch.setenv("LOCALAPPDATA", str(root))
+    return root
+
+def write_tool(folder, name, body):
+    # Stand-in for ffmpeg/gifski/ffprobe: a Python script run by the current interpreter
+    path = os.path.join(str(folder), name)
+    with open(path, "w") as f:
+        f.write(f"#!{sys.executable}\n{body}")
+    os.chmod(path, 0o755)
+    return path
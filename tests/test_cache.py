@@ -0,0 +1,76 @@
+import os
+
+import gifclip_cache
+
+from gifclip_cache import OutputCache, task_key
+from gifclip_engine import default_settings
+
+def write_gif(path, size=100):
+    with open(path, "wb") as f:
+        f.write(b"GIF89a" + b"\0" * (size - 7) + b";")
+    return str(path)
+
+def test_store_and_fetch(tmp_path):
+    cache = OutputCache(str(tmp_path / "outputs"))
+    cache.store("k1", [write_gif(tmp_path / "a.gif")])
+    out = str(tmp_path / "copy.gif")
+    assert cache.fetch("k1", [out])
+    assert os.path.getsize(out) == 100
+    assert not cache.fetch("k2", [str(tmp_path / "other.gif")])
+    # The index survives a restart
+    assert OutputCache(str(tmp_path / "outputs")).fetch("k1", [str(tmp_path / "again.gif")])
+
+def test_damaged_entry_dropped(tmp_path):
+    cache = OutputCache(str(tmp_path / "outputs"), max_bytes=0)
+    cache.store("k1", [write_gif(tmp_path / "a.gif")])
+    with open(os.path.join(cache.folder, cache.entries["k1"]["files"][0]), "r+b") as f:
+        f.write(b"junk")
+    assert not cache.fetch("k1", [str(tmp_path / "copy.gif")])
+    assert "k1" not in cache.entries
+
+def test_failed_fetch_leaves_no_outputs(tmp_path, monkeypatch):
+    cache = OutputCache(str(tmp_path / "outputs"))
+    cache.store("k1", [write_gif(tmp_path / "a.gif"), write_gif(tmp_path / "b.gif")])
+    link = gifclip_cache._link_or_copy
+    def fail_second(src, dst):
+        if src.endswith(".1.gif"): raise OSError("disk full")
+        link(src, dst)
+    monkeypatch.setattr(gifclip_cache, "_link_or_copy", fail_second)
+    outs = [str(tmp_path / "x.gif"), str(tmp_path / "y.gif")]
+    assert not cache.fetch("k1", outs)
+    assert not any(os.path.exists(o) or os.path.exists(o + ".cache.tmp") for o in outs)
+
+def test_partial_output_not_stored(tmp_path):
+    cache = OutputCache(str(tmp_path / "outputs"))
+    bad = tmp_path / "bad.gif"
+    bad.write_bytes(b"\0" * 50)
+    cache.store("k1", [write_gif(tmp_path / "a.gif"), str(bad)])
+    assert cache.entries == {}
+
+def test_eviction_keeps_recently_used(tmp_path):
+    cache = OutputCache(str(tmp_path / "outputs"), max_bytes=250)
+    for key in ("k1", "k2"):
+        cache.store(key, [write_gif(tmp_path / f"{key}.gif")])
+    assert cache.fetch("k1", [str(tmp_path / "use.gif")]) # k2 is now the least recently used
+    cache.store("k3", [write_gif(tmp_path / "k3.gif")])
+    assert sorted(cache.entries) == ["k1", "k3"]
+    assert sorted(os.listdir(cache.folder)) == sorted(["index.json"] + [n for e in cache.entries.values() for n in e["files"]])
+
+def test_eviction_keeps_newest_entry(tmp_path):
+    cache = OutputCache(str(tmp_path / "outputs"), max_bytes=50)
+    cache.store("k1", [write_gif(tmp_path / "a.gif")])
+    cache.store("k2", [write_gif(tmp_path / "b.gif")])
+    assert list(cache.entries) == ["k2"]
+
+def test_task_key_follows_output_settings(tmp_path):
+    src = tmp_path / "clip.mp4"
+    src.write_bytes(b"x" * 1000)
+    task = {"path": str(src), "format": "GIF", "settings": default_settings(640, 480, 30, 10)}
+    key = task_key(task, "gifski")
+    assert key == task_key(dict(task, output_dir="elsewhere"), "gifski")
+    assert key != task_key(task, "ffmpeg")
+    assert key != task_key(dict(task, settings=dict(task["settings"], quality=60)), "gifski")
+    half = dict(task["settings"], resize_mode="scale_50")
+    custom = dict(task["settings"], resize_mode="custom", width=320, height=240)
+    assert task_key(dict(task, settings=half), "gifski") == task_key(dict(task, settings=custom), "gifski")
+    assert task_key(dict(task, path=str(tmp_path / "missing.mp4")), "gifski") is None
@@ -0,0 +1,70 @@
+import os
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from gifclip_gifenc import GifEncoder, lzw_decode, lzw_encode
+
+def frames_rgb(path):
+    # Composited RGB frames and their durations, as a viewer shows them
+    out = []
+    with Image.open(path) as im:
+        for i in range(im.n_frames):
+            im.seek(i)
+            out.append((np.asarray(im.convert("RGB")), im.info.get("duration")))
+    return out
+
+def moving_square(n, w=64, h=48, size=12):
+    frames = []
+    for i in range(n):
+        f = np.zeros((h, w, 3), np.uint8)
+        f[:, :] = (30, 60, 90)
+        f[10:10 + size, 4 * i:4 * i + size] = (250, 200, 0)
+        frames.append(f)
+    return frames
+
+@pytest.mark.parametrize("min_code_size", [2, 4, 8])
+@pytest.mark.parametrize("length", [0, 1, 7, 5000, 70000])
+def test_lzw_round_trip(min_code_size, length):
+    rng = random.Random(length * 10 + min_code_size)
+    top = 1 << min_code_size
+    # Runs and noise: long runs fill the table (clear codes), noise keeps codes short
+    data = bytes(rng.randrange(top) if rng.random() < 0.3 else (i // 50) % top for i in range(length))
+    assert lzw_decode(lzw_encode(data, min_code_size), min_code_size, length) == data
+
+def test_encoder_round_trip(tmp_path):
+    out = str(tmp_path / "out.gif")
+    src = moving_square(6)
+    enc = GifEncoder(out, 64, 48, 20, quality=100, dither="none")
+    for f in src:
+        enc.add(f.tobytes())
+    enc.close()
+    shown = frames_rgb(out)
+    assert len(shown) == 6
+    for (rgb, duration), f in zip(shown, src):
+        assert rgb.shape == f.shape
+        assert np.abs(rgb.astype(int) - f.astype(int)).max() <= 8
+        assert duration == 50
+
+@pytest.mark.parametrize("palette", ["global", "local"])
+def test_unchanged_frames_extend_the_delay(tmp_path, palette):
+    out = str(tmp_path / "out.gif")
+    a, b = moving_square(2)
+    enc = GifEncoder(out, 64, 48, 10, quality=100, palette=palette, dither="none")
+    for f in (a, a, a, b):
+        enc.add(f)
+    enc.close()
+    assert enc.frames == 4 and enc.written == 2
+    assert [d for _, d in frames_rgb(out)] == [300, 100]
+
+def test_abort_removes_partial_output(tmp_path):
+    out = str(tmp_path / "out.gif")
+    enc = GifEncoder(out, 64, 48, 20)
+    for f in moving_square(10):
+        enc.add(f)
+    assert os.path.exists(out)
+    enc.abort()
+    assert not os.path.exists(out)
@@ -0,0 +1,73 @@
+import os
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from gifclip_gifenc import lzw_encode, optimize_gif, sub_blocks
+
+PALETTE = np.array([(0, 0, 0), (255, 255, 255), (200, 30, 30), (30, 30, 200)] + [(0, 0, 0)] * 4, np.uint8)
+
+def write_full_frames(path, frames, delay=10, interlace_first=False):
+    # Unoptimized GIF as simple encoders write it: every frame full size, disposal 1, global palette
+    h, w = frames[0].shape
+    with open(path, "wb") as f:
+        f.write(b"GIF89a" + struct.pack("<HHBBB", w, h, 0x80 | 0x70 | 2, 0, 0) + PALETTE.tobytes())
+        f.write(b"\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00")
+        for n, idx in enumerate(frames):
+            flags = 0
+            if interlace_first and n == 0:
+                flags = 0x40
+                idx = np.concatenate([idx[0::8], idx[4::8], idx[2::4], idx[1::2]])
+            f.write(b"\x21\xF9\x04\x04" + struct.pack("<H", delay) + b"\x00\x00")
+            f.write(b"\x2C" + struct.pack("<HHHHB", 0, 0, w, h, flags))
+            f.write(b"\x03" + sub_blocks(lzw_encode(np.ascontiguousarray(idx).tobytes(), 3)))
+        f.write(b"\x3B")
+
+def shown(path):
+    out = []
+    with Image.open(path) as im:
+        for i in range(im.n_frames):
+            im.seek(i)
+            out.append((np.asarray(im.convert("RGB")), im.info.get("duration")))
+    return out
+
+def sprite_frames(n, w=40, h=32):
+    frames = []
+    for i in range(n):
+        idx = np.ones((h, w), np.uint8)
+        idx[8:16, 3 * i:3 * i + 8] = 2
+        idx[20:24, :4] = 3
+        frames.append(idx)
+    return frames
+
+def test_frames_cropped_to_changes(tmp_path):
+    src, dst = str(tmp_path / "in.gif"), str(tmp_path / "out.gif")
+    write_full_frames(src, sprite_frames(8), interlace_first=True)
+    assert optimize_gif(src, dst) == (8, 8)
+    assert os.path.getsize(dst) < os.path.getsize(src)
+    before, after = shown(src), shown(dst)
+    assert len(after) == len(before)
+    for (a, da), (b, db) in zip(before, after):
+        assert np.array_equal(a, b) and da == db
+
+def test_identical_frames_merged(tmp_path):
+    src, dst = str(tmp_path / "in.gif"), str(tmp_path / "out.gif")
+    a, b = sprite_frames(2)
+    write_full_frames(src, [a, a, b, b, b, a])
+    assert optimize_gif(src, dst) == (6, 3)
+    after = shown(dst)
+    assert [d for _, d in after] == [200, 300, 100]
+    assert np.array_equal(after[1][0], shown(src)[2][0])
+
+def test_dedup_drops_near_duplicates(tmp_path):
+    src, dst = str(tmp_path / "in.gif"), str(tmp_path / "out.gif")
+    a = sprite_frames(1)[0]
+    nudged = a.copy()
+    nudged[0, 0] = 0 # One pixel: far below the threshold for its 8x8 block
+    write_full_frames(src, [a, nudged, a])
+    assert optimize_gif(src, dst)[1] == 3
+    assert optimize_gif(src, dst, dedup=12) == (3, 1)
+    assert [d for _, d in shown(dst)] == [300]
@@ -0,0 +1,73 @@
+import os
+import threading
+
+import pytest
+
+from conftest import write_tool
+from gifclip_probe import PacketIndexCache, ProbePool, get_packet_index, probe_keyframe
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="stand-in tools are scripts with a shebang")
+
+# ffprobe stand-in: keyframes every 10 s from 1.4 s; a full packet scan fails (and is counted)
+FFPROBE = """import sys, json
+a = sys.argv
+if "-read_intervals" in a:
+    t = float(a[a.index("-read_intervals") + 1].split("%")[0])
+    k = 1.4 + int(max(0, t - 1.4) // 10) * 10
+    print(json.dumps({"packets": [{"pts_time": str(k), "dts_time": str(k), "flags": "K__"}],
+                      "format": {"start_time": "1.400000"}}))
+else:
+    open(a[-1] + ".scans", "a").write("scan\\n")
+    sys.exit(1)
+"""
+
+@pytest.fixture
+def ffprobe(tmp_path):
+    return write_tool(tmp_path, "ffprobe", FFPROBE)
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"x" * 100)
+    return str(path)
+
+def test_failed_scan_cached(ffprobe, src, tmp_path):
+    cache = PacketIndexCache(str(tmp_path / "packets"))
+    assert get_packet_index(src, ffprobe, cache) is None
+    assert get_packet_index(src, ffprobe, cache) is None
+    with open(src + ".scans") as f:
+        assert f.read().count("scan") == 1
+
+def test_cached_only_never_scans(ffprobe, src, tmp_path):
+    cache = PacketIndexCache(str(tmp_path / "packets"))
+    assert get_packet_index(src, ffprobe, cache, cached_only=True) is None
+    assert not os.path.exists(src + ".scans")
+    index = {"bin": 1.0, "bytes": [10], "keyframes": [0.0], "start": 0.0}
+    cache.put(src, index)
+    assert get_packet_index(src, ffprobe, cache, cached_only=True) == index
+
+def test_probe_keyframe(ffprobe, src):
+    assert probe_keyframe(src, 25.0, ffprobe) == {"keyframes": [21.4], "start": 1.4}
+    assert probe_keyframe(src, 0, ffprobe) is None
+    assert probe_keyframe(src, 25.0, ffprobe + "-missing") is None
+
+# ffprobe stand-in answering metadata and packet scans
+FFPROBE_FULL = """import sys, json
+a = sys.argv
+if "stream=width,height,avg_frame_rate,r_frame_rate,nb_frames,duration:format=duration" in a:
+    print(json.dumps({"streams": [{"width": 64, "height": 48, "avg_frame_rate": "25/1", "duration": "4.0"}]}))
+else:
+    for i in range(4):
+        print(f"pts_time={i}.0|dts_time={i}.0|size={1000 + i}|flags=K_")
+"""
+
+def test_pool_builds_packet_index_after_probe(tmp_path, src):
+    tool = write_tool(tmp_path, "ffprobe_full", FFPROBE_FULL)
+    pool = ProbePool(None, prober="ffprobe", ffprobe=tool, packets=True)
+    done = threading.Event()
+    pool.submit(src, lambda path, info: done.set())
+    assert done.wait(10)
+    pool._packet_pool.shutdown(wait=True)
+    pool.shutdown()
+    index = get_packet_index(src, tool, cached_only=True)
+    assert index["bytes"] == [1000, 1001, 1002, 1003]
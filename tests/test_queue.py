@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import write_tool
+from gifclip_engine import ConversionEngine, default_settings
+import gifclip_queue
+from gifclip_queue import JobQueue, run_journaled
+
+# ffmpeg stand-in: one "-progress" block and 10 KB of frames every `delay` seconds, 10 times
+FFMPEG = """import sys, time
+delay = {delay}
+for i in range(1, 11):
+    sys.stderr.write(f"frame={{i * 3}}\\nprogress=continue\\n"); sys.stderr.flush()
+    sys.stdout.buffer.write(b"\\0" * 10000); sys.stdout.flush()
+    time.sleep(delay)
+sys.stderr.write("frame=30\\nprogress=end\\n")
+"""
+
+# gifski stand-in: a GIF header at once (like a real partial output), then grows with its input
+GIFSKI = """import sys
+out = sys.argv[sys.argv.index("-o") + 1]
+with open(out, "wb") as f:
+    f.write(b"GIF89a" + b"\\0" * 100); f.flush()
+    while sys.stdin.buffer.read(1000): f.write(b"\\0" * 10); f.flush()
+    f.write(b";")
+"""
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JobQueue(str(tmp_path / "jobs.sqlite"))
+    yield q
+    q.close()
+
+def make_task(folder, name="clip.mp4"):
+    src = os.path.join(str(folder), name)
+    with open(src, "wb") as f:
+        f.write(b"x" * 100)
+    return {"path": src, "format": "GIF", "settings": default_settings(320, 240, 30, 10)}
+
+def write_gif(path):
+    with open(path, "wb") as f:
+        f.write(b"GIF89a" + b"\0" * 20 + b";")
+
+def test_done_batch_is_finished(queue, tmp_path):
+    tasks = [make_task(tmp_path, "a.mp4"), make_task(tmp_path, "b.mp4")]
+    batch, ids = queue.add_batch(tasks, source="cli")
+    assert [b["remaining"] for b in queue.unfinished_batches("cli")] == [2]
+    for i, job_id in enumerate(ids):
+        out = str(tmp_path / f"{i}.gif")
+        write_gif(out)
+        queue.mark_running(job_id)
+        queue.mark_result(job_id, {"status": "done", "output": out})
+    assert queue.unfinished_batches("cli") == []
+    assert queue.unfinished_batches("gui") == []
+    assert queue.resume(batch) == []
+
+def test_resume_redoes_missing_outputs_and_cancelled_jobs(queue, tmp_path):
+    tasks = [make_task(tmp_path, f"{n}.mp4") for n in "abc"]
+    batch, ids = queue.add_batch(tasks)
+    out = str(tmp_path / "a.gif")
+    write_gif(out)
+    queue.mark_result(ids[0], {"status": "done", "output": out})
+    queue.mark_result(ids[1], {"status": "cancelled", "output": None})
+    queue.mark_running(ids[2]) # Left "running" by a crash
+    os.remove(out)
+    todo = queue.resume(batch)
+    assert [job_id for job_id, _ in todo] == ids
+    assert [t["path"] for _, t in todo] == [t["path"] for t in tasks]
+    assert {j["state"] for j in queue.jobs(batch)} == {"pending"}
+
+def test_resume_can_skip_failed_jobs(queue, tmp_path):
+    batch, ids = queue.add_batch([make_task(tmp_path)])
+    queue.mark_result(ids[0], {"status": "failed", "error": "boom", "attempts": 3})
+    job = queue.jobs(batch)[0]
+    assert (job["state"], job["error"], job["attempts"]) == ("failed", "boom", 2)
+    assert queue.resume(batch, retry_failed=False) == []
+    assert len(queue.resume(batch)) == 1
+
+def test_prune_drops_unfinished_batches_per_source(queue, tmp_path, monkeypatch):
+    monkeypatch.setattr(gifclip_queue, "KEEP_BATCHES", 2)
+    task = make_task(tmp_path)
+    stale, _ = queue.add_batch([task], source="gui")
+    with queue.db:
+        queue.db.execute("UPDATE batches SET created = ? WHERE id = ?",
+                         (time.time() - gifclip_queue.UNFINISHED_MAX_AGE - 1, stale))
+    gui = queue.add_batch([task], source="gui")[0]
+    cli = [queue.add_batch([task], source="cli")[0] for _ in range(4)]
+    assert [b["id"] for b in queue.unfinished_batches("cli")] == cli[:1:-1] # Newest two
+    assert [b["id"] for b in queue.unfinished_batches("gui")] == [gui] # Too old
+
+@pytest.mark.skipif(os.name == 'nt', reason="stand-in tools are scripts with a shebang")
+def test_cancelled_job_stays_pending_and_resumes(queue, tmp_path):
+    tools = tmp_path / "tools"
+    tools.mkdir()
+    gifski = write_tool(tools, "gifski", GIFSKI)
+    task = make_task(tmp_path)
+    batch, ids = queue.add_batch([task], source="cli")
+
+    engine = ConversionEngine(write_tool(tools, "ffmpeg", FFMPEG.format(delay=0.3)), gifski,
+                              ffprobe_path=str(tools / "none"))
+    threading.Timer(1.0, engine.stop).start()
+    res = run_journaled(engine, queue, list(zip(ids, [task])))
+    assert res[0]["status"] == "cancelled"
+    assert [j["state"] for j in queue.jobs(batch)] == ["pending"]
+    assert queue.unfinished_batches("cli")[0]["id"] == batch
+    assert not os.path.exists(tmp_path / "clip.gif") # Truncated output removed
+
+    engine = ConversionEngine(write_tool(tools, "ffmpeg_fast", FFMPEG.format(delay=0)), gifski,
+                              ffprobe_path=str(tools / "none"))
+    res = run_journaled(engine, queue, queue.resume(batch))
+    assert res[0]["status"] == "done"
+    assert res[0]["output"] == str(tmp_path / "clip.gif")
+    assert queue.unfinished_batches("cli") == []
@@ -0,0 +1,44 @@
+import pytest
+
+from gifclip_engine import ConversionEngine, keyframe_trim, segment_ranges
+
+def test_segment_ranges_even_on_frame_grid():
+    fps = 20
+    ranges = segment_ranges(3.3, 63.3, 4, fps)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 3.3 and ranges[-1][1] == 63.3
+    for (a, b), (c, _) in zip(ranges, ranges[1:]):
+        assert b == c # No gap or overlap at a seam
+    for a, b in ranges:
+        assert b - a == pytest.approx(15.0)
+        assert (a - 3.3) * fps == pytest.approx(round((a - 3.3) * fps)) # Cut on the output frame grid
+
+def test_segment_ranges_short_span():
+    assert segment_ranges(0, 0.04, 4, 25) == [(0, 0.04)]
+    ranges = segment_ranges(0, 10, 3, 7)
+    assert [round(b - a, 3) for a, b in ranges] == [3.286, 3.429, 3.286]
+
+def test_keyframe_trim_seeks_to_keyframe_before_start():
+    index = {"start": 1.4, "keyframes": [1.4, 11.4, 21.4, 31.4]}
+    args, trim = keyframe_trim(index, 25.0, 30.0)
+    assert args == ["-noaccurate_seek", "-ss", "20.000", "-t", "10.500"]
+    assert trim == "trim=start=5.000:end=10.000,setpts=PTS-STARTPTS"
+
+def test_keyframe_trim_without_index_uses_input_seek():
+    args, trim = keyframe_trim(None, 25.0, 30.0)
+    assert args == ["-ss", "25.000", "-t", "5.500"]
+    assert trim == "trim=start=0.000:end=5.000,setpts=PTS-STARTPTS"
+
+def test_keyframe_trim_from_start():
+    args, trim = keyframe_trim({"start": 0.0, "keyframes": [0.0, 10.0]}, 0, 0)
+    assert args == []
+    assert trim == "trim=start=0.000,setpts=PTS-STARTPTS"
+
+def test_memory_plan_downscales_when_clip_cannot_be_split():
+    engine = ConversionEngine("ffmpeg", None, memory_limit_mb=1024, memory_policy="chunk")
+    settings = {'fps': 25, 'quality': 90, 'gif_palette': "full"}
+    w, h, chunks = engine.memory_plan("GIF", settings, 1920, 1080, 25 * 60, 60.0)
+    assert (w, h) == (1920, 1080) and chunks > 1
+    settings['fps'] = 0.2 # Two frames over ten seconds: no cut on the frame grid
+    w, h, chunks = engine.memory_plan("GIF", settings, 1920, 1080, 400, 10.0)
+    assert chunks == 1 and w < 1920 and h < 1080
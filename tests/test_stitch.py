@@ -0,0 +1,64 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+from PIL import features
+
+from gifclip_stitch import stitch
+
+def clip(n, color, offset=0, w=48, h=32):
+    frames = []
+    for i in range(n):
+        f = np.zeros((h, w, 3), np.uint8)
+        f[:, :] = (20, 20, 20)
+        f[8:16, 4 * (i + offset):4 * (i + offset) + 8] = color
+        frames.append(Image.fromarray(f))
+    return frames
+
+def save(path, frames, duration, **kw):
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=duration, loop=0, **kw)
+
+def shown(path):
+    out = []
+    with Image.open(path) as im:
+        loop = im.info.get("loop")
+        for i in range(im.n_frames):
+            im.seek(i)
+            out.append((np.asarray(im.convert("RGB")), im.info.get("duration")))
+    return out, loop
+
+def test_gif_parts_joined_in_order(tmp_path):
+    # Different colors: the second part's global palette becomes a local one
+    a, b = clip(3, (250, 0, 0)), clip(4, (0, 0, 250), offset=3)
+    parts = [str(tmp_path / "p0.gif"), str(tmp_path / "p1.gif")]
+    save(parts[0], a, 40)
+    save(parts[1], b, 60)
+    out = str(tmp_path / "out.gif")
+    assert stitch(parts, out) == 7
+    frames, loop = shown(out)
+    expected = shown(parts[0])[0] + shown(parts[1])[0]
+    assert loop == 0
+    assert len(frames) == len(expected)
+    for (f, d), (e, de) in zip(frames, expected):
+        assert np.array_equal(f, e) and d == de
+
+def test_gif_rejects_other_files(tmp_path):
+    part = tmp_path / "p0.gif"
+    part.write_bytes(b"RIFF0000WEBP")
+    with pytest.raises(ValueError):
+        stitch([str(part)], str(tmp_path / "out.gif"))
+
+@pytest.mark.skipif(not features.check("webp"), reason="Pillow without WebP")
+def test_webp_parts_joined_in_order(tmp_path):
+    a, b = clip(3, (250, 0, 0)), clip(2, (0, 0, 250), offset=3)
+    parts = [str(tmp_path / "p0.webp"), str(tmp_path / "p1.webp")]
+    save(parts[0], a, 40, lossless=True)
+    save(parts[1], b, 60, lossless=True)
+    out = str(tmp_path / "out.webp")
+    assert stitch(parts, out) == 5
+    frames, loop = shown(out)
+    expected = shown(parts[0])[0] + shown(parts[1])[0]
+    assert loop == 0
+    assert [d for _, d in frames] == [40, 40, 40, 60, 60]
+    for (f, _), (e, _) in zip(frames, expected):
+        assert np.array_equal(f, e)
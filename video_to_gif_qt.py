@@ -1,90 +1,39 @@
 
 import sys
 import os
-import subprocess
 import re
-from pathlib import Path
+import time
+
+# Startup timing (--profile-startup): (phase, perf_counter) marks
+_startup_marks = [("start", time.perf_counter())]
+
+def mark_startup(phase):
+    _startup_marks.append((phase, time.perf_counter()))
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QPushButton, QSlider, QLabel, QFileDialog, QListWidget, QComboBox,
     QMessageBox, QGroupBox, QLineEdit, QSplitter, QFrame, QSpinBox, 
     QProgressBar, QSizePolicy, QSpacerItem, QStyle, QStyleOptionSlider,
-    QStackedLayout, QGridLayout, QPlainTextEdit, QTextEdit, QDoubleSpinBox
+    QStackedLayout, QGridLayout, QPlainTextEdit, QTextEdit, QDoubleSpinBox, QCheckBox
 )
-from PyQt6.QtMultimedia import QMediaPlayer
-from PyQt6.QtMultimediaWidgets import QVideoWidget
-from PyQt6.QtCore import QUrl, Qt, QThread, pyqtSignal, QSize, QEvent, QRect, QSettings, QPoint
+mark_startup("import PyQt6.QtWidgets")
+# QtMultimedia (and its media backend) is imported at first preview: see MainWindow.ensure_media_player
+from PyQt6.QtCore import QUrl, Qt, QThread, QObject, pyqtSignal, QSize, QEvent, QRect, QSettings, QPoint
 from PyQt6.QtGui import QPainter, QColor, QPen, QIcon, QDesktopServices
-import cv2 # For metadata probing
-
-# -------- Helpers --------
-
-def get_base_dir():
-    if hasattr(sys, "_MEIPASS"):
-        return Path(sys._MEIPASS)
-    return Path(__file__).resolve().parent
-
-BASE_DIR = get_base_dir()
-
-# Dependency Paths
-DEFAULT_FFMPEG = str(BASE_DIR / "ffmpeg.exe")
-DEFAULT_GIFSKI = str(BASE_DIR / "gifski.exe")
-
-def compute_output_resolution(orig_w, orig_h, resize_mode, custom_w, custom_h, scale_percent):
-    if resize_mode == "scale":
-        ratio = scale_percent / 100.0
-        new_w = int(orig_w * ratio)
-        new_h = int(orig_h * ratio)
-        # Ensure even coordinates for ffmpeg
-        if new_w % 2 != 0: new_w += 1
-        if new_h % 2 != 0: new_h += 1
-        return new_w, new_h
-        
-    # Scale Presets
-    if resize_mode == "scale_75":
-        return _scale_dim(orig_w, orig_h, 0.75)
-    elif resize_mode == "scale_50":
-        return _scale_dim(orig_w, orig_h, 0.50)
-    elif resize_mode == "scale_33":
-        return _scale_dim(orig_w, orig_h, 0.33)
-    elif resize_mode == "scale_25":
-        return _scale_dim(orig_w, orig_h, 0.25)
-        
-    elif resize_mode == "custom":
-        # Ensure even
-        w = custom_w if custom_w % 2 == 0 else custom_w + 1
-        h = custom_h if custom_h % 2 == 0 else custom_h + 1
-        return w, h
-        
-    elif resize_mode == "original":
-        return orig_w, orig_h
-        
-    # Presets like "1920x1080"
-    m = re.match(r"(\d+)x(\d+)", resize_mode)
-    if m:
-        return int(m.group(1)), int(m.group(2))
-        
-    # Fallback/Legacy string check (shouldn't happen with new keys logic, but safe to keep?)
-    if "Scale" in resize_mode and "%" in resize_mode:
-        # Extract number
-        m = re.search(r"(\d+)%", resize_mode)
-        if m:
-            ratio = int(m.group(1)) / 100.0
-            new_w = int(orig_w * ratio)
-            new_h = int(orig_h * ratio)
-            if new_w % 2 != 0: new_w += 1
-            if new_h % 2 != 0: new_h += 1
-            return new_w, new_h
-            
-    return orig_w, orig_h
+mark_startup("import PyQt6.QtCore/QtGui")
+# cv2 is only needed by the decoder-based prober and is imported there on first use
 
-def _scale_dim(w, h, ratio):
-    nw = int(w * ratio)
-    nh = int(h * ratio)
-    if nw % 2 != 0: nw += 1
-    if nh % 2 != 0: nh += 1
-    return nw, nh
+from gifclip_engine import (
+    BASE_DIR, DEFAULT_FFMPEG, DEFAULT_GIFSKI, ConversionEngine,
+    compute_output_resolution, default_settings
+)
+from gifclip_estimate import SizeEstimator, SampleCache, SizeModel, format_estimate
+from gifclip_probe import ProbePool, ProbeCache
+from gifclip_cache import OutputCache
+from gifclip_queue import JobQueue, run_journaled
+from gifclip_sched import ThreadBudget
+mark_startup("import gifclip engine/probe")
 
 TEXTS = {
     "en": {
@@ -143,6 +92,20 @@ TEXTS = {
         "action_afdian": "💜 Afdian",
         "lang_en": "English",
         "lang_kr": "Korean",
+        "parallel_jobs": "Parallel Jobs:",
+        "background_mode": "Background",
+        "background_mode_tip": "Converts at low CPU and disk priority and slows down while you use the app,\nso the desktop and the preview stay smooth.",
+        "probing": "(probing...)",
+        "target_size": "Target Size (MB):",
+        "target_off": "Off",
+        "instant_estimate": "Size (approx.):",
+        "gif_optimize": "Optimize GIF frames (screen recordings)",
+        "gif_optimize_tip": "Stores only the changed part of each frame and merges identical frames.\nSmaller GIFs for screen captures; takes a little longer.",
+        "dedup": "Drop Static Frames:",
+        "dedup_tip": "Frames that barely change are dropped and the previous frame is shown longer.\nHigher = more frames dropped (12 is a good start for screencasts/slideshows).",
+        "resume_title": "Resume Batch",
+        "resume_question": "The last batch did not finish ({} of {} files left).\nResume it now?",
+        "auto": "Auto",
     },
     "kr": {
         "title": "움짤 메이커",
@@ -200,6 +163,20 @@ TEXTS = {
         "action_afdian": "💜 Afdian",
         "lang_en": "English",
         "lang_kr": "한국어",
+        "parallel_jobs": "동시 작업 수:",
+        "background_mode": "백그라운드",
+        "background_mode_tip": "낮은 CPU/디스크 우선순위로 변환하고 앱을 조작하는 동안 잠시 속도를 줄여\n바탕 화면과 미리보기가 끊기지 않게 합니다.",
+        "probing": "(분석 중...)",
+        "target_size": "목표 용량 (MB):",
+        "target_off": "사용 안 함",
+        "instant_estimate": "예상 용량 (대략):",
+        "gif_optimize": "GIF 프레임 최적화 (화면 녹화)",
+        "gif_optimize_tip": "프레임마다 바뀐 부분만 저장하고 같은 프레임은 합칩니다.\n화면 녹화 GIF가 작아지며, 조금 더 오래 걸립니다.",
+        "dedup": "정지 프레임 제거:",
+        "dedup_tip": "거의 변하지 않는 프레임을 버리고 이전 프레임을 더 오래 보여줍니다.\n값이 클수록 더 많이 제거합니다 (화면 녹화/슬라이드는 12부터 권장).",
+        "resume_title": "일괄 작업 재개",
+        "resume_question": "지난 일괄 작업이 끝나지 않았습니다 ({}/{}개 남음).\n지금 이어서 변환할까요?",
+        "auto": "자동",
     }
 }
 
@@ -311,6 +288,20 @@ QStatusBar::item {
 }
 """
 
+class InteractionWatcher(QObject):
+    # Application-wide event filter: calls callback() on user input (clicks, drags, wheel, keys)
+    INPUT_EVENTS = (QEvent.Type.MouseButtonPress, QEvent.Type.Wheel, QEvent.Type.KeyPress)
+
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def eventFilter(self, source, event):
+        t = event.type()
+        if t in self.INPUT_EVENTS or (t == QEvent.Type.MouseMove and event.buttons() != Qt.MouseButton.NoButton):
+            self.callback()
+        return False
+
 class RangeSlider(QSlider):
     def __init__(self, orientation=Qt.Orientation.Horizontal, parent=None):
         super().__init__(orientation, parent)
@@ -728,564 +719,108 @@ class CropOverlay(QWidget):
         self.selection_rect = r
 
 class ConversionThread(QThread):
-    progress_signal = pyqtSignal(int, int, str) # current, total, status_message
+    progress_signal = pyqtSignal(int, int, str, dict) # completed, total, status_message, task_stats ({} = batch-level)
+    task_progress_signal = pyqtSignal(int, str, str) # task_index, state (running/done/failed/cancelled), message
     finished_signal = pyqtSignal(int, int) # success_count, fail_count
     error_signal = pyqtSignal(str)
 
-    def __init__(self, tasks, ffmpeg_path, gifski_path):
+    # job_queue/job_ids: journal every task state to the persistent queue (resumable batch)
+    # priority: "normal" / "background" (see ConversionEngine)
+    def __init__(self, tasks, ffmpeg_path, gifski_path, max_workers=None, job_queue=None, job_ids=None,
+                 priority="normal"):
         super().__init__()
         self.tasks = tasks
-        self.ffmpeg = ffmpeg_path
-        self.gifski = gifski_path
-        self.is_running = True
-        self.processes = []
-
-    def run(self):
-        success = 0
-        fail = 0
-        total = len(self.tasks)
-        
-        for idx, task in enumerate(self.tasks):
-            if not self.is_running: break
-            
-            try:
-                self.progress_signal.emit(idx, total, f"Converting {idx+1}/{total}: {os.path.basename(task['path'])}")
-                self.process_video(task, idx, total)
-                success += 1
-            except Exception as e:
-                print(f"Error converting {task['path']}: {e}")
-                fail += 1
-        
-        self.finished_signal.emit(success, fail)
-
-    def stop(self):
-        self.is_running = False
-        # Terminate any running subprocesses
-        for p in self.processes:
-            try:
-                p.terminate()
-                p.kill() # Ensure kill
-            except Exception as e:
-                print(f"Error killing process: {e}")
-        self.processes.clear()
-
-    def process_video(self, task, idx, total):
-        # 1. Prepare Paths
-        src = task['path']
-        folder = os.path.dirname(src)
-        name = os.path.splitext(os.path.basename(src))[0]
-        ext = "gif" if task['format'] == "GIF" else "webp"
-        
-        # Ensure unique output name
-        counter = 1
-        out = os.path.join(folder, f"{name}.{ext}")
-        while os.path.exists(out):
-            out = os.path.join(folder, f"{name}_{counter}.{ext}")
-            counter += 1
-            
-        settings = task['settings']
-        
-        # Crop Logic
-        crop_filter = None
-        if settings.get('crop_enabled', False):
-            # Coordinates are normalized 0.0-1.0
-            cx = settings.get('crop_x', 0)
-            cy = settings.get('crop_y', 0)
-            cw = settings.get('crop_w', 1.0)
-            ch = settings.get('crop_h', 1.0)
-            
-            orig_w = settings['orig_width']
-            orig_h = settings['orig_height']
-            
-            # Helper to make even coords
-            final_x = int(cx * orig_w)
-            final_y = int(cy * orig_h)
-            final_w = int(cw * orig_w)
-            final_h = int(ch * orig_h)
-            
-            # FFmpeg crop filter syntax: crop=w:h:x:y
-            crop_filter = f"crop={final_w}:{final_h}:{final_x}:{final_y}"
-            
-            # Update 'effective' original size for scaling logic
-            eff_orig_w = final_w
-            eff_orig_h = final_h
-        else:
-            eff_orig_w = settings['orig_width']
-            eff_orig_h = settings['orig_height']
-        
-        # 2. Compute Resolution (Based on cropped size if active)
-        w, h = compute_output_resolution(
-            eff_orig_w, eff_orig_h,
-            settings['resize_mode'], settings['width'], settings['height'],
-            settings['scale']
+        self.max_workers = max_workers # 0 / None = Auto (based on core count)
+        self.job_queue = job_queue
+        self.job_ids = job_ids
+        # Pipeline lives in the Qt-free engine (shared with the gifclip CLI)
+        self.engine = ConversionEngine(
+            ffmpeg_path, gifski_path,
+            progress_callback=self.progress_signal.emit,
+            task_callback=self.task_progress_signal.emit,
+            size_model=SizeModel.default(), # Finished outputs calibrate the instant estimate
+            output_cache=OutputCache.default(), # Same source + settings again: link the stored output
+            retries=1, # One more try (with backoff) for transient failures, e.g. network shares
+            priority=priority
         )
-        print(f"Resolving '{settings['resize_mode']}': {eff_orig_w}x{eff_orig_h} -> {w}x{h}")
-        
-        # 3. Trim Filters
-        ss = settings['start_time'] / 1000.0 if settings['start_time'] >= 0 else 0
-        to = settings['end_time'] / 1000.0 if settings['end_time'] >= 0 else 0
-        
-        bn = os.path.basename(task['path'])
-        self.progress_signal.emit(idx, total, f"Converting {bn} ({w}x{h})...")
-        
-        # 4. Execute
-        if task['format'] == "GIF":
-            self.convert_to_gif(src, out, w, h, ss, to, settings['fps'], settings['quality'], crop_filter)
-        else:
-            self.convert_to_webp(src, out, w, h, ss, to, settings['fps'], settings['quality'], crop_filter)
-
-    def convert_to_gif(self, src, out, w, h, ss, to, fps, quality, crop_filter=None):
-        # 1. Try Gifski if available (Legacy/High Quality)
-        if self.gifski and os.path.exists(self.gifski):
-            # FFmpeg: Trim -> Crop -> FPS -> Scale -> Pipe
-            filters = []
-            if crop_filter: filters.append(crop_filter)
-            filters.append(f"fps={fps}")
-            filters.append(f"scale={w}:{h}:flags=lanczos")
-            vf = ",".join(filters)
-            
-            time_args = []
-            if ss > 0: time_args.extend(["-ss", str(ss)])
-            if to > 0: time_args.extend(["-to", str(to)])
-            
-            # Ensure yuv420p for compatibility
-            ff_cmd = [self.ffmpeg, "-y"] + time_args + ["-i", src, "-vf", vf, "-pix_fmt", "yuv420p", "-f", "yuv4mpegpipe", "-"]
-            
-            # Gifski: Read from - 
-            gif_cmd = [
-                self.gifski,
-                "--fps", str(fps),
-                "--quality", str(quality),
-                "--width", str(w),
-                "--height", str(h),
-                "-o", out,
-                "-"
-            ]
 
-            try:
-                # Pipe
-                # Deadlock Fix: Use DEVNULL for ffmpeg stderr to prevent buffer block if we don't read it immediately.
-                ff_proc = subprocess.Popen(
-                    ff_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, startupinfo=self.get_startup_info()
-                )
-                self.processes.append(ff_proc)
-                
-                gif_proc = subprocess.Popen(
-                    gif_cmd, stdin=ff_proc.stdout, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, startupinfo=self.get_startup_info()
-                )
-                self.processes.append(gif_proc)
-                
-                try:
-                    # Close ff_proc stdout in this process so pipe closes when ff finishes
-                    ff_proc.stdout.close()
-                    _, gif_err = gif_proc.communicate()
-                    ff_proc.wait() # Wait for FFmpeg to exit
-                    
-                    if gif_proc.returncode != 0:
-                        err_msg = gif_err.decode('utf-8', errors='ignore') or "Unknown Gifski error"
-                        # If stopped, returncode might be != 0 but is_running false.
-                        if self.is_running:
-                             raise RuntimeError(f"Gifski failed: {err_msg}")
-                        
-                    if ff_proc.returncode != 0 and ff_proc.returncode != 255:
-                         # Since we ignored stderr, we can't report exact ffmpeg error, but usually Gifski error covers it (broken pipe)
-                         # or we just fail silently for ffmpeg part if gifski succeeded? 
-                         # If gifski succeeded (code 0), then ffmpeg must have fed data.
-                         pass
-                finally:
-                    if ff_proc in self.processes: self.processes.remove(ff_proc)
-                    if gif_proc in self.processes: self.processes.remove(gif_proc)
-                         
-            except Exception as e:
-                # If Gifski fails, we should probably output the error rather than silently fallback?
-                # The user specifically complained about palette.png, so fallback is unwanted.
-                print(f"Gifski execution failed: {e}")
-                raise e # Propagate error
-                
-            return
+    @property
+    def processes(self):
+        return self.engine.processes
 
-        # 2. Fallback to FFmpeg palettegen/paletteuse ONLY if Gifski missing
-        # ... logic ...
-        # Palette Gen
-        palette_path = os.path.join(os.path.dirname(out), "palette.png")
-        
-        filters = []
-        if crop_filter: filters.append(crop_filter)
-        filters.append(f"fps={fps}")
-        filters.append(f"scale={w}:{h}:flags=lanczos")
-        vf = ",".join(filters)
-        
-        time_args = []
-        if ss > 0: time_args.extend(["-ss", str(ss)])
-        if to > 0: time_args.extend(["-to", str(to)])
-        
-        if to > 0: time_args.extend(["-to", str(to)])
-        
-        # 1. Generate Palette
-        cmd_pal = [self.ffmpeg, "-y"] + time_args + ["-i", src, "-vf", f"{vf},palettegen", palette_path]
-        try:
-            self.run_command_simple(cmd_pal, "Palette Gen")
-        except:
-             # Cleanup if failed
-             pass
+    @property
+    def is_running(self):
+        return self.engine.is_running
 
-        # 2. Convert
-        cmd_gif = [self.ffmpeg, "-y"] + time_args + ["-i", src, "-i", palette_path, 
-                   "-lavfi", f"{vf} [x]; [x][1:v] paletteuse", out]
-        try:
-            self.run_command_simple(cmd_gif, "GIF Convert")
-        except Exception as e:
-            raise e
-        finally:
-            if os.path.exists(palette_path):
-                os.remove(palette_path)
-
-    def convert_to_webp(self, src, out, w, h, ss, to, fps, quality, crop_filter=None):
-        # Optimized WebP Strategy v16 (Ezgif Style - Standard)
-        # User Reference: "Ezgif at 10s / 33fps is better quality and smaller."
-        # Analysis: Ezgif uses standard libwebp settings (No Denoise, Q75) at lower FPS.
-        #
-        # Strategy v16:
-        # 1. No Denoise: Preserves sharpness (Fixes "Bad Quality/Blur").
-        # 2. Quality: Q75 (Standard).
-        # 3. FPS: User Controlled. (User advised to use 33fps to match Ezgif size).
-        # Note: At 50/60fps, this WILL be large (Physics). User must lower FPS to reduce size.
-        
-        # Mapping: UI 100 -> WebP 75 (Standard)
-        webp_q = int(quality * 0.75)
-        if webp_q < 1: webp_q = 1
-        
-        try:
-            print(f"DEBUG: WebP v16 (Standard Q{webp_q} NoDenoise): {out}")
-            
-            # 1. Filters
-            filters = []
-            if crop_filter: filters.append(crop_filter)
-            filters.append(f"fps={fps}")
-            if w > 0 and h > 0:
-                filters.append(f"scale={w}:{h}:flags=lanczos")
-            
-            # Removed Denoise (hqdn3d) to match Ezgif's sharp look.
-            
-            vf = ",".join(filters)
-            
-            time_args = []
-            if ss > 0: time_args.extend(["-ss", str(ss)])
-            if to > 0: time_args.extend(["-to", str(to)])
-            
-            # 2. Command
-            cmd = [
-                self.ffmpeg, "-y",
-            ] + time_args + [
-                "-i", src,
-                "-vf", vf,
-                "-c:v", "libwebp",
-                "-lossless", "0",
-                "-compression_level", "4",
-                "-q:v", str(webp_q),
-                "-preset", "default",
-                "-loop", "0",
-                "-an", 
-                "-vsync", "0",
-                "-pix_fmt", "yuv420p",
-                out
-            ]
-            
-            self.run_command_simple(cmd, "Direct WebP v16")
-            
-        except Exception as e:
-            print(f"Error in WebP conversion: {e}")
-            raise e
+    def run(self):
+        if self.job_queue is not None:
+            results = run_journaled(self.engine, self.job_queue, list(zip(self.job_ids, self.tasks)), self.max_workers)
+        else:
+            results = self.engine.run_batch(self.tasks, self.max_workers)
+        success = sum(1 for r in results if r and r["status"] == "done")
+        fail = sum(1 for r in results if r and r["status"] == "failed")
+        self.finished_signal.emit(success, fail)
 
-    def run_command_simple(self, cmd, desc="Command"):
-        p = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=self.get_startup_info())
-        self.processes.append(p)
-        try:
-            p.wait()
-            if p.returncode != 0: raise RuntimeError(f"{desc} Failed")
-        finally:
-            if p in self.processes: self.processes.remove(p)
-
-    def get_startup_info(self):
-        if os.name == 'nt':
-            si = subprocess.STARTUPINFO()
-            si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            return si
-        return None
+    def stop(self):
+        self.engine.stop()
 
 class EstimateThread(QThread):
+    result_signal = pyqtSignal(int, dict) # task index, estimate result (as each file finishes)
     finished_signal = pyqtSignal(str) # Result message
     
     # Updated to support Batch Estimation (List of tasks)
-    def __init__(self, tasks, ffmpeg, gifski):
+    # Files are estimated in parallel (max_workers, 0/None = Auto); split_segments encodes the
+    # 3 samples of each file as separate pipelines at the same time.
+    def __init__(self, tasks, ffmpeg, gifski, max_workers=None, split_segments=False):
         super().__init__()
         self.tasks = tasks if isinstance(tasks, list) else [tasks]
-        self.ffmpeg = ffmpeg
-        self.gifski = gifski
-        self.processes = []
+        self.max_workers = max_workers
+        self.split_segments = split_segments
+        # Sample frames are cached across runs: a quality-only change just re-encodes them
+        self.estimator = SizeEstimator(ffmpeg, gifski, sample_cache=SampleCache.default())
+
+    @property
+    def processes(self):
+        return self.estimator.processes
         
     def stop(self):
         # Stop any running estimation
-        for p in self.processes:
-            try:
-                if p.poll() is None:
-                    p.terminate()
-                    p.kill()
-            except Exception as e:
-                print(f"Error killing estimate process: {e}")
-        self.processes.clear()
+        self.estimator.stop()
         
     def run(self):
-        results = []
+        results = self.estimator.estimate_batch(self.tasks, self.max_workers,
+                                                result_callback=self.result_signal.emit,
+                                                split_segments=self.split_segments)
         
-        for idx, task in enumerate(self.tasks):
-            if self.isInterruptionRequested(): break
-            
-            try:
-                path = task["path"]
-                s = task["settings"]
-                fmt = s["format"].lower() 
-                filename = os.path.basename(path)
-                
-                # Duration needed (This is the trimmed duration in seconds)
-                total_duration = s.get("duration", 0)
-                if total_duration <= 0:
-                    try:
-                        cap = cv2.VideoCapture(path)
-                        if cap.isOpened():
-                            fps = cap.get(cv2.CAP_PROP_FPS)
-                            frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-                            if fps > 0: total_duration = frames / fps
-                            cap.release()
-                    except: pass
-                
-                if total_duration <= 0:
-                    results.append(f"{filename}: Error (Unknown Duration)")
-                    continue
-
-                # --- Effective Duration (Trim Support) ---
-                start_ms = s.get('start_time', -1)
-                end_ms = s.get('end_time', -1)
-                
-                # Defaults
-                start_sec = 0.0
-                end_sec = total_duration
-                
-                if start_ms >= 0:
-                    start_sec = start_ms / 1000.0
-                
-                if end_ms > 0:
-                    # If end_time is valid and less than total, use it
-                    # (Also guard against end < start)
-                    e_sec = end_ms / 1000.0
-                    if e_sec > start_sec:
-                        end_sec = min(total_duration, e_sec)
-                
-                effective_duration = max(0, end_sec - start_sec)
-                
-                if effective_duration <= 0:
-                    # Fallback just in case
-                    effective_duration = total_duration
-                    start_sec = 0
-                
-                # --- 3-Point Distributed Sampling Strategy (User Request) ---
-                # Sample 11% from Start, Middle, and End (Total 33%)
-                # This provides a statistically superior VBR estimate compared to a single chunk.
-                
-                seg_ratio = 0.11
-                seg_dur = effective_duration * seg_ratio
-                
-                # Safety for very short clips
-                if seg_dur < 0.5: seg_dur = 0.5 # Minimum 0.5s per chunk
-                if seg_dur * 3 > effective_duration:
-                    # If total samples exceed duration (very short video), fall back to Single Full Chunk
-                    seg_dur = effective_duration
-                    t1, t2, t3 = start_sec, -1, -1
-                    actual_sample_total = effective_duration
-                else:
-                    t1 = start_sec
-                    t2 = start_sec + (effective_duration * 0.445) # Center-ish
-                    t3 = start_sec + (effective_duration - seg_dur) # End
-                    # Clamp t3
-                    if t3 < t1: t3 = t1
-                    actual_sample_total = seg_dur * 3
-
-                # Prepare Crop Logic ONCE
-                crop_filter_str = ""
-                eff_orig_w = s['orig_width']
-                eff_orig_h = s['orig_height']
-                
-                if s.get('crop_enabled', False):
-                    cx = s.get('crop_x', 0)
-                    cy = s.get('crop_y', 0)
-                    cw = s.get('crop_w', 1.0)
-                    ch = s.get('crop_h', 1.0)
-                    
-                    final_x = int(cx * s['orig_width'])
-                    final_y = int(cy * s['orig_height'])
-                    final_w = int(cw * s['orig_width'])
-                    final_h = int(ch * s['orig_height'])
-                    
-                    crop_filter_str = f"crop={final_w}:{final_h}:{final_x}:{final_y}"
-                    eff_orig_w = final_w
-                    eff_orig_h = final_h
-                
-                w, h = compute_output_resolution(eff_orig_w, eff_orig_h, s['resize_mode'], 
-                                               s['width'], s['height'], s['scale'])
-                
-                ext = "gif" if "gif" in fmt else "webp"
-                self.temp_file = f"temp_estimate_{idx}.{ext}"
-                
-                startup_info = None
-                if os.name == 'nt':
-                    startup_info = subprocess.STARTUPINFO()
-                    startup_info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                
-                # Cleanup previous if exists
-                if os.path.exists(self.temp_file):
-                    try: os.remove(self.temp_file)
-                    except: pass
-                    
-                # Build Common Filters (Crop -> Scale -> FPS)
-                filters = []
-                if crop_filter_str: filters.append(crop_filter_str)
-                if w > 0 and h > 0:
-                    filters.append(f"scale={w}:{h}:flags=lanczos")
-                # FPS is usually handled by -r or filter. Let's use filter for complex chain safety.
-                filters.append(f"fps={s['fps']}")
-                
-                post_process_filter = ",".join(filters)
-
-                if "gif" in fmt:
-                     # GIFSKI Pipeline
-                     cmd_gifski = [self.gifski, "-o", self.temp_file]
-                     cmd_gifski.extend(["--fps", str(s['fps']), "--quality", str(s['quality'])])
-                     if w > 0 and h > 0:
-                         cmd_gifski.extend(["--width", str(w), "--height", str(h)])
-                     cmd_gifski.append("-")
-                     
-                     gif_proc = subprocess.Popen(cmd_gifski, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=startup_info)
-                     self.processes.append(gif_proc)
-                     
-                     # FFmpeg Command
-                     cmd_ffmpeg = [self.ffmpeg, "-y"]
-                     
-                     # Inputs
-                     cmd_ffmpeg.extend(["-ss", str(t1), "-t", str(seg_dur), "-i", path])
-                     if t2 != -1: # Multi-chunk
-                         cmd_ffmpeg.extend(["-ss", str(t2), "-t", str(seg_dur), "-i", path])
-                         cmd_ffmpeg.extend(["-ss", str(t3), "-t", str(seg_dur), "-i", path])
-                         
-                         # Complex Filter: Concat -> PostProcess
-                         # [0:v][1:v][2:v]concat=n=3:v=1:a=0[vcat];[vcat]filters...[out]
-                         fc = f"[0:v][1:v][2:v]concat=n=3:v=1:a=0[vcat];[vcat]{post_process_filter}[out]"
-                         cmd_ffmpeg.extend(["-filter_complex", fc, "-map", "[out]"])
-                     else:
-                         # Single chunk fallback
-                         if post_process_filter:
-                            cmd_ffmpeg.extend(["-vf", post_process_filter])
-                     
-                     cmd_ffmpeg.extend(["-pix_fmt", "yuv420p", "-f", "yuv4mpegpipe", "-"])
-                     
-                     ff_proc = subprocess.Popen(cmd_ffmpeg, stdout=gif_proc.stdin, stderr=subprocess.DEVNULL, startupinfo=startup_info)
-                     self.processes.append(ff_proc)
-                     
-                     try:
-                        ff_proc.wait()
-                        gif_proc.communicate()
-                     finally:
-                        if ff_proc in self.processes: self.processes.remove(ff_proc)
-                        if gif_proc in self.processes: self.processes.remove(gif_proc)
-                     
-                else:
-                    # WebP Pipeline Match (Strategy v16: Standard Q75 + NoDenoise)
-                    # "Ezgif Style" -> Sharp, Higher Rate, User Control FPS.
-                    
-                    webp_q = int(s['quality'] * 0.75)
-                    if webp_q < 1: webp_q = 1
-                    
-                    # 1. Base Filter (Standard)
-                    webp_vf = post_process_filter
-                    # No added Denoise
-                    
-                    # 2. Add FPS explicit if needed, though usually in post_process_filter if scale logic is consistent,
-                    # but Strategy v16 relies on user input for fps.
-                    # We just ensure we convert at s['fps']
-                    # Check if filters already exist
-                    if webp_vf: webp_vf += ","
-                    else: webp_vf = ""
-                    
-                    webp_vf += f"fps={s['fps']}"
-                    
-                    cmd_ffmpeg = [self.ffmpeg, "-y"]
-                    
-                    # 3-chunk logic (Standard Concat)
-                    cmd_ffmpeg.extend(["-ss", str(t1), "-t", str(seg_dur), "-i", path])
-                    if t2 != -1:
-                        cmd_ffmpeg.extend(["-ss", str(t2), "-t", str(seg_dur), "-i", path])
-                        cmd_ffmpeg.extend(["-ss", str(t3), "-t", str(seg_dur), "-i", path])
-                        
-                        fc = f"[0:v][1:v][2:v]concat=n=3:v=1:a=0[vcat];[vcat]{webp_vf}[out]"
-                        cmd_ffmpeg.extend(["-filter_complex", fc, "-map", "[out]"])
-                    else:
-                        if webp_vf: cmd_ffmpeg.extend(["-vf", webp_vf])
-                    
-                    cmd_ffmpeg.extend([
-                        "-c:v", "libwebp",
-                        "-lossless", "0",
-                        "-compression_level", "4",
-                        "-q:v", str(webp_q),
-                        "-preset", "default",
-                        "-loop", "0", "-an", "-vsync", "0",
-                        "-pix_fmt", "yuv420p",
-                        self.temp_file
-                    ])
-                    
-                    p = subprocess.Popen(cmd_ffmpeg, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=startup_info)
-                    self.processes.append(p)
-                    
-                    try:
-                        p.wait()
-                    finally:
-                        if p in self.processes: self.processes.remove(p)
-                # Check size
-                if os.path.exists(self.temp_file):
-                    size_bytes = os.path.getsize(self.temp_file)
-                    if size_bytes > 0:
-                        ratio = effective_duration / actual_sample_total
-                        # Removed Safety Factor (1.0x) as 3-point sampling is statistically representative
-                        est_total = size_bytes * ratio
-                        mb = est_total / (1024 * 1024)
-                        results.append(f"{filename}: ~{mb:.1f} MB (Expected)")
-                    else:
-                        results.append(f"{filename}: Error (0 bytes)")
-                    
-                    # Cleanup temp immediate
-                    try: os.remove(self.temp_file)
-                    except: pass
-                else:
-                    results.append(f"{filename}: Error (File not created)")
-            
-            except Exception as e:
-                results.append(f"{task.get('path','Unknown')}: Error ({str(e)})")
-            finally:
-                # Cleanup processes just in case
-                for p in self.processes:
-                    if p.poll() is None:
-                        p.terminate()
-                        p.wait(timeout=0.5)
-                self.processes.clear()
-        
-        # Emit all results joined
-        report = "\n".join(results)
+        # Emit all results joined (task order)
+        report = "\n".join(format_estimate(r) for r in results if r)
         self.finished_signal.emit(report)
 
 class MainWindow(QMainWindow):
+    probe_finished_signal = pyqtSignal(str, dict) # path, probe info (from ProbePool threads)
+    packets_finished_signal = pyqtSignal(str, object) # path, packet index or None (from ProbePool threads)
+
     def __init__(self):
         super().__init__()
         
         # Persistence
         self.settings = QSettings("VideoToGifTool", "Settings")
+        
+        # Background media probing with persistent (path, size, mtime) cache; packet indexes are
+        # built after it (one file at a time) for estimate sample placement and keyframe trims
+        self.probe_pool = ProbePool(ProbeCache.default(), prober=self.settings.value("prober", "auto"), packets=True)
+        self.probe_finished_signal.connect(self.on_probe_finished)
+        # Persistent job queue (SQLite journal of every conversion batch)
+        self.job_queue = JobQueue.default()
+        # Conversions and estimates split one thread budget; one core stays free for the UI and the preview player
+        ThreadBudget.default().set_total(max(1, (os.cpu_count() or 2) - 1))
+        # User input anywhere in the app throttles background conversions for a moment
+        self.interaction_watcher = InteractionWatcher(self.on_user_interaction)
+        QApplication.instance().installEventFilter(self.interaction_watcher)
+        # Packet-size indexes for the instant size estimate (None = not available)
+        self.packet_indexes = {}
+        self.packets_finished_signal.connect(self.on_packets_finished)
+        mark_startup("MainWindow: settings + probe pool")
 
         # Load Language (Default: English)
         self.lang = self.settings.value("language", "en") 
@@ -1295,9 +830,11 @@ class MainWindow(QMainWindow):
         self.resize(1160, 750) # Increase total width slightly
         self.setAcceptDrops(True)
 
-        self.media_player = QMediaPlayer()
-        self.video_widget = QVideoWidget()
-        self.media_player.setVideoOutput(self.video_widget)
+        # Player is created lazily at first preview (ensure_media_player); until then
+        # video_widget is a plain placeholder with the same geometry/drop behavior.
+        self.media_player = None
+        self.video_widget = QWidget()
+        self.video_widget.setStyleSheet("background-color: #000;")
         # Install event filter
         self.installEventFilter(self)
         
@@ -1314,16 +851,49 @@ class MainWindow(QMainWindow):
         self.was_playing_before_drag = False
         
         self.converter_thread = None
+        self.conversion_items = []
+        self.conversion_states = {}
+        self.conversion_stats = {}
         self.estimate_thread = None # Added for estimate feature
 
         self._init_ui()
+        mark_startup("MainWindow: _init_ui (total)")
         self.setStyleSheet(DARK_STYLESHEET)
+        mark_startup("MainWindow: stylesheet")
+        
+        self.update_texts()
+        mark_startup("MainWindow: update_texts")
+
+    def ensure_media_player(self):
+        # First preview: import QtMultimedia, swap the real QVideoWidget into the container
+        if self.media_player is not None:
+            return self.media_player
+        
+        from PyQt6.QtMultimedia import QMediaPlayer
+        from PyQt6.QtMultimediaWidgets import QVideoWidget
+        
+        video_widget = QVideoWidget()
+        video_widget.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        placeholder = self.video_widget
+        self.video_container.layout().replaceWidget(placeholder, video_widget)
+        placeholder.removeEventFilter(self)
+        placeholder.deleteLater()
+        self.video_widget = video_widget
+        self.video_widget.installEventFilter(self)
         
+        self.media_player = QMediaPlayer()
+        self.media_player.setVideoOutput(self.video_widget)
         self.media_player.positionChanged.connect(self.on_position_changed)
         self.media_player.durationChanged.connect(self.on_duration_changed)
         self.media_player.errorOccurred.connect(self.handle_media_error)
         self.media_player.playbackStateChanged.connect(self.update_play_button_text)
-        self.update_texts()
+        return self.media_player
+
+    def is_playing(self):
+        if self.media_player is None:
+            return False
+        from PyQt6.QtMultimedia import QMediaPlayer
+        return self.media_player.playbackState() == QMediaPlayer.PlaybackState.PlayingState
 
     def tr(self, key):
         return TEXTS.get(self.lang, TEXTS["en"]).get(key, key)
@@ -1409,6 +979,7 @@ class MainWindow(QMainWindow):
 
     def _init_ui(self):
         self.create_menu_bar()
+        mark_startup("_init_ui: menu bar")
 
         # Custom Style for QMenu to balance margins
         self.setStyleSheet("""
@@ -1520,6 +1091,7 @@ class MainWindow(QMainWindow):
         range_layout.addStretch() # Push everything left
 
         left_layout.addWidget(range_panel)
+        mark_startup("_init_ui: video area + timeline")
         
         # --- Right Area: Sidebar ---
         sidebar = QWidget()
@@ -1610,6 +1182,46 @@ class MainWindow(QMainWindow):
         
         lay_quality.addWidget(self.lbl_quality_title, 1, 0)
         lay_quality.addWidget(container_q, 1, 1)
+
+        # Row 2: Target Size (0 = Off). Quality/FPS/Scale above become upper limits.
+        self.lbl_target_size = QLabel(self.tr("target_size"))
+        self.lbl_target_size.setMinimumWidth(110)
+        self.lbl_target_size.setIndent(5)
+        self.spin_target_size = QDoubleSpinBox()
+        self.spin_target_size.setRange(0, 1000)
+        self.spin_target_size.setDecimals(1)
+        self.spin_target_size.setSingleStep(0.5)
+        self.spin_target_size.setSpecialValueText(self.tr("target_off"))
+
+        lay_quality.addWidget(self.lbl_target_size, 2, 0)
+        lay_quality.addWidget(self.spin_target_size, 2, 1)
+
+        # Row 3: Instant estimate (packet index + calibrated model, no encoding)
+        self.lbl_instant_title = QLabel(self.tr("instant_estimate"))
+        self.lbl_instant_title.setMinimumWidth(110)
+        self.lbl_instant_title.setIndent(5)
+        self.lbl_instant_estimate = QLabel("-")
+
+        lay_quality.addWidget(self.lbl_instant_title, 3, 0)
+        lay_quality.addWidget(self.lbl_instant_estimate, 3, 1)
+
+        # Row 4: GIF frame optimizer (changed rectangles only, identical frames merged)
+        self.chk_gif_optimize = QCheckBox(self.tr("gif_optimize"))
+        self.chk_gif_optimize.setToolTip(self.tr("gif_optimize_tip"))
+        lay_quality.addWidget(self.chk_gif_optimize, 4, 0, 1, 2)
+
+        # Row 5: Drop near-static frames (0 = Off); the previous frame is shown longer instead
+        self.lbl_dedup = QLabel(self.tr("dedup"))
+        self.lbl_dedup.setMinimumWidth(110)
+        self.lbl_dedup.setIndent(5)
+        self.lbl_dedup.setToolTip(self.tr("dedup_tip"))
+        self.spin_dedup = QSpinBox()
+        self.spin_dedup.setRange(0, 64)
+        self.spin_dedup.setSpecialValueText(self.tr("target_off"))
+        self.spin_dedup.setToolTip(self.tr("dedup_tip"))
+
+        lay_quality.addWidget(self.lbl_dedup, 5, 0)
+        lay_quality.addWidget(self.spin_dedup, 5, 1)
         
         right_layout.addWidget(self.grp_quality)
         
@@ -1667,6 +1279,7 @@ class MainWindow(QMainWindow):
         
         right_layout.addWidget(self.grp_resize)
         side_layout.addWidget(right_widget)
+        mark_startup("_init_ui: settings panel")
         
         # Batch List
         self.grp_batch = QGroupBox("Batch List")
@@ -1681,10 +1294,27 @@ class MainWindow(QMainWindow):
         self.btn_clear_batch = QPushButton("Clear")
         self.btn_clear_batch.clicked.connect(self.clear_batch)
         
+        # Parallel Jobs (0 = Auto, based on core count)
+        jobs_layout = QHBoxLayout()
+        self.lbl_jobs = QLabel("Parallel Jobs:")
+        self.spin_jobs = QSpinBox()
+        self.spin_jobs.setRange(0, max(1, os.cpu_count() or 1))
+        self.spin_jobs.setSpecialValueText("Auto")
+        self.spin_jobs.setValue(self.settings.value("max_workers", 0, type=int))
+        self.spin_jobs.valueChanged.connect(lambda v: self.settings.setValue("max_workers", v))
+        jobs_layout.addWidget(self.lbl_jobs)
+        jobs_layout.addWidget(self.spin_jobs)
+        # Background mode: low priority children, throttled while the app is being used
+        self.chk_background = QCheckBox("Background")
+        self.chk_background.setChecked(self.settings.value("background_mode", False, type=bool))
+        self.chk_background.toggled.connect(lambda v: self.settings.setValue("background_mode", v))
+        jobs_layout.addWidget(self.chk_background)
+        
         batch_layout.addWidget(self.list_batch)
         batch_btn_layout.addWidget(self.btn_remove_sel)
         batch_btn_layout.addWidget(self.btn_clear_batch)
         batch_layout.addLayout(batch_btn_layout)
+        batch_layout.addLayout(jobs_layout)
         
         side_layout.addWidget(self.grp_batch)
         
@@ -1729,6 +1359,7 @@ class MainWindow(QMainWindow):
         self.lbl_status.setObjectName("lbl_status")
         self.status_bar.addWidget(self.lbl_status, 1)
         # self.status_bar.showMessage("Ready")
+        mark_startup("_init_ui: batch list + actions")
         
         # Assemble
         main_layout.addWidget(left_widget, stretch=3)
@@ -1745,6 +1376,9 @@ class MainWindow(QMainWindow):
         self.combo_format.currentIndexChanged.connect(self.save_settings_from_ui)
         self.spin_fps.valueChanged.connect(self.save_settings_from_ui)
         self.slider_quality.valueChanged.connect(self.save_settings_from_ui)
+        self.spin_target_size.valueChanged.connect(self.save_settings_from_ui)
+        self.chk_gif_optimize.toggled.connect(self.save_settings_from_ui)
+        self.spin_dedup.valueChanged.connect(self.save_settings_from_ui)
         self.combo_resize_mode.currentIndexChanged.connect(self.save_settings_from_ui)
         self.spin_width.valueChanged.connect(self.save_settings_from_ui)
         self.spin_height.valueChanged.connect(self.save_settings_from_ui)
@@ -1752,6 +1386,7 @@ class MainWindow(QMainWindow):
         
         # Globally install event filter for Drag & Drop support on all widgets
         self._install_event_filter_recursive(central_widget)
+        mark_startup("_init_ui: signals + event filters")
 
     # --- Logic ---
 
@@ -1931,6 +1566,15 @@ class MainWindow(QMainWindow):
         
         self.lbl_fps.setText(self.tr("fps"))
         self.lbl_quality_title.setText(self.tr("quality"))
+        self.lbl_target_size.setText(self.tr("target_size"))
+        self.lbl_instant_title.setText(self.tr("instant_estimate"))
+        self.spin_target_size.setSpecialValueText(self.tr("target_off"))
+        self.chk_gif_optimize.setText(self.tr("gif_optimize"))
+        self.chk_gif_optimize.setToolTip(self.tr("gif_optimize_tip"))
+        self.lbl_dedup.setText(self.tr("dedup"))
+        self.lbl_dedup.setToolTip(self.tr("dedup_tip"))
+        self.spin_dedup.setSpecialValueText(self.tr("target_off"))
+        self.spin_dedup.setToolTip(self.tr("dedup_tip"))
         
         self.lbl_width.setText(self.tr("width"))
         self.lbl_height.setText(self.tr("height"))
@@ -1941,6 +1585,10 @@ class MainWindow(QMainWindow):
         self.on_selection_changed() 
         self.grp_batch.setTitle(self.tr("batch_list"))
         self.btn_clear_batch.setText(self.tr("clear_batch"))
+        self.lbl_jobs.setText(self.tr("parallel_jobs"))
+        self.spin_jobs.setSpecialValueText(self.tr("auto"))
+        self.chk_background.setText(self.tr("background_mode"))
+        self.chk_background.setToolTip(self.tr("background_mode_tip"))
         self.btn_convert.setText(self.tr("convert"))
         self.btn_set_start.setText(self.tr("set_start"))
         self.btn_set_end.setText(self.tr("set_end"))
@@ -2110,50 +1758,13 @@ class MainWindow(QMainWindow):
             
         # Add to list widget & Init settings
         for p in new_files:
-            self.list_batch.addItem(os.path.basename(p))
-            
-            # Probe FPS and Init Settings
-            fps = 0 # Default to 0, will be handled by fallback
-            w, h = 0, 0
-            try:
-                cap = cv2.VideoCapture(p)
-                if cap.isOpened():
-                    fps = cap.get(cv2.CAP_PROP_FPS)
-                    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-                    duration = frames / fps if fps > 0 else 0
-                    cap.release()
-            except Exception as e:
-                print(f"Error probing video {p}: {e}")
-                pass
-            
-            print(f"Loaded {p}: {w}x{h} ({fps} fps)")
-            
-            # Fallback if probe failed or values are invalid
-            orig_w = w if w > 0 else 800
-            orig_h = h if h > 0 else 600
-            
-            self.video_settings[p] = {
-                "format": "GIF",
-                "fps": min(50, int(fps)) if fps > 0 else 20, # Default 20, Max 50 per GIF limit
-                "quality": 80,
-                "resize_mode": "original", # Default key
-                "width": orig_w, # Default to original width
-                "height": orig_h, # Default to original height
-                "scale": 100, # Default to 100% scale
-                "start_time": -1,
-                "end_time": -1,
-                "orig_width": orig_w,
-                "orig_height": orig_h,
-                "duration": duration if 'duration' in locals() else 0,
-                # Crop Settings
-                "crop_enabled": False,
-                "crop_x": 0.0,
-                "crop_y": 0.0,
-                "crop_w": 1.0,
-                "crop_h": 1.0
-            }
+            # Placeholder until the background probe reports back (never block the GUI on slow/network files)
+            self.list_batch.addItem(f"{os.path.basename(p)} {self.tr('probing')}")
+            s = default_settings()
+            s["probe_pending"] = True
+            self.video_settings[p] = s
+            # Cache hits call back immediately; misses run on the probe pool
+            self.probe_pool.submit(p, self.probe_finished_signal.emit)
             
         # If this was the first file, load it
         if len(self.video_files) == len(new_files): # Was empty
@@ -2163,11 +1774,72 @@ class MainWindow(QMainWindow):
         elif len(self.video_files) > 1:
              pass
 
+    def on_probe_finished(self, path, info):
+        # Runs on the GUI thread (queued from the probe pool)
+        s = self.video_settings.get(path)
+        if s is None or not s.pop("probe_pending", False) or path not in self.video_files:
+            return # Removed meanwhile, or already applied
+        
+        placeholder = default_settings()
+        probed = default_settings(info["width"], info["height"], info["fps"], info["duration"])
+        # Source metadata always; user-facing values only if still untouched
+        for key in ("orig_width", "orig_height", "duration"):
+            s[key] = probed[key]
+        for key in ("fps", "width", "height"):
+            if s[key] == placeholder[key]:
+                s[key] = probed[key]
+        print(f"Loaded {path}: {info['width']}x{info['height']} ({info['fps']} fps)")
+        
+        row = self.video_files.index(path)
+        item = self.list_batch.item(row)
+        if item: item.setText(os.path.basename(path))
+        
+        # Refresh the panel if this file is the one being edited
+        items = self.list_batch.selectedItems()
+        if items and self.list_batch.row(items[0]) == row:
+            self.load_settings_to_ui(path)
+        
+    def update_instant_estimate(self):
+        # Live size figure for the file being edited: model on the packet index, no encoding
+        items = self.list_batch.selectedItems()
+        row = self.list_batch.row(items[0]) if items else -1
+        if not (0 <= row < len(self.video_files)):
+            self.lbl_instant_estimate.setText("-")
+            return
+        path = self.video_files[row]
+        s = self.video_settings[path]
+        if path not in self.packet_indexes:
+            # Build (or load) the index in the background, see on_packets_finished
+            self.packet_indexes[path] = None
+            self.lbl_instant_estimate.setText("...")
+            self.probe_pool.submit_packets(path, self.packets_finished_signal.emit)
+            return
+        est = SizeModel.default().predict(s, self.packet_indexes[path])
+        if est is None:
+            self.lbl_instant_estimate.setText("-")
+            return
+        mb = est["bytes"] / (1024 * 1024)
+        lo, hi = est["bytes_low"] / (1024 * 1024), est["bytes_high"] / (1024 * 1024)
+        self.lbl_instant_estimate.setText(f"~{mb:.1f} MB ({lo:.1f}-{hi:.1f})")
+
+    def on_packets_finished(self, path, index):
+        if path not in self.video_files: return
+        self.packet_indexes[path] = index
+        self.update_instant_estimate()
+
+    def ensure_probed(self, paths):
+        # Convert/Estimate need real metadata: finish pending probes synchronously (usually a cache hit)
+        for path in paths:
+            s = self.video_settings.get(path)
+            if s and s.get("probe_pending"):
+                self.on_probe_finished(path, self.probe_pool.probe(path))
+
     def clear_batch(self):
         self.video_files.clear()
         self.list_batch.clear()
-        self.media_player.stop()
-        self.media_player.setSource(QUrl())
+        if self.media_player is not None:
+            self.media_player.stop()
+            self.media_player.setSource(QUrl())
         self.slider.setRange(0, 0)
         self.lbl_current.setText("00:00")
         self.lbl_total.setText("00:00")
@@ -2176,6 +1848,7 @@ class MainWindow(QMainWindow):
         self.slider.set_range_visual(-1, -1, 0)
 
     def load_video(self, path):
+        self.ensure_media_player()
         self.media_player.setSource(QUrl.fromLocalFile(path))
         self.btn_play.setText(self.tr("play"))
         self.status_bar.showMessage(self.tr("msg_loaded").format(os.path.basename(path)))
@@ -2190,13 +1863,14 @@ class MainWindow(QMainWindow):
         # or clear_batch. load_video just handles the player.
 
     def toggle_play(self):
-        if self.media_player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
+        if self.media_player is None: return
+        if self.is_playing():
             self.media_player.pause()
         else:
             self.media_player.play()
 
     def update_play_button_text(self):
-        if self.media_player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
+        if self.is_playing():
             self.btn_play.setText(self.tr("pause"))
         else:
             self.btn_play.setText(self.tr("play"))
@@ -2213,15 +1887,17 @@ class MainWindow(QMainWindow):
         self.slider.set_range_visual(self.range_start, self.range_end, self.duration)
 
     def set_position(self, position):
+        if self.media_player is None: return
         self.media_player.setPosition(position)
         
     def on_slider_pressed(self):
+        if self.media_player is None: return
         # Determine if we should resume logic after drag
-        self.was_playing_before_drag = (self.media_player.playbackState() == QMediaPlayer.PlaybackState.PlayingState)
+        self.was_playing_before_drag = self.is_playing()
         self.media_player.pause()
         
     def on_slider_released(self):
-        if self.was_playing_before_drag:
+        if self.was_playing_before_drag and self.media_player is not None:
             self.media_player.play()
 
     def handle_media_error(self):
@@ -2231,6 +1907,7 @@ class MainWindow(QMainWindow):
     # --- Features ---
 
     def set_start_from_current(self):
+        if self.media_player is None: return
         # Current position in ms
         pos_ms = self.media_player.position()
         self.range_start = pos_ms
@@ -2246,6 +1923,7 @@ class MainWindow(QMainWindow):
         self.slider.set_range_visual(self.range_start, self.range_end, self.duration)
 
     def set_end_from_current(self):
+        if self.media_player is None: return
         pos_ms = self.media_player.position()
         if self.range_start != -1 and pos_ms < self.range_start:
              self.status_bar.showMessage(self.tr("msg_end_error"))
@@ -2269,6 +1947,7 @@ class MainWindow(QMainWindow):
                 path = self.video_files[row]
                 self.video_settings[path]["start_time"] = self.range_start
                 self.video_settings[path]["end_time"] = self.range_end
+        self.update_instant_estimate()
 
     # --- Settings Management ---
 
@@ -2314,6 +1993,9 @@ class MainWindow(QMainWindow):
         # FPS & Quality
         self.spin_fps.setValue(s["fps"])
         self.slider_quality.setValue(s["quality"])
+        self.spin_target_size.setValue(s.get("target_size_mb", 0))
+        self.chk_gif_optimize.setChecked(s.get("gif_optimize", False))
+        self.spin_dedup.setValue(int(s.get("dedup_threshold", 0)))
         
         # Resolution
         # Update combo options based on effective size (Cropped if enabled)
@@ -2417,6 +2099,7 @@ class MainWindow(QMainWindow):
                 self.crop_overlay.activateWindow()
 
         self._updating_ui = False
+        self.update_instant_estimate()
         
     def save_settings_from_ui(self):
         if self._updating_ui: return
@@ -2438,11 +2121,16 @@ class MainWindow(QMainWindow):
                     s["quality"] = self.slider_quality.value()
  
                 s["quality"] = self.slider_quality.value()
+                s["target_size_mb"] = self.spin_target_size.value()
+                s["gif_optimize"] = self.chk_gif_optimize.isChecked()
+                s["dedup_threshold"] = self.spin_dedup.value()
 
                 s["resize_mode"] = self.combo_resize_mode.currentData()
                 s["width"] = self.spin_width.value()
                 s["height"] = self.spin_height.value()
                 s["scale"] = self.spin_scale.value()
+
+        self.update_instant_estimate()
                 
     # Old duplicate method removed. Correct implementation is defined around line 1450.
         
@@ -2520,6 +2208,8 @@ class MainWindow(QMainWindow):
                      
                      self.update_resolution_combo(cur_eff_w, cur_eff_h)
 
+        self.update_instant_estimate()
+
     def on_convert_click(self):
         if hasattr(self, 'converter_thread') and self.converter_thread and self.converter_thread.isRunning():
             self.cancel_conversion()
@@ -2532,6 +2222,8 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, self.tr("msg_select_warning"), self.tr("msg_select_video"))
             return
 
+        self.ensure_probed([self.video_files[self.list_batch.row(i)] for i in items])
+        
         # Prepare Tasks
         tasks = []
         for item in items:
@@ -2543,43 +2235,117 @@ class MainWindow(QMainWindow):
                 "settings": s,
                 "format": s['format']
             })
+
+        # Journal the batch so a crash/cancel can be resumed (see offer_resume)
+        _, job_ids = self.job_queue.add_batch(tasks, source="gui")
+        self.launch_conversion(tasks, items, job_ids)
+
+    def launch_conversion(self, tasks, items, job_ids):
+        for item in items:
+            # Reset per-task state marker from previous runs
+            item.setForeground(QColor("#ffffff"))
+            item.setToolTip("")
             
         # Start Thread
         self.btn_convert.setText(self.tr("cancel"))
         self.progress_bar.setVisible(True)
         
-        # If single file, show indeterminate "Busy" progress because parsing FFmpeg progress is hard
-        # If batch, show file count progress
-        if len(tasks) == 1:
-            self.progress_bar.setRange(0, 0) # Infinite spin
-        else:
-            self.progress_bar.setRange(0, 100)
-            self.progress_bar.setValue(0)
+        # Determinate progress: finished tasks + per-frame fraction of running tasks (ffmpeg -progress)
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setValue(0)
+        self.conversion_stats = {}
             
         self.lbl_status.setText(self.tr("converting"))
         
-        self.converter_thread = ConversionThread(tasks, DEFAULT_FFMPEG, DEFAULT_GIFSKI)
+        self.conversion_items = list(items) # task index -> list item
+        self.conversion_states = {} # task index -> running/done/failed/cancelled
+        self.converter_thread = ConversionThread(tasks, DEFAULT_FFMPEG, DEFAULT_GIFSKI, self.spin_jobs.value(),
+                                                 job_queue=self.job_queue, job_ids=job_ids,
+                                                 priority="background" if self.chk_background.isChecked() else "normal")
         self.converter_thread.progress_signal.connect(self.on_conversion_progress)
+        self.converter_thread.task_progress_signal.connect(self.on_task_progress)
         self.converter_thread.finished_signal.connect(self.on_conversion_finished)
         self.converter_thread.start()
         
+    def offer_resume(self):
+        batches = self.job_queue.unfinished_batches(source="gui")
+        if not batches: return
+        batch = batches[0] # Newest; older leftovers are dropped below
+        for old in batches[1:]:
+            self.job_queue.discard(old["id"])
+        answer = QMessageBox.question(
+            self, self.tr("resume_title"),
+            self.tr("resume_question").format(batch["remaining"], batch["total"]))
+        if answer != QMessageBox.StandardButton.Yes:
+            self.job_queue.discard(batch["id"])
+            return
+
+        # Finished outputs that still verify (size + header) are skipped
+        jobs = [(job_id, task) for job_id, task in self.job_queue.resume(batch["id"]) if os.path.exists(task["path"])]
+        if not jobs: return
+        self.add_files([task["path"] for _, task in jobs])
+        items = []
+        for _, task in jobs:
+            settings = dict(task["settings"])
+            settings.pop("probe_pending", None)
+            self.video_settings[task["path"]] = settings
+            item = self.list_batch.item(self.video_files.index(task["path"]))
+            item.setText(os.path.basename(task["path"]))
+            items.append(item)
+        self.list_batch.clearSelection()
+        for item in items:
+            item.setSelected(True)
+        self.launch_conversion([task for _, task in jobs], items, [job_id for job_id, _ in jobs])
+
+    def on_user_interaction(self):
+        thread = getattr(self, "converter_thread", None) # Filter is installed before the UI exists
+        if thread and thread.isRunning() and thread.engine.priority == "background":
+            thread.engine.throttle.poke()
+
     def cancel_conversion(self):
         if self.converter_thread:
             self.lbl_status.setText("Cancelling...")
             self.btn_convert.setEnabled(False) 
             self.converter_thread.stop()
         
-    def on_conversion_progress(self, current, total, status):
+    def on_conversion_progress(self, current, total, status, stats):
         self.lbl_status.setText(status)
-        # Only update specific percentage if not infinite spin
-        if self.progress_bar.maximum() > 0:
-            pct = int((current / total) * 100)
-            self.progress_bar.setValue(pct)
+        if stats:
+            # Per-task frame progress
+            self.conversion_stats[stats["index"]] = stats
+            idx = stats["index"]
+            if 0 <= idx < len(self.conversion_items):
+                try:
+                    self.conversion_items[idx].setToolTip(status)
+                except RuntimeError:
+                    pass # Item removed from list while converting
+        if total <= 0: return
+        
+        # Finished tasks count fully; running ones by their frame fraction
+        running = sum(st["percent"] / 100.0 for i, st in self.conversion_stats.items()
+                      if self.conversion_states.get(i) == "running")
+        frac = min(1.0, (current + running) / total)
+        self.progress_bar.setValue(max(self.progress_bar.value(), int(frac * 1000)))
+        
+    def on_task_progress(self, idx, state, message):
+        self.conversion_states[idx] = state
+        # Per-task marker in the batch list (several tasks run at once)
+        colors = {"running": "#3b8edb", "done": "#6fcf6f", "failed": "#e05555", "cancelled": "#777777"}
+        if 0 <= idx < len(self.conversion_items):
+            item = self.conversion_items[idx]
+            try:
+                item.setForeground(QColor(colors.get(state, "#ffffff")))
+                item.setToolTip(message)
+            except RuntimeError:
+                pass # Item removed from list while converting
+        if state == "running":
+            self.lbl_status.setText(message)
         
     def on_conversion_finished(self, success, fail):
         self.btn_convert.setEnabled(True)
         self.btn_convert.setText(self.tr("convert"))
         self.progress_bar.setRange(0, 100) # Reset to normal
+        self.progress_bar.setValue(0)
         self.progress_bar.setVisible(False)
         self.lbl_status.setText(self.tr("done") + f" (Success: {success}, Failed: {fail})")
 
@@ -2631,21 +2397,36 @@ class MainWindow(QMainWindow):
         
         if not items: return
 
+        self.ensure_probed([self.video_files[self.list_batch.row(i)] for i in items])
         tasks = []
+        self.estimate_items = []
         for item in items:
             row = self.list_batch.row(item)
             if 0 <= row < len(self.video_files):
                 path = self.video_files[row]
                 s = self.video_settings[path]
                 tasks.append({"path": path, "settings": s})
+                self.estimate_items.append(item)
+        self.estimate_done = 0
 
         self.btn_estimate.setEnabled(False)
         self.lbl_status.setText(f"Estimating size for {len(tasks)} file(s)...")
         
-        self.est_thread = EstimateThread(tasks, DEFAULT_FFMPEG, DEFAULT_GIFSKI)
+        # A single file would leave the other cores idle: run its 3 samples side by side instead
+        self.est_thread = EstimateThread(tasks, DEFAULT_FFMPEG, DEFAULT_GIFSKI,
+                                         max_workers=self.spin_jobs.value(), split_segments=len(tasks) == 1)
+        self.est_thread.result_signal.connect(self.on_estimate_result)
         self.est_thread.finished_signal.connect(self.on_estimate_finished)
         self.est_thread.start()
         
+    def on_estimate_result(self, idx, res):
+        # Per-file result while the rest are still running
+        self.estimate_done += 1
+        text = format_estimate(res)
+        if 0 <= idx < len(self.estimate_items):
+            self.estimate_items[idx].setToolTip(text)
+        self.lbl_status.setText(f"Estimated {self.estimate_done}/{len(self.estimate_items)}: {text}")
+
     def on_estimate_finished(self, result):
         self.btn_estimate.setEnabled(True)
         self.btn_estimate.setText(self.tr("estimate_size"))
@@ -2671,6 +2452,7 @@ class MainWindow(QMainWindow):
             self.est_thread.stop() # Kill processes
             self.est_thread.wait(2000)
             
+        self.probe_pool.shutdown() # Also persists the probe cache
         event.accept()
 
     # --- Helper: Video Rect Calculation ---
@@ -2726,7 +2508,7 @@ class MainWindow(QMainWindow):
                 return
                 
             # Otherwise, toggle play
-            if self.media_player.source().isValid():
+            if self.media_player is not None and self.media_player.source().isValid():
                 self.toggle_play()
                 event.accept()
                 return
@@ -2777,8 +2559,47 @@ class MainWindow(QMainWindow):
 # ----------------------------
 # Main Execution
 # ----------------------------
+def print_startup_report(out=sys.stderr):
+    # Per-phase and cumulative wall time since the first line of this module
+    t0 = _startup_marks[0][1]
+    prev = t0
+    out.write(f"{'phase':<40} {'ms':>9} {'total ms':>9}\n")
+    for phase, t in _startup_marks[1:]:
+        out.write(f"{phase:<40} {(t - prev) * 1000:9.1f} {(t - t0) * 1000:9.1f}\n")
+        prev = t
+    # Regression guards: these must stay lazy
+    for mod in ("cv2", "PyQt6.QtMultimedia"):
+        out.write(f"{mod + ' loaded':<40} {str(mod in sys.modules):>9}\n")
+    try:
+        import resource
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin": rss_kb //= 1024
+        out.write(f"{'peak RSS (MB)':<40} {rss_kb / 1024:9.1f}\n")
+    except ImportError:
+        pass # Windows
+    out.flush()
+
 if __name__ == '__main__':
+    profile_startup = "--profile-startup" in sys.argv
+    if profile_startup: sys.argv.remove("--profile-startup")
+    
     app = QApplication(sys.argv)
+    mark_startup("QApplication")
     window = MainWindow()
+    mark_startup("MainWindow()")
     window.show()
+    mark_startup("show()")
+    
+    from PyQt6.QtCore import QTimer
+    if profile_startup:
+        # Report once the first event loop pass (first paint) is done, then exit
+        def _report():
+            mark_startup("first event loop pass")
+            print_startup_report()
+            app.quit()
+        QTimer.singleShot(0, _report)
+    else:
+        # Unfinished batch from a crash/cancel: offer to resume once the window is up
+        # (not when profiling: the modal dialog would be timed as startup)
+        QTimer.singleShot(0, window.offer_resume)
     sys.exit(app.exec())